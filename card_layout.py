@@ -0,0 +1,278 @@
+"""
+Layout phase for file cards: where everything goes, before any pixels.
+
+``card_geometry`` holds what depends only on the page size (scale, paddings,
+font sizes, header height). ``plan_card_layout`` adds what depends on the
+card's text: the wrapped metadata lines, the file path lines and the final
+preview box. Because metadata wrapping is resolved here, the preview box is
+exact before any preview is decoded, instead of shrinking after the
+metadata has been drawn. ``card_count`` says how many cards a file becomes
+(two for a movie, an overview plus one per page for a multi-page PDF with
+all pages), which is what run planning predicts.
+
+Geometry and layout are frozen dataclasses and cached, so cards with the
+same page size and text reuse one layout; ``CardLayout.to_dict`` gives a JSON-friendly
+form for planning and debugging.
+
+The model covers the geometry of a single card only.
+``file_card_generator._compose_file_info_card`` draws from it but still
+decodes the preview itself, and it still expands an all-pages PDF into its
+page cards by calling itself once per page; the movie's two cards are
+requested separately by the caller.
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from pillow_textbox import measure_text_box
+from text_wrap import wrap_words
+
+Box = Tuple[int, int, int, int]  # (left, top, right, bottom)
+
+# Keys shown as bare values rather than "key: value"
+_BARE_VALUE_KEYS = {"name", "filename", "filepath", "created"}
+_HIDDEN_KEYS = {"sequence_group", "sequence_index", "qr_data", "_title"}
+_TIMESTAMP_KEYS = {"creation_timestamp", "ts", "timestamp"}
+
+
+def card_font_sizes(width, height):
+    """Title, info (metadata), preview and FIT font sizes for a width x height card."""
+    scale = min(width / 800, height / 1000)
+    return int(20 * scale), int(18 * scale), int(12 * scale), int(15 * scale)
+
+
+@dataclass(frozen=True)
+class CardGeometry:
+    width: int
+    height: int
+    scale: float
+    outer_padding: int
+    color_border_width: int
+    title_font_size: int
+    info_font_size: int
+    preview_font_size: int
+    fit_font_size: int
+    icon_space: int
+    metadata_line_height: int
+    spacing_between_metadata_and_content_preview: int
+    preview_box_padding: int
+    header_height: int
+    metadata_top_margin: int
+    avatar_size: int
+
+    @property
+    def content_area_width_for_wrap(self) -> int:
+        return self.width - 2 * self.outer_padding
+
+
+@lru_cache(maxsize=32)
+def card_geometry(width: int, height: int, outer_padding_inches: float = 0.5, border_inch_width: float = 0.125) -> CardGeometry:
+    """Page-size dependent measurements of a card (300 DPI)."""
+    # Proportional scaling against an 800x1000 reference card
+    scale = min(width / 800, height / 1000)
+    outer_padding_px = int(outer_padding_inches * 300)
+    title_size, info_size, preview_size, fit_size = card_font_sizes(width, height)
+    icon_space = int(30 * scale)
+    return CardGeometry(
+        width=width,
+        height=height,
+        scale=scale,
+        outer_padding=max(outer_padding_px, int(outer_padding_px * scale)),
+        color_border_width=int(border_inch_width * 300),
+        title_font_size=title_size,
+        info_font_size=info_size,
+        preview_font_size=preview_size,
+        fit_font_size=fit_size,
+        icon_space=icon_space,
+        metadata_line_height=int(info_size * 1.05),  # Tighter line spacing for metadata
+        spacing_between_metadata_and_content_preview=int(icon_space * scale),
+        preview_box_padding=int(10 * scale),
+        header_height=int(25 * scale),
+        metadata_top_margin=int(12 * scale),
+        avatar_size=int(120 * scale),
+    )
+
+
+def metadata_display_lines(file_info: Mapping[str, Any]) -> Tuple[str, ...]:
+    """The unwrapped metadata lines a card shows for file_info, in order."""
+    lines = []
+    for key, value in file_info.items():
+        lowered = key.lower()
+        if value is None or value == '' or lowered in _HIDDEN_KEYS:
+            continue
+        if lowered in _TIMESTAMP_KEYS:
+            try:
+                line = datetime.fromtimestamp(float(value)).strftime("%B %d, %Y %H:%M:%S")
+            except Exception:
+                line = f"{key}: {value}"
+        elif lowered in _BARE_VALUE_KEYS:
+            line = f"{value}"
+        elif lowered == '_blank':
+            line = ""
+        elif key.startswith('_'):
+            line = f"{value}"
+        else:
+            line = f"{key}: {value}"
+        lines.append(line)
+    return tuple(lines)
+
+
+def card_path_lines(file_path) -> Tuple[str, ...]:
+    """Short parent path and file name shown under the metadata."""
+    last_parts = Path(file_path).parts[-3:]
+    short_path = "/".join(last_parts)
+    filename = Path(file_path).name
+    # Huge Instagram-style names: shorten the name and show only the parent parts
+    if len(filename) > 50:
+        filename = f"{filename[:25]}...{filename[-25:]}"
+        short_path = "/".join(last_parts[:-1])
+    if len(last_parts) > 1:
+        return (short_path, filename)
+    return (filename,)
+
+
+def card_count(file_type: str, pdf_pages: Optional[int] = None, all_pdf_pages: bool = False) -> int:
+    """
+    Cards a file of file_type becomes: a first-frame and a frame-grid card
+    for movies; an overview and one card per page for a PDF of more than
+    one page when all_pdf_pages is set; otherwise one.
+    """
+    if file_type == "movie":
+        return 2
+    if file_type == "pdf" and all_pdf_pages and pdf_pages and pdf_pages > 1:
+        return 1 + pdf_pages
+    return 1
+
+
+@dataclass(frozen=True)
+class CardLayout:
+    geometry: CardGeometry
+    custom_metadata: bool
+    metadata_lines: Tuple[str, ...]  # wrapped lines, drawn top to bottom
+    metadata_top: float
+    metadata_height: int
+    custom_line_spacing: int
+    path_lines: Tuple[str, ...]
+    path_y: Optional[int]
+    preview_box: Box
+    line_height: int
+    max_line_length: int
+    max_preview_lines: int
+
+    @property
+    def preview_size(self) -> Tuple[int, int]:
+        """(width, height) every preview is decoded and fitted to."""
+        left, top, right, bottom = self.preview_box
+        padding = self.geometry.preview_box_padding
+        return right - left - padding * 2, bottom - top - padding * 2
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["preview_size"] = self.preview_size
+        return data
+
+
+@lru_cache(maxsize=512)
+def plan_card_layout(
+    geometry: CardGeometry,
+    info_font,
+    preview_font,
+    field_lines: Tuple[str, ...] = (),
+    field_count: int = 0,
+    custom_metadata_text: Optional[str] = None,
+    path_lines: Tuple[str, ...] = (),
+) -> CardLayout:
+    """
+    Lay out a card's metadata block and preview box.
+
+    field_lines are metadata_display_lines() of the card's file info and
+    field_count the number of file info entries (the block is never laid out
+    shorter than one line per entry). With custom_metadata_text the block is
+    that text, wrapped, instead. path_lines (card_path_lines) go below the
+    fields.
+    """
+    g = geometry
+    scale = g.scale
+    header_bottom = g.outer_padding + g.header_height
+    custom_line_spacing = 0
+    path_y = None
+    if custom_metadata_text:
+        # Derive spacing so wrapped lines advance by metadata_line_height
+        l, t, r, b = info_font.getbbox("Ag")
+        custom_line_spacing = max(0, int(g.metadata_line_height - (b - t)))
+        meta_pad = int(30 * scale)
+        measure = measure_text_box(
+            custom_metadata_text,
+            info_font,
+            box=(g.outer_padding, header_bottom, g.content_area_width_for_wrap, g.height - header_bottom),
+            padding=meta_pad,
+            line_spacing=custom_line_spacing,
+        )
+        metadata_lines = tuple(measure["lines"])
+        metadata_height = measure["used_size"][1] + meta_pad * 2
+        metadata_top = header_bottom + g.metadata_top_margin
+        metadata_bottom = metadata_top + metadata_height
+        path_lines = ()
+    else:
+        metadata_height = field_count * g.metadata_line_height
+        # Fields start level with the avatar
+        metadata_top = int(header_bottom + 5 * scale) + 12 * scale
+        wrap_width = g.content_area_width_for_wrap - g.avatar_size
+        wrapped = []
+        for line in field_lines:
+            wrapped.extend(wrap_words(line.split(), info_font, wrap_width) if line else [""])
+        metadata_lines = tuple(wrapped)
+        metadata_bottom = metadata_top + len(metadata_lines) * g.metadata_line_height
+        if path_lines:
+            path_y = int(metadata_bottom + max(4, int(6 * scale)))
+            metadata_bottom = path_y + g.metadata_line_height * len(path_lines) + 5
+
+    content_area_left = g.outer_padding
+    content_area_right = g.width - g.outer_padding
+    content_area_width = content_area_right - content_area_left
+    preview_box_left = content_area_left + int(content_area_width * 0.005)
+    preview_box_right = content_area_right - int(content_area_width * 0.005)
+    spacing = g.spacing_between_metadata_and_content_preview
+    # The preview starts below the metadata block, whichever of estimate and wrapped extent is lower
+    preview_box_top = max(
+        header_bottom + g.metadata_top_margin + metadata_height + spacing,
+        int(metadata_bottom + spacing),
+    )
+    preview_box_bottom = g.height - g.outer_padding - int(30 * scale)
+
+    bbox = preview_font.getbbox('A')
+    line_height = bbox[3] - bbox[1] + int(3 * scale)
+    char_width = bbox[2] - bbox[0]
+    preview_box_height = preview_box_bottom - preview_box_top - g.preview_box_padding * 2
+    max_line_width_pixels = preview_box_right - preview_box_left - g.preview_box_padding * 2
+    return CardLayout(
+        geometry=g,
+        custom_metadata=bool(custom_metadata_text),
+        metadata_lines=metadata_lines,
+        metadata_top=metadata_top,
+        metadata_height=metadata_height,
+        custom_line_spacing=custom_line_spacing,
+        path_lines=path_lines,
+        path_y=path_y,
+        preview_box=(preview_box_left, preview_box_top, preview_box_right, preview_box_bottom),
+        line_height=line_height,
+        max_line_length=max(10, max_line_width_pixels // max(1, char_width)),
+        max_preview_lines=max(1, preview_box_height // max(1, line_height)),
+    )
+
+
+__all__ = [
+    "card_font_sizes",
+    "CardGeometry",
+    "card_geometry",
+    "metadata_display_lines",
+    "card_path_lines",
+    "card_count",
+    "CardLayout",
+    "plan_card_layout",
+]
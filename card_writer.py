@@ -0,0 +1,306 @@
+"""
+Intermediate card files: codec choice and background encoding.
+
+Every card is written to disk once and read back by img2pdf when its PDF is
+assembled, so the intermediate file only has to be lossless and cheap to
+write. ``CODECS`` lists what ``save_card_as_tiff`` can write: uncompressed,
+LZW, deflate or zstd TIFF, or PNG for RGB cards (img2pdf copies PNG data
+into the PDF without re-encoding it). ``validate_codec`` checks a codec once
+per process and colour mode by round-tripping a test card through img2pdf
+and comparing pixels; a codec this Pillow/libtiff build cannot write (zstd
+needs libtiff built with it), or that does not come back identical, falls
+back to deflate TIFF.
+
+``CardWriter`` encodes cards on a small thread pool so compression overlaps
+rendering the next card; Pillow releases the GIL while it encodes. At most
+two cards per worker wait in the queue, and each queued card's pixels (plus
+the CMYK copy made while saving) are admitted through the memory governor
+until it is written, so finished but unwritten cards count against the same
+budget as the renders they overlap. ``pending`` lists files that are queued but
+not yet on disk, and ``flush`` waits for them; anything that reads the card
+directory back (chunk counting, PDF assembly) must see both.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+from config_loader import get_card_codec, get_card_save_workers
+from memory_governor import get_governor
+
+DEFAULT_SAVE_WORKERS = min(4, os.cpu_count() or 1)
+FALLBACK_CODEC = "deflate"
+
+
+@dataclass(frozen=True)
+class CardCodec:
+    name: str
+    format: str  # Pillow format name
+    suffix: str
+    compression: Optional[str] = None  # Pillow TIFF compression
+    level: Optional[int] = None  # PNG compress_level (TIFF uses libtiff's default)
+    modes: Tuple[str, ...] = ("RGB", "CMYK")
+
+    def save_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for Image.save."""
+        kwargs: Dict[str, Any] = {"format": self.format, "dpi": (300, 300)}
+        if self.format == "TIFF":
+            kwargs["compression"] = self.compression
+        elif self.level is not None:
+            kwargs["compress_level"] = self.level
+        return kwargs
+
+    def save(self, img, path) -> None:
+        """Write img to path with this codec."""
+        if self.format != "TIFF":
+            img.save(path, **self.save_kwargs())
+            return
+        # Pillow hands libtiff a duplicate of the file's descriptor, libtiff closes
+        # it and Pillow closes the same number again; with cards saved on several
+        # threads that second close can hit a file another thread just opened.
+        # Encoding in memory keeps libtiff away from real descriptors.
+        buffer = io.BytesIO()
+        img.save(buffer, **self.save_kwargs())
+        with open(path, "wb") as fp:
+            fp.write(buffer.getbuffer())
+
+    def output_path(self, path):
+        """path with this codec's suffix, as the same type (str or Path)."""
+        renamed = Path(path).with_suffix(self.suffix)
+        return renamed if isinstance(path, Path) else str(renamed)
+
+
+CODECS: Dict[str, CardCodec] = {
+    "none": CardCodec("none", "TIFF", ".tiff", compression="raw"),
+    "lzw": CardCodec("lzw", "TIFF", ".tiff", compression="tiff_lzw"),
+    "deflate": CardCodec("deflate", "TIFF", ".tiff", compression="tiff_deflate"),
+    "zstd": CardCodec("zstd", "TIFF", ".tiff", compression="zstd"),
+    "png": CardCodec("png", "PNG", ".png", modes=("RGB",)),
+}
+
+_lock = threading.Lock()
+_codec_spec: Optional[str] = None
+_writer: Optional["CardWriter"] = None
+
+
+@lru_cache(maxsize=32)
+def parse_codec(spec: str) -> CardCodec:
+    """
+    Parse "name" or "name:level" into a CardCodec. The level (0-9) applies
+    to PNG; Pillow has no deflate level for TIFF, so TIFF codecs ignore it.
+    Unknown names fall back to deflate.
+    """
+    name, _, level_text = (spec or FALLBACK_CODEC).strip().lower().partition(":")
+    codec = CODECS.get(name)
+    if codec is None:
+        logging.warning("Unknown card codec %r; using %r.", name, FALLBACK_CODEC)
+        return CODECS[FALLBACK_CODEC]
+    if level_text:
+        try:
+            level = min(9, max(0, int(level_text)))
+        except ValueError:
+            logging.warning("Invalid card codec level %r; using the codec default.", level_text)
+            return codec
+        if codec.format != "PNG":
+            logging.info("Card codec %r has no level setting in Pillow; ignoring level %d.", name, level)
+            return codec
+        codec = CardCodec(codec.name, codec.format, codec.suffix, codec.compression, level, codec.modes)
+    return codec
+
+
+def _test_card(mode: str):
+    """Small deterministic image with flat areas and noise, like a card."""
+    from PIL import Image
+
+    size = (64, 48)
+    bands = Image.getmodebands(mode)
+    count = size[0] * size[1] * bands
+    data = bytes((i * 37 + (i // 7) * 11) % 256 if i < count // 2 else 250 for i in range(count))
+    return Image.frombytes(mode, size, data)
+
+
+@lru_cache(maxsize=None)
+def validate_codec(codec: CardCodec, mode: str) -> bool:
+    """
+    True when codec writes mode images that img2pdf embeds losslessly,
+    checked by encoding a test card, converting it with img2pdf and comparing
+    the decoded PDF image with the original.
+    """
+    if mode not in codec.modes:
+        logging.warning("Card codec %r cannot write %s cards.", codec.name, mode)
+        return False
+    try:
+        import img2pdf
+        import pikepdf
+    except ImportError as exc:
+        logging.debug("Cannot validate card codec %r (%s); trusting it.", codec.name, exc)
+        return True
+    sample = _test_card(mode)
+    buffer = io.BytesIO()
+    try:
+        sample.save(buffer, **codec.save_kwargs())
+        with pikepdf.open(io.BytesIO(img2pdf.convert(buffer.getvalue()))) as pdf:
+            embedded = next(iter(pdf.pages[0].images.values()))
+            roundtrip = pikepdf.PdfImage(embedded).as_pil_image()
+    except Exception as exc:
+        logging.warning("Card codec %r is not usable for %s cards here: %s", codec.name, mode, exc)
+        return False
+    if roundtrip.mode != sample.mode or roundtrip.tobytes() != sample.tobytes():
+        logging.warning("Card codec %r does not pass %s cards through img2pdf losslessly.", codec.name, mode)
+        return False
+    return True
+
+
+def card_codec(cmyk_mode: bool = False, spec: Optional[str] = None) -> CardCodec:
+    """
+    The validated codec for cards of this colour mode: spec, else the one set
+    with configure(), else config.json "card_output.codec". Falls back to
+    deflate TIFF when the choice fails validation.
+    """
+    codec = parse_codec(spec or _codec_spec or get_card_codec())
+    if validate_codec(codec, "CMYK" if cmyk_mode else "RGB"):
+        return codec
+    return CODECS[FALLBACK_CODEC]
+
+
+def _queued_bytes(img, cmyk_mode: bool) -> int:
+    """Memory a queued card holds until written: its pixels, plus the CMYK copy save_card_as_tiff makes."""
+    pixels = img.width * img.height
+    cost = pixels * len(img.getbands())
+    if cmyk_mode and img.mode != "CMYK":
+        cost += pixels * 4
+    return cost
+
+
+class CardWriter:
+    """
+    Save cards on a background thread pool.
+
+    ``submit`` returns as soon as the card is queued (it blocks only while
+    two cards per worker are already waiting, or while the memory governor
+    has no room for the card's bytes). With workers=0 cards are written
+    inline, as before.
+    """
+
+    def __init__(self, workers: int = DEFAULT_SAVE_WORKERS):
+        self.workers = max(0, int(workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="card-writer") if self.workers else None
+        self._slots = threading.BoundedSemaphore(max(1, self.workers * 2))
+        self._lock = threading.Lock()
+        self._pending: Dict[Path, Future] = {}
+
+    def submit(self, img, output_path, cmyk_mode: bool = False, card_type: Optional[str] = None):
+        """Queue img to be saved with save_card_as_tiff; returns the path it will have."""
+        from file_card_generator import save_card_as_tiff
+
+        output_path = card_codec(cmyk_mode).output_path(output_path)
+        if self._executor is None:
+            return save_card_as_tiff(img, output_path, cmyk_mode=cmyk_mode, card_type=card_type)
+        key = Path(output_path).resolve()
+        cost = _queued_bytes(img, cmyk_mode)
+        self._slots.acquire()
+        get_governor().acquire(cost)
+        with self._lock:
+            future = self._executor.submit(save_card_as_tiff, img, output_path, cmyk_mode, None, card_type)
+            self._pending[key] = future
+        future.add_done_callback(lambda done, key=key, cost=cost: self._finished(key, done, cost))
+        return output_path
+
+    def _finished(self, key: Path, future: Future, cost: int) -> None:
+        get_governor().release(cost)
+        self._slots.release()
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+        exc = future.exception()
+        if exc is not None:
+            logging.error("Error saving card %s: %s", key, exc)
+
+    def pending(self, directory=None) -> Set[Path]:
+        """Resolved paths of cards queued but not yet written, optionally only those under directory."""
+        with self._lock:
+            paths = set(self._pending)
+        if directory is None:
+            return paths
+        root = Path(directory).resolve()
+        return {p for p in paths if p == root or root in p.parents}
+
+    def flush(self, directory=None) -> None:
+        """Wait until every queued card (under directory, if given) is on disk."""
+        root = Path(directory).resolve() if directory is not None else None
+        while True:
+            with self._lock:
+                futures = [f for p, f in self._pending.items() if root is None or p == root or root in p.parents]
+            if not futures:
+                return
+            wait(futures)
+
+    def close(self) -> None:
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+def configure(codec: Optional[str] = None, workers: Optional[int] = None) -> CardWriter:
+    """
+    Set the process-wide card codec and background writer. codec is a
+    "name[:level]" spec (None keeps config.json's); workers=None uses
+    config.json "card_output.save_workers", else DEFAULT_SAVE_WORKERS.
+    """
+    global _codec_spec, _writer
+    if workers is None:
+        workers = get_card_save_workers()
+    if workers is None:
+        workers = DEFAULT_SAVE_WORKERS
+    with _lock:
+        if codec:
+            _codec_spec = codec
+        previous, _writer = _writer, CardWriter(workers)
+    if previous is not None:
+        previous.close()
+    return _writer
+
+
+def get_writer() -> CardWriter:
+    """The process-wide CardWriter, created with the configured defaults on first use."""
+    with _lock:
+        writer = _writer
+    return writer if writer is not None else configure()
+
+
+def pending(directory=None) -> Set[Path]:
+    """Cards the process-wide writer has queued but not yet written."""
+    with _lock:
+        writer = _writer
+    return writer.pending(directory) if writer is not None else set()
+
+
+def flush(directory=None) -> None:
+    """Wait for the process-wide writer's queued cards (under directory, if given)."""
+    with _lock:
+        writer = _writer
+    if writer is not None:
+        writer.flush(directory)
+
+
+__all__ = [
+    "DEFAULT_SAVE_WORKERS",
+    "CardCodec",
+    "CODECS",
+    "parse_codec",
+    "validate_codec",
+    "card_codec",
+    "CardWriter",
+    "configure",
+    "get_writer",
+    "pending",
+    "flush",
+]
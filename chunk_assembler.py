@@ -0,0 +1,111 @@
+"""
+Background finalization of chunk PDFs.
+
+With ``--cards-per-chunk`` every full chunk directory is turned into a PDF
+and, optionally, its card files are deleted. ``ChunkAssembler`` runs that
+finalization on a worker thread while the next chunk renders. Only
+``max_pending`` chunks may be queued or assembling at once; ``submit``
+blocks beyond that, so finished cards never pile up on disk faster than
+they are assembled. Cards are deleted only once their PDF exists.
+
+A failed chunk does not stop the run. ``close`` waits for every chunk and
+then raises ``ChunkAssemblyError`` naming each chunk that failed.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+DEFAULT_PENDING_CHUNKS = 2
+
+
+class ChunkAssemblyError(RuntimeError):
+    """One or more chunk PDFs could not be assembled."""
+
+    def __init__(self, failures: List[Tuple[str, BaseException]]):
+        self.failures = failures
+        details = "; ".join(f"{pdf_path}: {exc}" for pdf_path, exc in failures)
+        super().__init__(f"{len(failures)} chunk PDF(s) failed: {details}")
+
+
+class ChunkAssembler:
+    """
+    Assemble chunk PDFs on a background thread.
+
+    assemble(chunk_dir, pdf_path, page_size) writes a chunk's PDF and
+    delete_cards(chunk_dir) removes its card files. With max_pending=0
+    chunks are finalized inline, as before.
+    """
+
+    def __init__(
+        self,
+        assemble: Callable[[str, str, Tuple[int, int]], None],
+        page_size: Tuple[int, int],
+        delete_cards: Optional[Callable[[Path], None]] = None,
+        max_pending: int = DEFAULT_PENDING_CHUNKS,
+    ):
+        self._assemble = assemble
+        self._delete_cards = delete_cards
+        self.page_size = page_size
+        self.max_pending = max(0, int(max_pending))
+        # One assembly at a time: img2pdf holds a whole chunk's PDF in memory
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chunk-pdf") if self.max_pending else None
+        self._slots = threading.BoundedSemaphore(max(1, self.max_pending))
+        self._lock = threading.Lock()
+        self._futures: List[Future] = []
+        self._failures: List[Tuple[str, BaseException]] = []
+
+    def _finalize(self, chunk_dir: Path, pdf_path: str, delete_cards: bool) -> None:
+        self._assemble(str(chunk_dir), pdf_path, self.page_size)
+        pdf_file = Path(pdf_path)
+        if not pdf_file.is_file() or pdf_file.stat().st_size == 0:
+            raise RuntimeError(f"no PDF was written for {chunk_dir}")
+        logging.info(f"Saved chunk PDF: {pdf_path}")
+        if delete_cards and self._delete_cards is not None:
+            self._delete_cards(chunk_dir)
+
+    def _record(self, pdf_path: str, exc: Optional[BaseException]) -> None:
+        if exc is not None:
+            logging.error(f"Error assembling chunk PDF {pdf_path}: {exc}")
+            with self._lock:
+                self._failures.append((pdf_path, exc))
+
+    def submit(self, chunk_dir, pdf_path, delete_cards: bool = False) -> None:
+        """Queue a chunk for PDF assembly (and card deletion); blocks while max_pending chunks are in flight."""
+        chunk_dir = Path(chunk_dir)
+        pdf_path = str(pdf_path)
+        if self._executor is None:
+            try:
+                self._finalize(chunk_dir, pdf_path, delete_cards)
+            except Exception as exc:
+                self._record(pdf_path, exc)
+            return
+        self._slots.acquire()
+        future = self._executor.submit(self._finalize, chunk_dir, pdf_path, delete_cards)
+
+        def _done(done: Future, pdf_path: str = pdf_path) -> None:
+            self._slots.release()
+            self._record(pdf_path, done.exception())
+
+        future.add_done_callback(_done)
+        with self._lock:
+            self._futures.append(future)
+
+    def close(self) -> None:
+        """Wait for every queued chunk; raise ChunkAssemblyError if any failed."""
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        with self._lock:
+            failures = list(self._failures)
+        if failures:
+            raise ChunkAssemblyError(failures)
+
+
+__all__ = ["DEFAULT_PENDING_CHUNKS", "ChunkAssemblyError", "ChunkAssembler"]
@@ -0,0 +1,125 @@
+"""
+Whole-image RGB -> CMYK separation with gray component replacement.
+
+Pillow's ``convert('CMYK')`` is ``C = 255 - R`` (and so on) with no black
+at all, and ``rgb_to_cmyk`` in file_card_generator only handles one color
+at a time. ``separate`` converts whole images:
+
+* The separation (GCR amount, total ink limit) is evaluated with numpy on
+  a 52^3 grid once per setting and applied through Pillow's C trilinear
+  ``Color3DLUT``, so converting a card is one pass over its pixels. The
+  grid step is 5 levels, so the card background (250), trim border (245),
+  white and black are grid nodes and come out of the LUT exactly.
+* With ``preserve_black`` the LUT's gray axis is K only, and every other
+  neutral pixel (text antialiasing, grays between grid nodes, which
+  trilinear interpolation would tint with a little CMY) is set to K only by
+  a short pass of Pillow channel operations, pasted in place inside the
+  bounding box of those pixels.
+
+Settings come from ``"cmyk_separation"`` in config.json; see
+``config_loader.get_cmyk_separation``.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageChops, ImageFilter
+
+import render_metrics
+from config_loader import get_cmyk_separation
+
+# 255 / (LUT_SIZE - 1) = 5: every fifth gray level is a grid node
+LUT_SIZE = 52
+# Max channel spread (0-255) still treated as neutral gray for K-only black
+NEUTRAL_TOLERANCE = 2
+
+
+@dataclass(frozen=True)
+class SeparationSettings:
+    gcr: float = 1.0  # fraction of the gray component moved to K (0 = UCR-free, 1 = full GCR)
+    ink_limit: float = 300.0  # maximum C+M+Y+K in percent
+    preserve_black: bool = True  # neutral pixels become K only
+
+    @classmethod
+    def from_config(cls) -> "SeparationSettings":
+        return cls(**get_cmyk_separation())
+
+
+def separate_array(rgb: np.ndarray, settings: SeparationSettings) -> np.ndarray:
+    """Separate float RGB in [0, 1] (any leading shape, last axis 3) to CMYK in [0, 1]."""
+    cmy = 1.0 - rgb
+    gray = cmy.min(axis=-1, keepdims=True)
+    k = gray * settings.gcr
+    cmy = cmy - k
+    total = cmy.sum(axis=-1, keepdims=True) + k
+    limit = settings.ink_limit / 100.0
+    # Over the ink limit: scale CMY back, keep K (it carries the detail)
+    over = total > limit
+    room = np.clip(limit - k, 0.0, None)
+    cmy_sum = cmy.sum(axis=-1, keepdims=True)
+    scale = np.where(over & (cmy_sum > 0), room / np.maximum(cmy_sum, 1e-9), 1.0)
+    cmy = cmy * scale
+    return np.clip(np.concatenate([cmy, k], axis=-1), 0.0, 1.0)
+
+
+@lru_cache(maxsize=8)
+def _lut(settings: SeparationSettings) -> ImageFilter.Color3DLUT:
+    axis = np.linspace(0.0, 1.0, LUT_SIZE)
+    # Color3DLUT tables are ordered with red changing fastest, then green, then blue
+    b, g, r = np.meshgrid(axis, axis, axis, indexing="ij")
+    table = separate_array(np.stack([r, g, b], axis=-1), settings)
+    if settings.preserve_black:
+        # Gray axis nodes: K only, whatever the GCR amount
+        gray = np.arange(LUT_SIZE)
+        table[gray, gray, gray, :3] = 0.0
+        table[gray, gray, gray, 3] = 1.0 - axis
+    return ImageFilter.Color3DLUT(LUT_SIZE, table, channels=4, target_mode="CMYK")
+
+
+# Point tables over 0-255 values: channel spread within tolerance; exactly neutral; a gray node level
+_NEUTRAL = [255 if v <= NEUTRAL_TOLERANCE else 0 for v in range(256)]
+_EXACT = [255] + [0] * 255
+_NODE_LEVEL = [255 if v * (LUT_SIZE - 1) % 255 == 0 else 0 for v in range(256)]
+
+
+def _off_node_neutral_mask(img: Image.Image) -> Image.Image:
+    """
+    "L" mask of the neutral pixels the LUT does not already separate to K
+    only: within NEUTRAL_TOLERANCE, except exact grays on a grid node
+    (paper white, the card background and border, solid black).
+    """
+    r, g, b = img.split()
+    spread = ImageChops.subtract(
+        ImageChops.lighter(ImageChops.lighter(r, g), b),
+        ImageChops.darker(ImageChops.darker(r, g), b),
+    )
+    on_node = ImageChops.multiply(spread.point(_EXACT), r.point(_NODE_LEVEL))
+    return ImageChops.subtract(spread.point(_NEUTRAL), on_node)
+
+
+def separate(img: Image.Image, settings: Optional[SeparationSettings] = None) -> Image.Image:
+    """Convert an RGB(A)/L image to CMYK with the configured (or given) separation."""
+    settings = settings or SeparationSettings.from_config()
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    cmyk = img.filter(_lut(settings))
+    render_metrics.increment("color.cmyk_lut")
+    if not settings.preserve_black:
+        return cmyk
+
+    mask = _off_node_neutral_mask(img)
+    box = mask.getbbox()
+    if box is None:
+        return cmyk
+    # K = 255 - luminance; for pixels this close to gray that is their level
+    black = ImageChops.invert(img.crop(box).convert("L"))
+    blank = Image.new("L", black.size, 0)
+    cmyk.paste(Image.merge("CMYK", (blank, blank, blank, black)), box, mask.crop(box))
+    return cmyk
+
+
+__all__ = ["SeparationSettings", "separate_array", "separate", "LUT_SIZE"]
@@ -0,0 +1,73 @@
+"""
+One RGB -> CMYK separation step for finished cards and pages.
+
+Cards are composed in RGB and converted exactly once at the end. With a
+press ICC profile configured (``color.press_profile`` in config.json or
+``FILES2BOOK_PRESS_ICC``), the conversion goes through an ImageCms transform
+from sRGB that is built once per process and reused for every card;
+without one it uses the numpy/LUT separation in ``cmyk_separation`` (GCR,
+ink limit, K-only black text).
+"""
+
+from __future__ import annotations
+
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageCms
+
+import render_metrics
+from cmyk_separation import separate
+from config_loader import get_press_icc_profile
+
+RENDERING_INTENT = ImageCms.Intent.RELATIVE_COLORIMETRIC
+
+# Explicit override (set_press_profile); None means use config
+_press_profile: Optional[Path] = None
+
+
+def set_press_profile(path) -> None:
+    """Override the press profile for this process (None restores the configured one)."""
+    global _press_profile
+    _press_profile = Path(path).expanduser() if path else None
+
+
+def press_profile_path() -> Optional[Path]:
+    return _press_profile or get_press_icc_profile()
+
+
+@lru_cache(maxsize=4)
+def _press_transform(profile_path: str) -> Optional[ImageCms.ImageCmsTransform]:
+    try:
+        transform = ImageCms.buildTransform(
+            ImageCms.createProfile("sRGB"),
+            ImageCms.getOpenProfile(profile_path),
+            "RGB",
+            "CMYK",
+            renderingIntent=RENDERING_INTENT,
+            flags=ImageCms.Flags.BLACKPOINTCOMPENSATION,
+        )
+    except (OSError, ImageCms.PyCMSError) as exc:
+        logging.warning("Cannot use press profile %s (%s); using the built-in CMYK separation", profile_path, exc)
+        return None
+    logging.info("Separating CMYK output with press profile %s", profile_path)
+    return transform
+
+
+def to_press_cmyk(img: Image.Image) -> Image.Image:
+    """Convert a finished RGB(A)/L image to CMYK for print (CMYK input is returned as is)."""
+    if img.mode == "CMYK":
+        return img
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    profile = press_profile_path()
+    transform = _press_transform(str(profile)) if profile else None
+    if transform is None:
+        return separate(img)
+    render_metrics.increment("color.cmyk_icc")
+    return ImageCms.applyTransform(img, transform)
+
+
+__all__ = ["set_press_profile", "press_profile_path", "to_press_cmyk"]
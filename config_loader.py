@@ -1,7 +1,12 @@
 """
 Helpers for reading Files2Book configuration without exploding when the
-config file is missing. Right now the only public API we need is
-`get_font_path`, which returns an absolute path to the preferred font.
+config file is missing. `get_font_path` returns an absolute path to the
+preferred font, `get_raw_preview_strategy` picks how raw previews decode and
+`get_press_icc_profile` names the profile CMYK cards are separated with and
+`get_render_history_path` is where runs record timings for ``--plan``.
+`get_card_codec` and `get_card_save_workers` choose how intermediate card
+files are encoded and how many threads encode them, and
+`get_pdf_image_policy` how card images are compressed in assembled PDFs.
 """
 
 from __future__ import annotations
@@ -72,4 +77,205 @@ def get_font_path() -> str:
     return ""
 
 
-__all__ = ["load_config", "get_font_path"]
+RAW_PREVIEW_STRATEGIES = ("auto", "embedded", "half_size", "full")
+
+
+def get_raw_preview_strategy() -> str:
+    """
+    Return how raw (DNG) previews are decoded: "auto" (embedded preview when it
+    is large enough, else half-size demosaic), "embedded", "half_size" or "full".
+    Read from env FILES2BOOK_RAW_PREVIEW or config.json "raw_preview.strategy".
+    """
+    config = load_config()
+    value = os.getenv("FILES2BOOK_RAW_PREVIEW")
+    if not value and isinstance(config.get("raw_preview"), dict):
+        value = config["raw_preview"].get("strategy")
+    value = (value or "auto").strip().lower()
+    if value not in RAW_PREVIEW_STRATEGIES:
+        logging.warning("Unknown raw preview strategy %r; using 'auto'.", value)
+        return "auto"
+    return value
+
+
+def get_thumbnail_cache_dir() -> Optional[Path]:
+    """
+    Return the persistent thumbnail pyramid directory, or None when the cache
+    is disabled. Read from env FILES2BOOK_THUMBNAIL_CACHE or config.json
+    "thumbnail_cache.dir".
+    """
+    config = load_config()
+    value = os.getenv("FILES2BOOK_THUMBNAIL_CACHE")
+    if not value and isinstance(config.get("thumbnail_cache"), dict):
+        value = config["thumbnail_cache"].get("dir")
+    if not value:
+        return None
+    return _resolve_path(value)
+
+
+DEFAULT_MAX_DECODE_MB = 512
+
+
+def get_max_decode_mb() -> int:
+    """
+    Return the per-worker memory ceiling (MB) for decoding one raster.
+    Read from env FILES2BOOK_MAX_DECODE_MB or config.json "large_image.max_decode_mb".
+    """
+    config = load_config()
+    value: Any = os.getenv("FILES2BOOK_MAX_DECODE_MB")
+    if not value and isinstance(config.get("large_image"), dict):
+        value = config["large_image"].get("max_decode_mb")
+    try:
+        return max(16, int(value)) if value else DEFAULT_MAX_DECODE_MB
+    except (TypeError, ValueError):
+        logging.warning("Invalid max_decode_mb %r; using %d.", value, DEFAULT_MAX_DECODE_MB)
+        return DEFAULT_MAX_DECODE_MB
+
+
+def get_press_icc_profile() -> Optional[Path]:
+    """
+    Return the press (output) ICC profile used to separate CMYK cards, or
+    None to use Pillow's plain RGB->CMYK conversion. Read from env
+    FILES2BOOK_PRESS_ICC or config.json "color.press_profile".
+    """
+    config = load_config()
+    value = os.getenv("FILES2BOOK_PRESS_ICC")
+    if not value and isinstance(config.get("color"), dict):
+        value = config["color"].get("press_profile")
+    if not value:
+        return None
+    return _resolve_path(value)
+
+
+DEFAULT_CMYK_SEPARATION = {"gcr": 1.0, "ink_limit": 300.0, "preserve_black": True}
+
+
+def get_cmyk_separation() -> Dict[str, Any]:
+    """
+    Return the numpy CMYK separation settings used when no press profile is
+    configured: "gcr" (0-1), "ink_limit" (total ink %, 100-400) and
+    "preserve_black" (K-only neutrals). Read from config.json "cmyk_separation".
+    """
+    config = load_config()
+    settings = dict(DEFAULT_CMYK_SEPARATION)
+    if isinstance(config.get("cmyk_separation"), dict):
+        raw = config["cmyk_separation"]
+        try:
+            if "gcr" in raw:
+                settings["gcr"] = min(1.0, max(0.0, float(raw["gcr"])))
+            if "ink_limit" in raw:
+                settings["ink_limit"] = min(400.0, max(100.0, float(raw["ink_limit"])))
+            if "preserve_black" in raw:
+                settings["preserve_black"] = bool(raw["preserve_black"])
+        except (TypeError, ValueError):
+            logging.warning("Invalid cmyk_separation settings %r; using defaults.", raw)
+            return dict(DEFAULT_CMYK_SEPARATION)
+    return settings
+
+
+DEFAULT_RENDER_HISTORY = Path("~/.cache/files2book/render_history.json")
+
+
+def get_render_history_path() -> Optional[Path]:
+    """
+    Return the JSON file runs record their per-type render timings in (read
+    by --plan), or None when disabled with an empty "planning.history_file".
+    Read from env FILES2BOOK_RENDER_HISTORY or config.json
+    "planning.history_file".
+    """
+    config = load_config()
+    value = os.getenv("FILES2BOOK_RENDER_HISTORY")
+    if value is None and isinstance(config.get("planning"), dict):
+        value = config["planning"].get("history_file", str(DEFAULT_RENDER_HISTORY))
+    if value is None:
+        return DEFAULT_RENDER_HISTORY.expanduser()
+    if not value:
+        return None
+    return _resolve_path(value)
+
+
+DEFAULT_CARD_CODEC = "deflate"
+
+
+def get_card_codec() -> str:
+    """
+    Return the intermediate card codec spec, "name" or "name:level" (see
+    card_writer.CODECS). Read from env FILES2BOOK_CARD_CODEC or config.json
+    "card_output.codec".
+    """
+    config = load_config()
+    value = os.getenv("FILES2BOOK_CARD_CODEC")
+    if not value and isinstance(config.get("card_output"), dict):
+        value = config["card_output"].get("codec")
+    return (value or DEFAULT_CARD_CODEC).strip().lower()
+
+
+def get_card_save_workers() -> Optional[int]:
+    """
+    Return how many threads encode card files in the background (0 writes
+    them inline), or None for the default. Read from env
+    FILES2BOOK_SAVE_WORKERS or config.json "card_output.save_workers".
+    """
+    config = load_config()
+    value: Any = os.getenv("FILES2BOOK_SAVE_WORKERS")
+    if not value and isinstance(config.get("card_output"), dict):
+        value = config["card_output"].get("save_workers")
+    if value is None or value == "":
+        return None
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        logging.warning("Invalid save_workers %r; using the default.", value)
+        return None
+
+
+PDF_IMAGE_POLICIES = ("auto", "lossless", "dct")
+DEFAULT_PDF_IMAGE_POLICY = {"mode": "auto", "jpeg_quality": 92, "subsampling": "4:4:4"}
+
+
+def get_pdf_image_policy() -> Dict[str, Any]:
+    """
+    Return how images are encoded in assembled PDFs: "mode" ("auto" picks
+    JPEG or Flate per card type, "lossless" is Flate everywhere, "dct" JPEG
+    everywhere), "jpeg_quality" (1-100) and "subsampling" ("4:4:4", "4:2:2"
+    or "4:2:0"). Read from config.json "pdf_output"; env FILES2BOOK_PDF_IMAGES
+    overrides the mode.
+    """
+    config = load_config()
+    settings = dict(DEFAULT_PDF_IMAGE_POLICY)
+    if isinstance(config.get("pdf_output"), dict):
+        raw = config["pdf_output"]
+        try:
+            if "mode" in raw:
+                settings["mode"] = str(raw["mode"]).strip().lower()
+            if "jpeg_quality" in raw:
+                settings["jpeg_quality"] = min(100, max(1, int(raw["jpeg_quality"])))
+            if "subsampling" in raw:
+                settings["subsampling"] = str(raw["subsampling"]).strip()
+        except (TypeError, ValueError):
+            logging.warning("Invalid pdf_output settings %r; using defaults.", raw)
+            return dict(DEFAULT_PDF_IMAGE_POLICY)
+    settings["mode"] = (os.getenv("FILES2BOOK_PDF_IMAGES") or settings["mode"]).strip().lower()
+    if settings["mode"] not in PDF_IMAGE_POLICIES:
+        logging.warning("Unknown PDF image policy %r; using 'auto'.", settings["mode"])
+        settings["mode"] = "auto"
+    if settings["subsampling"] not in ("4:4:4", "4:2:2", "4:2:0"):
+        logging.warning("Unknown JPEG subsampling %r; using 4:4:4.", settings["subsampling"])
+        settings["subsampling"] = "4:4:4"
+    return settings
+
+
+__all__ = [
+    "load_config",
+    "get_font_path",
+    "RAW_PREVIEW_STRATEGIES",
+    "get_raw_preview_strategy",
+    "get_thumbnail_cache_dir",
+    "get_max_decode_mb",
+    "get_press_icc_profile",
+    "get_cmyk_separation",
+    "get_render_history_path",
+    "get_card_codec",
+    "get_card_save_workers",
+    "PDF_IMAGE_POLICIES",
+    "get_pdf_image_policy",
+]
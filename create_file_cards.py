@@ -3,7 +3,6 @@ import os
 import sys
 from pathlib import Path
 from PIL import Image
-from PIL.ExifTags import TAGS
 import argparse
 #from fpdf import FPDF
 import logging
@@ -17,7 +16,6 @@ import csv
 import json
 import tempfile
 import zipfile
-from datetime import datetime
 
 
 os.environ["PYDEVD_WARN_EVALUATION_TIMEOUT"] = "120000" # that's 2 minutes!
@@ -43,8 +41,21 @@ exclude_exts = None
 #         return False
 #     return p.is_file() and p.suffix.lower() in IMAGE_EXTS
 
-from file_card_generator import create_file_info_card, determine_file_type, save_card_as_tiff
+from file_card_generator import create_file_info_card, determine_file_type
 import file_card_generator
+from video_decode_pool import VideoFramePrefetcher, configure_decoder_threads, decoder_thread_budget
+import render_metrics
+from image_descriptor import get_image_descriptor
+import thumbnail_pyramid
+import memory_governor
+import color_pipeline
+import run_planner
+import preview_registry
+import card_writer
+import pdf_policy
+import pdf_book
+from chunk_assembler import DEFAULT_PENDING_CHUNKS, ChunkAssembler
+from memory_governor import estimate_peak_bytes, get_governor
 
 global_glob_pattern = ["*_card.*", "*_card_*.*", "* card.*", "* card_*.*"]
 
@@ -61,6 +72,8 @@ def get_non_dot_card_files(directory: Path):
                     matched_files.add(f.resolve())
                 except Exception:
                     matched_files.add(f)
+    # Cards still being encoded in the background count as written
+    matched_files.update(card_writer.pending(directory))
     return matched_files
 
 def parse_page_size(size_name):
@@ -127,12 +140,17 @@ def _process_file_iterable(
     cards_per_chunk: int = 0,
     pdf_name=None,
     delete_cards_after_pdf: bool = False,
-    ignore_unknown_files: bool = True
+    ignore_unknown_files: bool = True,
+    video_workers: int = 0,
+    pending_chunks: int = DEFAULT_PENDING_CHUNKS
 ):
     """
     Shared processing loop for an iterable of file paths. Handles card creation,
     saving, chunking, PDF assembly per-chunk, and optional deletion of chunk
-    images after PDF creation.
+    images after PDF creation. With video_workers > 0, video frames are decoded
+    ahead of the render loop by that many worker processes. Chunk PDFs are
+    assembled in the background with at most pending_chunks in flight
+    (0 assembles each chunk before rendering continues).
     """
     current_chunk_file_count = 0
     chunk_idx = 0
@@ -180,6 +198,41 @@ def _process_file_iterable(
             logging.debug(f"Skipping non-file entry: {pth}")
 
     logging.info(f"Total files to process: {total_files_to_process_count}")
+    file_card_generator.warm_card_fonts(width, height)
+    # Import only the preview renderers this run's file types need
+    preview_registry.preload({Path(
+        p['filepath'] if isinstance(p, dict) and 'filepath' in p
+        else p['uri'] if isinstance(p, dict) and 'uri' in p
+        else p['file'] if isinstance(p, dict) and 'file' in p
+        else p
+    ).suffix for p in files_to_process})
+
+    # Decode video frames for upcoming movie files in parallel, each decoder limited
+    # to its share of the CPU so the pool doesn't oversubscribe cores
+    video_prefetcher = None
+    governor = get_governor()
+    # Full chunks become PDFs on a background thread while the next chunk renders
+    chunk_assembler = ChunkAssembler(assemble_cards_to_pdf, (width, height), delete_cards_in_directory, max_pending=pending_chunks)
+    if video_workers and video_workers > 0:
+        video_paths = []
+        for p in files_to_process:
+            pth = Path(
+                p['filepath'] if isinstance(p, dict) and 'filepath' in p
+                else p['uri'] if isinstance(p, dict) and 'uri' in p
+                else p['file'] if isinstance(p, dict) and 'file' in p
+                else p
+            )
+            if determine_file_type(pth) == "movie":
+                video_paths.append(pth)
+        if video_paths:
+            configure_decoder_threads(decoder_thread_budget(video_workers))
+            video_prefetcher = VideoFramePrefetcher(
+                video_paths,
+                workers=video_workers,
+                total_frames=max_video_frames if max_video_frames > 0 else 9,
+                max_size=(width, height),
+                governor=governor,
+            )
 
     # Iterate again for actual processing
     for p in files_to_process:
@@ -193,6 +246,11 @@ def _process_file_iterable(
         try:
             file_type = determine_file_type(file_path)
             logging.debug(f"Processing {file_path.name} - Type: {file_type}")
+            # Wait for memory headroom before heavy previews (video decodes may be running in workers)
+            peak_bytes = estimate_peak_bytes(
+                file_path, file_type, card_size=(width, height),
+                video_frames=max_video_frames if max_video_frames > 0 else 9,
+            )
 
             metadata = p.get('metadata') if isinstance(p, dict) and 'metadata' in p else None
             title = metadata['title'] if metadata and 'title' in metadata else file_path.stem
@@ -200,39 +258,43 @@ def _process_file_iterable(
             # PATCH: For video files, generate two cards: first frame and grid
             if file_type == "movie":
                 # First frame card
-                card_first = create_file_info_card(
-                    file_path,
-                    width=width,
-                    height=height,
-                    cmyk_mode=cmyk_mode,
-                    exclude_file_path=exclude_file_path,
-                    border_color=border_color,
-                    border_inch_width=border_inch_width,
-                    include_video_frames=False,
-                    max_video_frames=max_video_frames,
-                    metadata_text=metadata_text,
-                    metadata=metadata,
-                    title=title,
-                    video_mode="first_frame",
-                    ignore_unknown_files=ignore_unknown_files
-                )
+                with governor.admit(peak_bytes), render_metrics.timed(f"render.{file_type}"):
+                    card_first = create_file_info_card(
+                        file_path,
+                        width=width,
+                        height=height,
+                        cmyk_mode=cmyk_mode,
+                        exclude_file_path=exclude_file_path,
+                        border_color=border_color,
+                        border_inch_width=border_inch_width,
+                        include_video_frames=False,
+                        max_video_frames=max_video_frames,
+                        metadata_text=metadata_text,
+                        metadata=metadata,
+                        title=title,
+                        video_mode="first_frame",
+                        ignore_unknown_files=ignore_unknown_files
+                    )
                 # Grid card
-                card_grid = create_file_info_card(
-                    file_path,
-                    width=width,
-                    height=height,
-                    cmyk_mode=cmyk_mode,
-                    exclude_file_path=exclude_file_path,
-                    border_color=border_color,
-                    border_inch_width=border_inch_width,
-                    include_video_frames=include_video_frames,
-                    max_video_frames=max_video_frames,
-                    metadata_text=metadata_text,
-                    metadata=metadata,
-                    title=title,
-                    video_mode="grid",
-                    ignore_unknown_files=ignore_unknown_files
-                )
+                video_frames = video_prefetcher.get(file_path) if video_prefetcher else None
+                with governor.admit(peak_bytes), render_metrics.timed(f"render.{file_type}"):
+                    card_grid = create_file_info_card(
+                        file_path,
+                        width=width,
+                        height=height,
+                        cmyk_mode=cmyk_mode,
+                        exclude_file_path=exclude_file_path,
+                        border_color=border_color,
+                        border_inch_width=border_inch_width,
+                        include_video_frames=include_video_frames,
+                        max_video_frames=max_video_frames,
+                        metadata_text=metadata_text,
+                        metadata=metadata,
+                        title=title,
+                        video_mode="grid",
+                        _video_frames=video_frames,
+                        ignore_unknown_files=ignore_unknown_files
+                    )
 
                 # Save both cards
                 for idx, card_img in enumerate([card_first, card_grid]):
@@ -247,35 +309,35 @@ def _process_file_iterable(
                         output_file = chunk_dir / f"{current_chunk_file_count:04d}_{file_path.stem}_{['firstframe','grid'][idx]}_card.tiff"
                     else:
                         output_file = output_path / f"{current_chunk_file_count:04d}_{file_path.stem}_{['firstframe','grid'][idx]}_card.tiff"
-                    save_card_as_tiff(card_img, output_file, cmyk_mode=cmyk_mode)
+                    output_file = card_writer.get_writer().submit(card_img, output_file, cmyk_mode=cmyk_mode, card_type=file_type)
+                    pdf_book.record_card_title(output_file, title)
                     logging.info(f"Saved card to {output_file}")
                     total_files_handled_count += 1
+                    render_metrics.increment(f"cards.{file_type}")
                     current_chunk_file_count = get_count_of_non_dot_card_files(chunk_dir if cards_per_chunk and cards_per_chunk > 0 else output_path)
                     if cards_per_chunk and cards_per_chunk > 0 and current_chunk_file_count % cards_per_chunk == 0:
                         pdf_name_chunk = f"{output_path.name}_chunk_{chunk_idx:04d}.pdf"
                         pdf_path_chunk = str(chunk_dir / pdf_name_chunk)
-                        logging.info(f"Assembling PDF for chunk {chunk_idx}: {pdf_path_chunk}")
-                        assemble_cards_to_pdf(str(chunk_dir), pdf_path_chunk, (width, height))
-                        logging.info(f"Saved chunk PDF: {pdf_path_chunk}")
-                        if delete_cards_after_pdf:
-                            delete_cards_in_directory(chunk_dir)
+                        logging.info(f"Queueing PDF assembly for chunk {chunk_idx}: {pdf_path_chunk}")
+                        chunk_assembler.submit(chunk_dir, pdf_path_chunk, delete_cards=delete_cards_after_pdf)
             else:
-                card = create_file_info_card(
-                    file_path,
-                    width=width,
-                    height=height,
-                    cmyk_mode=cmyk_mode,
-                    exclude_file_path=exclude_file_path,
-                    border_color=border_color,
-                    border_inch_width=border_inch_width,
-                    include_video_frames=include_video_frames,
-                    max_video_frames=max_video_frames,
-                    metadata_text=metadata_text,
-                    metadata=metadata,
-                    all_pdf_pages=args.all_pdf_pages,
-                    title=title,
-                    ignore_unknown_files=ignore_unknown_files
-                )
+                with governor.admit(peak_bytes), render_metrics.timed(f"render.{file_type}"):
+                    card = create_file_info_card(
+                        file_path,
+                        width=width,
+                        height=height,
+                        cmyk_mode=cmyk_mode,
+                        exclude_file_path=exclude_file_path,
+                        border_color=border_color,
+                        border_inch_width=border_inch_width,
+                        include_video_frames=include_video_frames,
+                        max_video_frames=max_video_frames,
+                        metadata_text=metadata_text,
+                        metadata=metadata,
+                        all_pdf_pages=args.all_pdf_pages,
+                        title=title,
+                        ignore_unknown_files=ignore_unknown_files
+                    )
                 if card is None:
                     logging.warning(f"No card generated for {file_path}. Skipping.")
                     continue
@@ -290,18 +352,17 @@ def _process_file_iterable(
                             output_file = chunk_dir / f"{current_chunk_file_count:04d}_{file_path.stem}_card_{idx+1}.tiff"
                         else:
                             output_file = output_path / f"{total_files_handled_count:04d}_{file_path.stem}_card_{idx+1}.tiff"
-                        save_card_as_tiff(card_img, output_file, cmyk_mode=cmyk_mode)
+                        output_file = card_writer.get_writer().submit(card_img, output_file, cmyk_mode=cmyk_mode, card_type=file_type)
+                        pdf_book.record_card_title(output_file, title)
                         total_files_handled_count += 1
+                        render_metrics.increment(f"cards.{file_type}")
                         logging.info(f"Saved card to {output_file}")
                         current_chunk_file_count = get_count_of_non_dot_card_files(chunk_dir if cards_per_chunk and cards_per_chunk > 0 else output_path)
                         if cards_per_chunk and cards_per_chunk > 0 and current_chunk_file_count % cards_per_chunk == 0:
                             pdf_name_chunk = f"{output_path.name}_chunk_{chunk_idx:04d}.pdf"
                             pdf_path_chunk = str(chunk_dir / pdf_name_chunk)
-                            logging.info(f"Assembling PDF for chunk {chunk_idx}: {pdf_path_chunk}")
-                            assemble_cards_to_pdf(str(chunk_dir), pdf_path_chunk, (width, height))
-                            logging.info(f"Saved chunk PDF: {pdf_path_chunk}")
-                            if delete_cards_after_pdf:
-                                delete_cards_in_directory(chunk_dir)
+                            logging.info(f"Queueing PDF assembly for chunk {chunk_idx}: {pdf_path_chunk}")
+                            chunk_assembler.submit(chunk_dir, pdf_path_chunk, delete_cards=delete_cards_after_pdf)
                 else:
                     card_size = card.size
                     if cards_per_chunk and cards_per_chunk > 0:
@@ -312,40 +373,42 @@ def _process_file_iterable(
                         output_file = chunk_dir / f"{current_chunk_file_count:04d}_{file_path.stem}_card.tiff"
                     else:
                         output_file = output_path / f"{current_chunk_file_count:04d}_{file_path.stem}_card.tiff"
-                    save_card_as_tiff(card, output_file, cmyk_mode=cmyk_mode)
+                    output_file = card_writer.get_writer().submit(card, output_file, cmyk_mode=cmyk_mode, card_type=file_type)
+                    pdf_book.record_card_title(output_file, title)
                     logging.debug(f"Saved card to {output_file} with size: {card_size}")
                     total_files_handled_count += 1
+                    render_metrics.increment(f"cards.{file_type}")
                     current_chunk_file_count = get_count_of_non_dot_card_files(chunk_dir if cards_per_chunk and cards_per_chunk > 0 else output_path)
                     if cards_per_chunk and cards_per_chunk > 0 and current_chunk_file_count % cards_per_chunk == 0:
                         pdf_name_chunk = f"{output_path.name}_chunk_{chunk_idx:04d}.pdf"
                         pdf_path_chunk = str(chunk_dir / pdf_name_chunk)
-                        logging.info(f"Assembling PDF for chunk {chunk_idx}: {pdf_path_chunk}")
-                        assemble_cards_to_pdf(str(chunk_dir), pdf_path_chunk, (width, height))
-                        logging.info(f"Saved chunk PDF: {pdf_path_chunk}")
-                        if delete_cards_after_pdf:
-                            delete_cards_in_directory(chunk_dir)
+                        logging.info(f"Queueing PDF assembly for chunk {chunk_idx}: {pdf_path_chunk}")
+                        chunk_assembler.submit(chunk_dir, pdf_path_chunk, delete_cards=delete_cards_after_pdf)
         except Exception as e:
             logging.error(f"Error processing {file_path.name}: {e}")
             logging.error("Traceback:\n" + traceback.format_exc())
 
+    if video_prefetcher is not None:
+        video_prefetcher.close()
+    card_writer.flush()
+
     # After the loop: Handle the last chunk (if any cards remain)
     if cards_per_chunk and cards_per_chunk > 0:
         try:
             if 'current_chunk_file_count' in locals() and (current_chunk_file_count % cards_per_chunk != 0 or total_files_handled_count >= total_files_to_process_count):
                 pdf_name_chunk = f"{pdf_name}_chunk_{chunk_idx:04d}.pdf" if pdf_name else f"{output_path.name}_chunk_{chunk_idx:04d}.pdf"
                 pdf_path_chunk = str(chunk_dir / pdf_name_chunk)
-                logging.info(f"Assembling final PDF for chunk {chunk_idx}: {pdf_path_chunk}")
-                assemble_cards_to_pdf(str(chunk_dir), pdf_path_chunk, (width, height))
-                logging.info(f"Saved final chunk PDF: {pdf_path_chunk}")
+                logging.info(f"Queueing final PDF assembly for chunk {chunk_idx}: {pdf_path_chunk}")
+                chunk_assembler.submit(chunk_dir, pdf_path_chunk, delete_cards=delete_cards_after_pdf)
 
-                if delete_cards_after_pdf:
-                    delete_cards_in_directory(chunk_dir)
         except Exception as e:
             logging.error(f"Error assembling final chunk PDF: {e}")
+    # Wait for the chunk PDFs still assembling; raises ChunkAssemblyError naming any that failed
+    chunk_assembler.close()
 
     try:
         # Count recursively to include cards saved in chunk subdirectories
-        n_cards = sum(1 for _ in output_path.rglob('*.tiff'))
+        n_cards = len(get_non_dot_card_files(output_path))
     except Exception:
         n_cards = ''
     logging.info(f"\nProcessing complete. Generated {n_cards} file cards in {output_path}")
@@ -384,7 +447,9 @@ def build_file_cards_from_list(
     cards_per_chunk=0,
     pdf_name=None,
     delete_cards_after_pdf: bool = False,
-    ignore_unknown_files: bool = True
+    ignore_unknown_files: bool = True,
+    video_workers: int = 0,
+    pending_chunks: int = DEFAULT_PENDING_CHUNKS
 ):
     """
     Wrapper that prepares output directory and delegates to _process_file_iterable
@@ -466,7 +531,9 @@ def build_file_cards_from_list(
         cards_per_chunk=cards_per_chunk,
         pdf_name=pdf_name,
         delete_cards_after_pdf=delete_cards_after_pdf,
-        ignore_unknown_files=ignore_unknown_files
+        ignore_unknown_files=ignore_unknown_files,
+        video_workers=video_workers,
+        pending_chunks=pending_chunks
     )
 
 
@@ -487,7 +554,9 @@ def build_file_cards_from_directory(
     cards_per_chunk=0,
     pdf_name=None,
     delete_cards_after_pdf: bool = False,
-    ignore_unknown_files: bool = True
+    ignore_unknown_files: bool = True,
+    video_workers: int = 0,
+    pending_chunks: int = DEFAULT_PENDING_CHUNKS
 ):
     """
     Test the file card generation by creating cards for all files in a directory.
@@ -505,6 +574,8 @@ def build_file_cards_from_directory(
         metadata_text: Custom metadata text to include on the card
         cards_per_chunk: If >0, split card images into chunked folders of this many cards and produce one PDF per chunk
         pdf_name: Name of the output PDF file (default: assembled)
+        video_workers: If >0, decode video frames in this many parallel worker processes
+        pending_chunks: Chunk PDFs that may be queued or assembling while rendering continues (0 = assemble inline)
     """
     logging.info(f"Starting file card with size {page_size}")
     input_path = Path(input_dir)
@@ -545,12 +616,14 @@ def build_file_cards_from_directory(
         cards_per_chunk=cards_per_chunk,
         pdf_name=pdf_name,
         delete_cards_after_pdf=delete_cards_after_pdf,
-        ignore_unknown_files=ignore_unknown_files
+        ignore_unknown_files=ignore_unknown_files,
+        video_workers=video_workers,
+        pending_chunks=pending_chunks
     )
 
     try:
         # Count recursively to include cards in chunk folders
-        n_cards = sum(1 for _ in output_path.rglob('*.tiff'))
+        n_cards = len(get_non_dot_card_files(output_path))
     except Exception:
         n_cards = ''
     logging.info(f"\nProcessing complete. Generated {n_cards} file cards in {output_path}")
@@ -573,6 +646,8 @@ def assemble_cards_to_pdf(output_dir, pdf_file, page_size):
         logging.info("img2pdf not available, using FPDF")
     
     output_path = Path(output_dir)
+    # Cards are encoded in the background; every one must be on disk before img2pdf reads them
+    card_writer.flush(output_path)
     
     # Get list of all card files, including multi-page video frames
     try:
@@ -608,8 +683,8 @@ def assemble_cards_to_pdf(output_dir, pdf_file, page_size):
         else:
             converted_files.append(str(f))
 
-    # If using img2pdf and we have TIFF files, use it directly
-    if use_img2pdf and any(Path(f).suffix.lower() == '.tiff' or Path(f).suffix.lower() == '.tif' for f in converted_files):
+    # If using img2pdf and we have TIFF (or PNG) card files, use it directly
+    if use_img2pdf and any(Path(f).suffix.lower() in ('.tiff', '.tif', '.png') for f in converted_files):
         try:
             # Filter to only include image files that img2pdf supports
             valid_extensions = ['.jpg', '.jpeg', '.png', '.tiff', '.tif', '.webp']
@@ -617,7 +692,14 @@ def assemble_cards_to_pdf(output_dir, pdf_file, page_size):
 
             if image_files:
                 logging.debug(f"Creating PDF with img2pdf using {len(image_files)} images")
-                with open(pdf_file, "wb") as f:
+                assemble_start = time.perf_counter()
+                policy = pdf_policy.get_policy()
+                policy_report = pdf_policy.PolicyReport()
+                # Outline entries name each page after its card
+                page_titles = [pdf_book.card_title(card_file) for card_file in image_files]
+                with tempfile.TemporaryDirectory(prefix="files2book_pdf_") as jpeg_dir, open(pdf_file, "wb") as f:
+                    # Photo cards go in as JPEG copies, which img2pdf embeds without re-encoding
+                    image_files = _encode_cards_for_pdf(image_files, policy, policy_report, Path(jpeg_dir))
                     # img2pdf works with points (1/72 inch)
                     # Convert our 300dpi measurements to points
                     width_pt = page_size[0] / 300 * 72  # Convert from pixels at 300dpi to points
@@ -627,8 +709,15 @@ def assemble_cards_to_pdf(output_dir, pdf_file, page_size):
                     # layout = img2pdf.get_layout_fun({
                     #     "pagesize": (width_pt, height_pt)
                     # })
-                    f.write(img2pdf.convert(image_files, pagesize=(width_pt, height_pt)))
+                    pdf_book.save_with_outline(img2pdf.convert(image_files, pagesize=(width_pt, height_pt)), page_titles, f)
                 logging.info(f"Combined PDF saved to {pdf_file}")
+                for line in policy_report.lines():
+                    logging.info(line)
+                # Pages, bytes and time per page feed the render history used by --plan
+                render_metrics.observe("pdf.assemble", time.perf_counter() - assemble_start)
+                render_metrics.increment("pdf.pages", len(image_files))
+                render_metrics.increment("pdf.bytes", os.path.getsize(pdf_file))
+                render_metrics.increment("pdf.dct_saved_bytes", policy_report.saved_bytes)
                 return
         except Exception as e:
             logging.error(f"Error using img2pdf: {e} (type: {type(e)})")
@@ -636,6 +725,46 @@ def assemble_cards_to_pdf(output_dir, pdf_file, page_size):
             logging.error(f"Image files passed to img2pdf: {image_files}")
             logging.error("Bust.")
 
+def _encode_cards_for_pdf(image_files, policy, report, jpeg_dir: Path):
+    """
+    Apply the PDF image policy to a chunk's card files: cards it sends to
+    JPEG are encoded into jpeg_dir and replaced by those copies in the
+    returned list; the rest, and any card whose JPEG would not be smaller
+    than its estimated lossless size, stay lossless. Tallies both in report.
+    """
+    encoded = []
+    for index, card_file in enumerate(image_files):
+        card_type = pdf_policy.card_type_of(card_file)
+        # Flat card types are known without decoding the card
+        if policy.mode == "lossless" or (policy.mode == "auto" and card_type and card_type not in policy.dct_card_types):
+            report.add("flate")
+            encoded.append(card_file)
+            continue
+        try:
+            with Image.open(card_file) as im:
+                im.load()
+                if policy.encoding_for(card_type, im) != "dct":
+                    report.add("flate")
+                    encoded.append(card_file)
+                    continue
+                data = policy.encode_jpeg(im)
+                flate_bytes = pdf_policy.estimate_flate_bytes(im)
+        except Exception as e:
+            logging.warning(f"Keeping {card_file} lossless in the PDF: {e}")
+            report.add("flate")
+            encoded.append(card_file)
+            continue
+        if len(data) >= flate_bytes:
+            # A JPEG no smaller than the lossless card is no saving
+            report.add("flate")
+            encoded.append(card_file)
+            continue
+        jpeg_path = jpeg_dir / f"{index:05d}_{Path(card_file).stem}.jpg"
+        jpeg_path.write_bytes(data)
+        report.add("dct", len(data), flate_bytes)
+        encoded.append(str(jpeg_path))
+    return encoded
+
 def _decode_metadata_text(s: str) -> str:
     # Minimal, safe escape handling for CLI input
     return (
@@ -655,7 +784,6 @@ def delete_cards_in_directory(chunk_dir: Path):
                 continue  # Skip non-image files
             try:
                 card_file.unlink()
-                time.sleep(0.01)
             except Exception as e:
                 logging.error(f"Error deleting {card_file}: {e}")
                 logging.error("Traceback:\n" + traceback.format_exc())
@@ -678,6 +806,8 @@ def get_non_dot_card_files(directory: Path):
                     matched_files.add(f.resolve())
                 except Exception:
                     matched_files.add(f)
+    # Cards still being encoded in the background count as written
+    matched_files.update(card_writer.pending(directory))
     return matched_files
 
 
@@ -711,20 +841,13 @@ def expand_zip_files(file_list):
 
 
 def get_file_creation_date(fp):
-    # Try EXIF for images
+    # Try EXIF for images (the descriptor is cached, so the card reuses this read)
     try:
-        img = Image.open(fp)
-        exif = img._getexif()
-        if exif:
-            for tag, value in exif.items():
-                decoded = TAGS.get(tag, tag)
-                if decoded in ("DateTimeOriginal", "DateTime", "DateTimeDigitized"):
-                    # Format: "YYYY:MM:DD HH:MM:SS"
-                    try:
-                        dt = datetime.strptime(value, "%Y:%m:%d %H:%M:%S")
-                        return dt.timestamp()
-                    except Exception:
-                        pass
+        descriptor = get_image_descriptor(fp)
+        if descriptor is not None:
+            timestamp = descriptor.capture_timestamp()
+            if timestamp is not None:
+                return timestamp
     except Exception:
         pass
     # Fallback: filesystem mtime
@@ -756,8 +879,27 @@ if __name__ == "__main__":
     parser.add_argument('--cards-per-chunk', type=int, default=0, help='If >0, split card images into chunked folders of this many cards and produce one PDF per chunk')
     parser.add_argument('--slack-data-root', help='Path to Slack export root (directory containing messages.json and files/). If provided, the script will treat input as Slack data and resolve relative filepaths accordingly.')
     parser.add_argument('--ignore-unknown-files', default=True, action='store_true', help='Ignore files of unknown type instead of trying to create a card (default: ignore)')
+    parser.add_argument('--video-workers', type=int, default=0, help='Decode video frames in this many parallel worker processes, each with cpu_count/N decoder threads (default: 0, decode serially)')
+    parser.add_argument('--memory-budget-mb', type=int, default=0, help='Memory budget shared by card rendering and video decode workers; heavy previews wait for headroom and run one at a time (default: 0, 70%% of available RAM)')
+    parser.add_argument('--press-profile', default=None, help='Press ICC profile used to separate --cmyk-mode cards (default: config.json color.press_profile, else built-in GCR separation)')
+    parser.add_argument('--thumbnail-cache', default=None, help='Directory for the persistent thumbnail pyramid shared across runs and page sizes (default: config.json thumbnail_cache.dir, else disabled)')
+    parser.add_argument('--card-codec', default=None, help='Lossless codec for intermediate card files: deflate, lzw, zstd (if libtiff supports it), none, or png[:level] for RGB cards (default: config.json card_output.codec, else deflate)')
+    parser.add_argument('--save-workers', type=int, default=None, help='Threads that encode card files in the background while the next card renders; 0 writes them inline (default: config.json card_output.save_workers, else up to 4)')
+    parser.add_argument('--pdf-images', choices=['auto', 'lossless', 'dct'], default=None, help='How card images are compressed in PDFs: auto (JPEG for photo, video and PDF cards, Flate for text-like cards), lossless (Flate for all) or dct (JPEG for all) (default: config.json pdf_output.mode, else auto)')
+    parser.add_argument('--pdf-jpeg-quality', type=int, default=None, help='JPEG quality (1-100) for cards the PDF image policy encodes as JPEG (default: config.json pdf_output.jpeg_quality, else 92)')
+    parser.add_argument('--pending-chunks', type=int, default=DEFAULT_PENDING_CHUNKS, help='With --cards-per-chunk, how many chunk PDFs may be queued or assembling in the background while rendering continues; 0 assembles each chunk before rendering the next (default: %(default)s)')
+    parser.add_argument('--merge-chunks', action='store_true', help='With --cards-per-chunk, merge the chunk PDFs into one book PDF (<name>_combined_<page size>.pdf) at the end of the run, sharing identical images and with an outline of card titles')
+    parser.add_argument('--linearize', action='store_true', help='Linearize the merged book PDF for fast first-page display (with --merge-chunks)')
+    parser.add_argument('--plan', action='store_true', help='Dry run: probe the inputs and report the cards, chunk PDFs, time and disk space a run would take, without rendering anything')
     args = parser.parse_args()
     logging.info(f"Arguments: {args}")
+    if args.thumbnail_cache:
+        thumbnail_pyramid.configure(args.thumbnail_cache)
+    memory_governor.configure(args.memory_budget_mb)
+    card_writer.configure(args.card_codec, args.save_workers)
+    pdf_policy.configure(args.pdf_images, args.pdf_jpeg_quality)
+    if args.press_profile:
+        color_pipeline.set_press_profile(args.press_profile)
     if args.exclude_exts is not None:
         exclude_exts = [ext.strip().lower() for ext in args.exclude_exts.split(',') if ext.strip()]
     else:
@@ -961,6 +1103,27 @@ if __name__ == "__main__":
     if args.metadata_text:
         args.metadata_text = _decode_metadata_text(args.metadata_text)
 
+    if args.plan:
+        # Same inputs a run would see (zips in file lists are not expanded by a run either)
+        if files_from_list is not None:
+            plan_entries = files_from_list
+        else:
+            plan_entries = find_files(Path(args.input_dir), max_depth=args.max_depth if args.max_depth >= 0 else None)
+        plan = run_planner.plan_run(
+            plan_entries,
+            parse_page_size(args.page_size),
+            cmyk_mode=args.cmyk_mode,
+            exclude_exts=exclude_exts,
+            all_pdf_pages=args.all_pdf_pages,
+            max_video_frames=args.max_video_frames,
+            cards_per_chunk=args.cards_per_chunk,
+            ignore_unknown_files=args.ignore_unknown_files,
+            expand_zips=files_from_list is None,
+        )
+        for line in run_planner.format_plan(plan):
+            logging.info(line)
+        sys.exit(0)
+
     # Generate file cards either from the provided list or from a directory
     if files_from_list is not None:
         build_file_cards_from_list(
@@ -977,7 +1140,9 @@ if __name__ == "__main__":
             cards_per_chunk=args.cards_per_chunk,
             pdf_name=pdf_name,
             delete_cards_after_pdf=args.delete_cards_after_pdf,
-            ignore_unknown_files=args.ignore_unknown_files
+            ignore_unknown_files=args.ignore_unknown_files,
+            video_workers=args.video_workers,
+            pending_chunks=args.pending_chunks
         )
     else:
         build_file_cards_from_directory(
@@ -995,7 +1160,9 @@ if __name__ == "__main__":
             cards_per_chunk=args.cards_per_chunk,  # <--- Pass chunk size
             pdf_name=pdf_name,
             delete_cards_after_pdf=args.delete_cards_after_pdf,
-            ignore_unknown_files=args.ignore_unknown_files
+            ignore_unknown_files=args.ignore_unknown_files,
+            video_workers=args.video_workers,
+            pending_chunks=args.pending_chunks
         )
 
     # Report summary
@@ -1070,3 +1237,21 @@ if __name__ == "__main__":
                             logging.error(f"Error deleting {card_file}: {e}")
                 logging.info(f"Card files cleanup complete. Deleted {deleted} files.")
 
+    # Merge the chunk PDFs (all assembled by now) into one book
+    if args.merge_chunks and args.cards_per_chunk and args.cards_per_chunk > 0:
+        if args.pdf_output_name:
+            book_base = args.pdf_output_name[:-4] if args.pdf_output_name.endswith('.pdf') else args.pdf_output_name
+        else:
+            book_base = input_dir_name.replace(' ', '_')
+        book_path = Path(args.output_dir) / f"{book_base}_combined_{args.page_size}.pdf"
+        try:
+            pdf_book.merge_chunk_pdfs(args.output_dir, book_path, linearize=args.linearize)
+        except Exception as e:
+            logging.error(f"Error merging chunk PDFs into {book_path}: {e}")
+            logging.error("Traceback:\n" + traceback.format_exc())
+
+    # Every card, chunk PDF and the single PDF is finished, so the pdf.* counters are complete
+    render_metrics.log_summary()
+
+    # Fold this run's timings into the history --plan estimates from
+    run_planner.record_run(render_metrics.snapshot())
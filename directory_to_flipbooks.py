@@ -15,6 +15,10 @@ from pdf_to_images import (
     draw_hairline_border,
     create_cmyk_image,
 )
+from pdf_writer import write_images_to_pdf
+import pdf_policy
+from color_pipeline import to_press_cmyk
+from heif_preview import PILLOW_HEIF_AVAILABLE, open_heif_preview
 from file_card_generator import (
     create_file_info_card,
     determine_file_type
@@ -23,18 +27,13 @@ from file_card_generator import (
 IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.heic'}
 VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv'}
 
-try:
-    import pillow_heif
-    PILLOW_HEIF_AVAILABLE = True
-except ImportError:
-    PILLOW_HEIF_AVAILABLE = False
 
 def get_parent_of_parent_name(input_dir):
     input_path = Path(input_dir).resolve()
     return input_path.parent.name.replace(' ', '_')
 
 def load_images_from_dir(input_dir, flipbook_mode=False, video_fps=1, exclude_video_stills=False, 
-                        handle_non_visual=True, cmyk_mode=False):
+                        handle_non_visual=True, cmyk_mode=False, max_image_edge=None):
     input_path = Path(input_dir)
     if not input_path.is_dir():
         raise ValueError(f'Input path {input_dir} is not a directory')
@@ -47,18 +46,11 @@ def load_images_from_dir(input_dir, flipbook_mode=False, video_fps=1, exclude_vi
         if ext in IMAGE_EXTENSIONS:
             if ext == '.heic':
                 if PILLOW_HEIF_AVAILABLE:
-                    try:
-                        heif_file = pillow_heif.open_heif(str(file_path))
-                        img = Image.frombytes(
-                            heif_file.mode,
-                            heif_file.size,
-                            heif_file.data,
-                            "raw"
-                        ).convert('RGB')
-                        images.append(img)
+                    # Decoded straight to the size a page can show (embedded thumbnail if big enough)
+                    img = open_heif_preview(file_path, long_edge=max_image_edge)
+                    if img is not None:
+                        images.append(img.convert('RGB'))
                         image_paths.append(str(file_path))
-                    except Exception as e:
-                        print(f"Error loading HEIC image {file_path}: {e}")
                 else:
                     print(f"pillow-heif not available, skipping HEIC image: {file_path}")
             else:
@@ -110,9 +102,11 @@ def create_blank_page(page_size, color='white', cmyk_mode=False, cmyk_color=(0,
     else:
         return Image.new('RGB', page_size, color)
 
-def create_flipbooks_only(video_frames_map, page_size, hairline_width, hairline_color, cmyk_mode, cmyk_background, cmyk_flipbook_background, output_pdf, output_dir, parent_prefix):
+def create_flipbooks_only(video_frames_map, page_size, hairline_width, hairline_color, cmyk_mode, cmyk_background, cmyk_flipbook_background, output_pdf, output_dir, parent_prefix, save_blank_pages=False):
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True, parents=True)
+    # Every verso is identical, so render it once and reuse the same image object
+    blank_page = create_cmyk_image(page_size[0], page_size[1], cmyk_flipbook_background)
     for video_name, frames in video_frames_map.items():
         flipbook_dir = output_dir / f'{parent_prefix}' / f'{parent_prefix}_flipbook_{video_name}'
         flipbook_dir.mkdir(parents=True, exist_ok=True)
@@ -120,14 +114,14 @@ def create_flipbooks_only(video_frames_map, page_size, hairline_width, hairline_
         page_counter = 1
         for idx, img in enumerate(frames):
             if page_counter % 2 == 0:
-                blank_page = create_cmyk_image(page_size[0], page_size[1], cmyk_flipbook_background)
                 video_output_images.append(blank_page)
-                if cmyk_mode:
-                    output_path = flipbook_dir / f'{video_name}_flipbook_frame_{page_counter:03d}_blank.tiff'
-                    blank_page.save(output_path, compression='tiff_lzw')
-                else:
-                    output_path = flipbook_dir / f'{video_name}_flipbook_frame_{page_counter:03d}_blank.png'
-                    blank_page.save(output_path)
+                if save_blank_pages:
+                    if cmyk_mode:
+                        output_path = flipbook_dir / f'{video_name}_flipbook_frame_{page_counter:03d}_blank.tiff'
+                        blank_page.save(output_path, compression='tiff_lzw')
+                    else:
+                        output_path = flipbook_dir / f'{video_name}_flipbook_frame_{page_counter:03d}_blank.png'
+                        blank_page.save(output_path)
                 page_counter += 1
             if cmyk_mode:
                 page_img = create_cmyk_image(page_size[0], page_size[1], cmyk_background)
@@ -144,6 +138,8 @@ def create_flipbooks_only(video_frames_map, page_size, hairline_width, hairline_
             margin_flip = int(0.1 * 300.0)
             x = page_size[0] - img.width - margin_flip
             y = (page_size[1] - img.height) // 2
+            if cmyk_mode:
+                img = to_press_cmyk(img)
             page_img.paste(img, (x, y))
             border_xy = (x, y, x + img.width - 1, y + img.height - 1)
             draw = ImageDraw.Draw(page_img)
@@ -158,21 +154,7 @@ def create_flipbooks_only(video_frames_map, page_size, hairline_width, hairline_
             page_counter += 1
         if output_pdf and video_output_images:
             pdf_path_out = flipbook_dir / f'{video_name}_flipbook.pdf'
-            if cmyk_mode:
-                video_output_images[0].save(
-                    pdf_path_out, 
-                    save_all=True, 
-                    append_images=video_output_images[1:],
-                    resolution=300.0,
-                    quality=100,
-                    compression='tiff_lzw'
-                )
-            else:
-                video_output_images[0].save(
-                    pdf_path_out, 
-                    save_all=True, 
-                    append_images=video_output_images[1:]
-                )
+            write_images_to_pdf(video_output_images, pdf_path_out, dpi=300.0)
             logging.info(f'Saved PDF {pdf_path_out}')
 
 def parse_inches_to_pixels(value_in_inches):
@@ -193,7 +175,14 @@ def main():
                    help='CMYK background color as C,M,Y,K values (0-255, comma-separated)')
     parser.add_argument('--cmyk-flipbook-background', type=str, default='22,0,93,0', 
                    help='CMYK background color for flipbook pages as C,M,Y,K values (0-255, comma-separated) default is 22,0,93,0 which is Omata acid color')
+    parser.add_argument('--save-blank-pages', action='store_true',
+                   help='Also write each blank verso page as its own image file (default: blank pages only appear in the PDF)')
+    parser.add_argument('--pdf-images', choices=['auto', 'lossless', 'dct'], default=None,
+                   help='How page images are compressed in the PDF: auto (JPEG for photographic pages, Flate for flat ones), lossless or dct (default: config.json pdf_output.mode, else auto)')
+    parser.add_argument('--pdf-jpeg-quality', type=int, default=None,
+                   help='JPEG quality (1-100) for pages encoded as JPEG (default: config.json pdf_output.jpeg_quality, else 92)')
     args = parser.parse_args()
+    pdf_policy.configure(args.pdf_images, args.pdf_jpeg_quality)
     try:
         page_size = parse_page_size(args.page_size, args.page_orientation)
     except ValueError as e:
@@ -236,13 +225,15 @@ def main():
             video_fps=args.video_fps,
             exclude_video_stills=True,
             handle_non_visual=False,
-            cmyk_mode=args.cmyk_mode
+            cmyk_mode=args.cmyk_mode,
+            max_image_edge=max(page_size)
         )
         if not video_frames_map:
             print('No videos found for flipbook creation in the input directory.')
             sys.exit(1)
         create_flipbooks_only(
-            video_frames_map, page_size, hairline_width_px, args.hairline_color, args.cmyk_mode, cmyk_background, cmyk_flipbook_background, args.output_pdf, output_dir, parent_dir_name
+            video_frames_map, page_size, hairline_width_px, args.hairline_color, args.cmyk_mode, cmyk_background, cmyk_flipbook_background, args.output_pdf, output_dir, parent_dir_name,
+            save_blank_pages=args.save_blank_pages
         )
     except Exception as e:
         logging.error(f'Error processing flipbooks: {e}', exc_info=True)
@@ -19,21 +19,21 @@ from pdf_to_images import (
     create_cmyk_image,
     rgb_to_cmyk_image,
 )
+from pdf_writer import write_images_to_pdf
+import pdf_policy
+from color_pipeline import to_press_cmyk
+from heif_preview import PILLOW_HEIF_AVAILABLE, open_heif_preview
 
 from file_card_generator import (
     create_file_info_card,
-    determine_file_type
+    determine_file_type,
+    load_image_preview
 )
+import thumbnail_pyramid
 
 IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.heic'}
 VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv'}
 
-try:
-    import pillow_heif
-
-    PILLOW_HEIF_AVAILABLE = True
-except ImportError:
-    PILLOW_HEIF_AVAILABLE = False
 
 
 def get_parent_name(input_dir):
@@ -42,7 +42,7 @@ def get_parent_name(input_dir):
 
 
 def load_images_from_dir(input_dir, flipbook_mode=False, video_fps=1, exclude_video_stills=False, 
-                        handle_non_visual=True, cmyk_mode=False):
+                        handle_non_visual=True, cmyk_mode=False, max_image_edge=None):
     input_path = Path(input_dir)
     if not input_path.is_dir():
         raise ValueError(f'Input path {input_dir} is not a directory')
@@ -67,22 +67,22 @@ def load_images_from_dir(input_dir, flipbook_mode=False, video_fps=1, exclude_vi
             logging.info(f"Accepted as image: {file_path}")
             if ext == '.heic':
                 if PILLOW_HEIF_AVAILABLE:
-                    try:
-                        heif_file = pillow_heif.open_heif(str(file_path))
-                        img = Image.frombytes(
-                            heif_file.mode,
-                            heif_file.size,
-                            heif_file.data,
-                            "raw"
-                        ).convert('RGB')
-                        images.append(img)
+                    # Decoded straight to the size a page can show (embedded thumbnail if big enough)
+                    if max_image_edge:
+                        img = load_image_preview(file_path, max_image_edge)
+                    else:
+                        img = open_heif_preview(file_path)
+                    if img is not None:
+                        images.append(img.convert('RGB'))
                         image_paths.append(str(file_path))
-                    except Exception as e:
-                        logging.error(f"Error loading HEIC image {file_path}: {e}")
                 else:
                     logging.warning(f"pillow-heif not available, skipping HEIC image: {file_path}")
             else:
-                img = Image.open(file_path).convert('RGB')
+                # Page-sized, upright preview (from the thumbnail pyramid when configured)
+                if max_image_edge:
+                    img = load_image_preview(file_path, max_image_edge).convert('RGB')
+                else:
+                    img = Image.open(file_path).convert('RGB')
                 images.append(img)
                 image_paths.append(str(file_path))
         elif ext == '.pdf':
@@ -190,7 +190,7 @@ def images_to_pages(images, layout, page_size, gap, hairline_width, hairline_col
                     image_fit_mode, grid_rows=None, grid_cols=None, page_margin=0, output_pdf=False,
                     output_dir='output_pages', flipbook_mode=False, video_frames_map=None, parent_prefix='output',
                     image_paths=None, cmyk_mode=False, cmyk_background=(0, 0, 0, 0), cmyk_flipbook_background=(0, 0, 0, 0),
-                    insert_blank_pages_main=False, masonry_cols=None):
+                    insert_blank_pages_main=False, masonry_cols=None, save_blank_pages=False):
     
     # Convert output_dir to a Path object if it's a string
     output_dir = Path(output_dir)
@@ -209,6 +209,10 @@ def images_to_pages(images, layout, page_size, gap, hairline_width, hairline_col
     
     # Flipbook pages per video
     if flipbook_mode and video_frames_map:
+        # just putting in manually the verso blank page for flipbook is omata acid color
+        # Every verso is identical, so it is rendered once and the same image object is
+        # reused for every blank page (and embedded once in the PDF)
+        blank_page = create_cmyk_image(page_size[0], page_size[1], cmyk_flipbook_background)
         for video_name, frames in video_frames_map.items():
             flipbook_dir = output_dir / f'{parent_prefix}' / f'{parent_prefix}_flipbook_{video_name}'
             
@@ -224,16 +228,15 @@ def images_to_pages(images, layout, page_size, gap, hairline_width, hairline_col
             for idx, img in enumerate(frames):
                 # For flipbooks, ensure all images appear on recto pages (odd-numbered)
                 if page_counter % 2 == 0:  # If we're on a verso page
-                    # Create and save blank page in CMYK mode with specified values
-                    # just putting in manually the verso blank page for flipbook is omata acid color
-                    blank_page = create_cmyk_image(page_size[0], page_size[1], cmyk_flipbook_background)
                     video_output_images.append(blank_page)
-                    if cmyk_mode:
-                        output_path = flipbook_dir / f'{video_name}_flipbook_frame_{page_counter:03d}_blank.tiff'
-                        blank_page.save(output_path, compression='tiff_lzw')
-                    else:
-                        output_path = flipbook_dir / f'{video_name}_flipbook_frame_{page_counter:03d}_blank.png'
-                        blank_page.save(output_path)
+                    # Per-blank image files are optional; the PDF references the shared blank
+                    if save_blank_pages:
+                        if cmyk_mode:
+                            output_path = flipbook_dir / f'{video_name}_flipbook_frame_{page_counter:03d}_blank.tiff'
+                            blank_page.save(output_path, compression='tiff_lzw')
+                        else:
+                            output_path = flipbook_dir / f'{video_name}_flipbook_frame_{page_counter:03d}_blank.png'
+                            blank_page.save(output_path)
                     page_counter += 1
                 
                 # Now create the actual content page (which will be on a recto page)
@@ -260,6 +263,9 @@ def images_to_pages(images, layout, page_size, gap, hairline_width, hairline_col
                 x = page_size[0] - img.width - margin_flip
                 y = (page_size[1] - img.height) // 2
                 
+                if cmyk_mode:
+                    # Separate the RGB frame once through the press transform before compositing
+                    img = to_press_cmyk(img)
                 page_img.paste(img, (x, y))
                 border_xy = (x, y, x + img.width - 1, y + img.height - 1)
                 draw = ImageDraw.Draw(page_img)
@@ -275,22 +281,8 @@ def images_to_pages(images, layout, page_size, gap, hairline_width, hairline_col
                 page_counter += 1
             if output_pdf and video_output_images:
                 pdf_path_out = flipbook_dir / f'{video_name}_flipbook.pdf'
-                # Save PDF with appropriate settings based on color mode
-                if cmyk_mode:
-                    video_output_images[0].save(
-                        pdf_path_out, 
-                        save_all=True, 
-                        append_images=video_output_images[1:],
-                        resolution=300.0,
-                        quality=100,
-                        compression='tiff_lzw'
-                    )
-                else:
-                    video_output_images[0].save(
-                        pdf_path_out, 
-                        save_all=True, 
-                        append_images=video_output_images[1:]
-                    )
+                # Blank versos share one image object, so they are embedded once
+                write_images_to_pdf(video_output_images, pdf_path_out, dpi=300.0)
                 logging.info(f'Saved PDF {pdf_path_out}')
 
     # Generate standard pages for all images
@@ -383,7 +375,18 @@ def main():
                    help='CMYK background color as C,M,Y,K values (0-255, comma-separated)')
     parser.add_argument('--cmyk-flipbook-background', type=str, default='22,0,93,0', 
                    help='CMYK background color for flipbook pages as C,M,Y,K values (0-255, comma-separated) default is 22,0,93,0 which is Omata acid color')
+    parser.add_argument('--save-blank-pages', action='store_true',
+                   help='Also write each blank flipbook verso page as its own image file (default: blank pages only appear in the PDF)')
+    parser.add_argument('--thumbnail-cache', default=None,
+                   help='Directory for the persistent thumbnail pyramid shared across runs and page sizes (default: config.json thumbnail_cache.dir, else disabled)')
+    parser.add_argument('--pdf-images', choices=['auto', 'lossless', 'dct'], default=None,
+                   help='How page images are compressed in the PDF: auto (JPEG for photographic pages, Flate for flat ones), lossless or dct (default: config.json pdf_output.mode, else auto)')
+    parser.add_argument('--pdf-jpeg-quality', type=int, default=None,
+                   help='JPEG quality (1-100) for pages encoded as JPEG (default: config.json pdf_output.jpeg_quality, else 92)')
     args = parser.parse_args()
+    pdf_policy.configure(args.pdf_images, args.pdf_jpeg_quality)
+    if args.thumbnail_cache:
+        thumbnail_pyramid.configure(args.thumbnail_cache)
     grid_rows = args.grid_rows
     grid_cols = args.grid_cols
     if args.grid:
@@ -454,7 +457,8 @@ def main():
             video_fps=args.video_fps,
             exclude_video_stills=args.exclude_video_stills,
             handle_non_visual=args.handle_non_visual,
-            cmyk_mode=args.cmyk_mode
+            cmyk_mode=args.cmyk_mode,
+            max_image_edge=max(page_size)
         )
 
         if not images:
@@ -468,7 +472,7 @@ def main():
             grid_rows, grid_cols, page_margin_px, args.output_pdf,
             output_dir, args.flipbook_mode, video_frames_map, parent_dir_name,
             image_paths=image_paths, cmyk_mode=args.cmyk_mode, cmyk_background=cmyk_background, cmyk_flipbook_background=cmyk_flipbook_background,
-            masonry_cols=args.masonry_cols
+            masonry_cols=args.masonry_cols, save_blank_pages=args.save_blank_pages
         )
 
     except Exception as e:
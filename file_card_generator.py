@@ -1,63 +1,63 @@
-import sys
-print(sys.executable)
 import os
 import time
 import re
-import bs4
-import pillow_heif
 
-import numpy as np
 from datetime import datetime
 import hashlib
 import mimetypes
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont, ImageOps
-from pillow_heif import register_heif_opener
 import io
-import math
+import functools
 import textwrap
 import zipfile
 import bz2
 import gzip
-from bs4 import BeautifulSoup
 from qr_code_generator import create_qr_code
-from config_loader import get_font_path
+import font_cache
+from font_cache import get_font
 
-try:
-    from fitparse import FitFile
-    FITPARSE_AVAILABLE = True
-except ImportError:
-    FITPARSE_AVAILABLE = False
 import binascii
 import json
-from pdf2image import convert_from_path
-import gpxpy
-import cv2
-
-# Patch for Python 3.13 compatibility
-import collections
-if not hasattr(collections, 'MutableMapping'):
-    import collections.abc
-    collections.MutableMapping = collections.abc.MutableMapping
-
-import requests
-import dotenv
-import polyline
+
 import logging
 import traceback
 import random
 from pillow_textbox import draw_text_box
+from card_layout import card_font_sizes, card_geometry, card_path_lines, metadata_display_lines, plan_card_layout
+from text_wrap import wrap_words
+from video_probe import probe_video, is_landscape, video_card_metadata
+from video_decode_pool import extract_video_frames
+from raw_preview import get_raw_preview
+from image_descriptor import get_image_descriptor, apply_orientation
+import thumbnail_pyramid
+from grid_layout import solve_grid, compose_grid
+from large_image import decode_to_size, is_oversize
+import render_metrics
+import card_writer
+import pdf_policy
+from color_pipeline import to_press_cmyk
+import preview_registry
+
+# Renderers with heavy dependencies (pdf2image, cv2, gpxpy/fitparse/requests,
+# fontTools, pillow-heif) are imported the first time a card needs them
+pdf_preview = preview_registry.lazy_module("pdf_preview")
+video_preview = preview_registry.lazy_module("video_preview")
+gps_preview = preview_registry.lazy_module("gps_preview")
+font_preview = preview_registry.lazy_module("font_preview")
+heif_preview = preview_registry.lazy_module("heif_preview")
 
 Image.MAX_IMAGE_PIXELS = 500_000_000  # or any large number
 #Image.MAX_IMAGE_PIXELS = None  # disables the limit (use with caution)
 
-register_heif_opener()
+# FIT activity summaries are drawn at a fixed size below the route map
+FIT_SUMMARY_FONT_SIZE = 12
+
 
 
 # Initialize mimetypes
 mimetypes.init()
 
-dotenv.load_dotenv()
 
 logging.basicConfig(
     level=logging.INFO,
@@ -78,56 +78,14 @@ logging.getLogger("PIL").setLevel(logging.WARNING)
 logging.getLogger("matplotlib").setLevel(logging.WARNING)
 logging.getLogger("img2pdf").setLevel(logging.WARNING)
 
-# Try to import fontTools for font metadata
-try:
-    from fontTools import ttLib
-    FONTTOOLS_AVAILABLE = True
-except ImportError:
-    FONTTOOLS_AVAILABLE = False
-    logging.warning("fontTools not available. Font metadata will be limited.")
+
 
 
 def wrap_text_by_pixel(draw, text, font, max_width):
     if text == "":
         return [""]
-    words = text.split()
-    lines = []
-    current_line = ""
-    for word in words:
-        test_line = current_line + (" " if current_line else "") + word
-        bbox = draw.textbbox((0, 0), test_line, font=font)
-        line_width = bbox[2] - bbox[0]
-        if line_width <= max_width:
-            current_line = test_line
-        else:
-            if current_line:
-                lines.append(current_line)
-            # If the word itself is too long, break it up
-            while True:
-                word_bbox = draw.textbbox((0, 0), word, font=font)
-                word_width = word_bbox[2] - word_bbox[0]
-                if word_width <= max_width:
-                    current_line = word
-                    break
-                # Find the largest substring of word that fits
-                for i in range(len(word), 0, -1):
-                    part = word[:i]
-                    part_bbox = draw.textbbox((0, 0), part, font=font)
-                    part_width = part_bbox[2] - part_bbox[0]
-                    if part_width <= max_width:
-                        lines.append(part)
-                        word = word[i:]
-                        break
-                else:
-                    # If no part fits (very small max_width), forcibly break one character
-                    lines.append(word[0])
-                    word = word[1:]
-                if not word:
-                    current_line = ""
-                    break
-    if current_line:
-        lines.append(current_line)
-    return lines
+    # Widths come from the font's advance table (see text_wrap); draw is not needed
+    return wrap_words(text.split(), font, max_width)
 
 def round_image_corners(img, radius):
     # Ensure img is RGBA
@@ -299,6 +257,7 @@ def preview_html_content(file_path, max_lines=5, max_line_length=40):
     try:
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
             html = f.read()
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(html, "html.parser")
         text = soup.get_text(separator="\n")
         lines = []
@@ -421,6 +380,7 @@ def get_gz_preview(file_path, max_bytes=1024, preview_box=None):
         # Try image preview
         if ext in {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.heic', '.heif','.webp'} and preview_box:
             try:
+                preview_registry.ensure_decoder(ext)
                 img = Image.open(io.BytesIO(data))
                 img.thumbnail(preview_box)
                 return None, img, None
@@ -477,238 +437,90 @@ def get_hex_preview(file_path, max_bytes=1024):
     except Exception as e:
         return [f"Hex error: {e}"]
 
-def get_fit_preview(file_path, max_records=40):
-    if not FITPARSE_AVAILABLE:
-        return ["fitparse not installed"]
-    try:
-        fitfile = FitFile(str(file_path))
-        lines = []
-        for i, record in enumerate(fitfile.get_messages()):
-            if i >= max_records:
-                break
-            lines.append(f"{record.get('name', 'Record')}: {record}")
-        if not lines:
-            lines = ["No records found"]
-        return lines
-    except Exception as e:
-        return [f"FIT error: {e}"]
+def _fit_size(img_size, box_size):
+    """Largest size with the aspect ratio of img_size that fits inside box_size."""
+    img_w, img_h = img_size
+    box_w, box_h = box_size
+    scale_factor = min(box_w / img_w, box_h / img_h)
+    return max(1, int(img_w * scale_factor)), max(1, int(img_h * scale_factor))
 
-def get_fit_summary_preview(file_path):
-    if not FITPARSE_AVAILABLE:
-        return ["fitparse not installed"], {}
-    try:
-        fitfile = FitFile(str(file_path))
-        summary = []
-        meta = {}
-        # Try to extract session/activity summary
-        for msg in fitfile.get_messages('session'):
-            fields = {d.name: d.value for d in msg}
-            summary.append(f"Session: {fields.get('sport', 'N/A')} {fields.get('sub_sport', '')}")
-            if 'start_time' in fields:
-                summary.append(f"Start: {fields['start_time']}")
-                meta['start_time'] = fields['start_time']
-            if 'total_timer_time' in fields:
-                summary.append(f"Duration: {fields['total_timer_time']:.1f} sec")
-            if 'total_distance' in fields:
-                summary.append(f"Distance: {fields['total_distance']/1000:.2f} km")
-            if 'total_ascent' in fields:
-                summary.append(f"Ascent: {fields['total_ascent']} m")
-            if 'avg_speed' in fields:
-                summary.append(f"Avg Speed: {fields['avg_speed']*3.6:.2f} km/h")
-            if 'max_speed' in fields:
-                summary.append(f"Max Speed: {fields['max_speed']*3.6:.2f} km/h")
-            if 'total_calories' in fields:
-                summary.append(f"Calories: {fields['total_calories']}")
-            summary.append("")
-        # If no session, try activity
-        if not summary:
-            for msg in fitfile.get_messages('activity'):
-                fields = {d.name: d.value for d in msg}
-                summary.append(f"Activity: {fields.get('type', 'N/A')}")
-                if 'timestamp' in fields:
-                    summary.append(f"Timestamp: {fields['timestamp']}")
-                    meta['timestamp'] = fields['timestamp']
-                summary.append("")
-        # GPS points summary
-        gps_points = []
-        for record in fitfile.get_messages('record'):
-            lat = None
-            lon = None
-            for d in record:
-                if d.name == 'position_lat':
-                    lat = d.value
-                elif d.name == 'position_long':
-                    lon = d.value
-            if lat is not None and lon is not None:
-                lat = lat * (180.0 / 2**31)
-                lon = lon * (180.0 / 2**31)
-                gps_points.append((lat, lon))
-        if gps_points:
-            summary.append(f"GPS Points: {len(gps_points)}")
-            summary.append(f"Start: ({gps_points[0][0]:.5f}, {gps_points[0][1]:.5f})")
-            summary.append(f"End:   ({gps_points[-1][0]:.5f}, {gps_points[-1][1]:.5f})")
-            # Optionally show a few sample points
-            if len(gps_points) > 2:
-                summary.append(f"Sample: ({gps_points[len(gps_points)//2][0]:.5f}, {gps_points[len(gps_points)//2][1]:.5f})")
-        # Fallback: show number of records
-        n_records = sum(1 for _ in fitfile.get_messages('record'))
-        summary.append(f"Records: {n_records}")
-        meta['records'] = n_records
-        # Add all metadata fields from file header
-        if hasattr(fitfile, 'file_id'):
-            for k, v in fitfile.file_id.items():
-                summary.append(f"{k}: {v}")
-                meta[k] = v
-        return summary[:40], meta
-    except Exception as e:
-        return [f"FIT error: {e}"], {}
+def reduce_image_to_box(img, box_size, reducing_gap=3.0):
+    """
+    Decode an opened (still lazy) image at roughly the size needed to fill box_size.
 
-def get_pdf_preview(file_path, box_w, box_h, all_pages: bool = False, max_pages: int = 42):
-    try:
-        from pdf2image import convert_from_path
-        import numpy as np
-        # Convert PDF to PIL pages
-        all_pages_img = convert_from_path(str(file_path))
-        n_total = len(all_pages_img)
-        logging.info(f"PDF {file_path} page count is {n_total} pages")
-
-        if n_total == 0:
-            logging.warning(f"No pages found in PDF: {file_path}")
-            return None
-        
-        # If only one page, just return the single page image scaled to fit
-        if n_total == 1:
-            single_page_img = all_pages_img[0]
-            # Rotate if landscape and box is portrait
-            if box_h > box_w and single_page_img.width > single_page_img.height:
-                single_page_img = single_page_img.rotate(90, expand=True)
-            try:
-                thumb = ImageOps.contain(single_page_img, (box_w, box_h), Image.LANCZOS)
-            except Exception:
-                thumb = single_page_img.copy()
-                thumb.thumbnail((box_w, box_h))
-            return thumb
-
-        # Build overview grid (choose up to max_pages evenly distributed pages)
-        overview_cap = min(n_total, max_pages)
-        indices = [0]
-        if overview_cap > 1 and n_total > 1:
-            remaining = np.linspace(1, n_total - 1, overview_cap - 1)
-            indices += [int(round(i)) for i in remaining]
-        indices = sorted(set(indices))
-        selected_pages = [all_pages_img[i] for i in indices]
-        n_pages = len(selected_pages)
-
-        # Find best rows/cols to maximize thumbnail area (same algorithm as before)
-        best_score = -1
-        best_config = None
-        for rows in range(1, n_pages + 1):
-            cols = int(math.ceil(n_pages / rows))
-            cell_w = box_w // cols
-            cell_h = box_h // rows
-            if cell_w <= 0 or cell_h <= 0:
-                continue
-            total_used_area = 0
-            orientations = []
-            for page in selected_pages:
-                w, h = page.width, page.height
-                # no-rotate
-                scale_no = min(cell_w / w, cell_h / h) if w and h else 0
-                used_w_no = int(max(0, int(w * scale_no)))
-                used_h_no = int(max(0, int(h * scale_no)))
-                area_no = used_w_no * used_h_no
-                # rotated
-                scale_rot = min(cell_w / h, cell_h / w) if w and h else 0
-                used_w_rot = int(max(0, int(h * scale_rot)))
-                used_h_rot = int(max(0, int(w * scale_rot)))
-                area_rot = used_w_rot * used_h_rot
-                if area_rot > area_no:
-                    total_used_area += area_rot
-                    orientations.append(True)
-                else:
-                    total_used_area += area_no
-                    orientations.append(False)
-            score = total_used_area + n_pages * 10000
-            if score > best_score:
-                best_score = score
-                best_config = {
-                    'indices': indices,
-                    'rows': rows,
-                    'cols': cols,
-                    'cell_w': cell_w,
-                    'cell_h': cell_h,
-                    'selected_pages': selected_pages,
-                    'orientations': orientations
-                }
-
-        # Build overview image
-        overview_img = None
-        if best_config:
-            pages = best_config['selected_pages']
-            rows = best_config['rows']
-            cols = best_config['cols']
-            cell_w = best_config['cell_w']
-            cell_h = best_config['cell_h']
-            orientations = best_config['orientations']
-            thumbs = []
-            for page, rotate_choice in zip(pages, orientations):
-                p = page.copy()
-                if rotate_choice:
-                    p = p.rotate(90, expand=True)
-                try:
-                    thumb = ImageOps.contain(p, (cell_w, cell_h), Image.LANCZOS)
-                except Exception:
-                    thumb = p.copy()
-                    thumb.thumbnail((cell_w, cell_h))
-                thumbs.append(thumb)
-            overview_img = Image.new('RGB', (box_w, box_h), (255, 255, 255))
-            for idx, thumb in enumerate(thumbs):
-                col = idx % cols
-                row = idx // cols
-                x = col * cell_w + (cell_w - thumb.width)//2
-                y = row * cell_h + (cell_h - thumb.height)//2
-                overview_img.paste(thumb, (x, y))
-
-        if not all_pages:
-            return overview_img
-
-        # Build per-page thumbnails (one per PDF page) scaled to fit the preview box
-        per_page_imgs = []
-        for page in all_pages_img:
-            p = page.copy()
-            # rotate to better fit portrait preview if needed
-            if box_h > box_w and p.width > p.height:
-                p = p.rotate(90, expand=True)
-            try:
-                thumb = ImageOps.contain(p, (box_w, box_h), Image.LANCZOS)
-            except Exception:
-                thumb = p.copy()
-                thumb.thumbnail((box_w, box_h))
-            per_page_imgs.append(thumb)
-
-        # Return overview first (if available), then every page image
-        result = []
-        if overview_img is not None:
-            result.append(overview_img)
-        result.extend(per_page_imgs)
-        return result
+    JPEGs are decoded with Pillow's draft() so libjpeg downscales in the DCT
+    domain (1/2, 1/4, 1/8) instead of materialising every source pixel. Other
+    formats are decoded normally and shrunk with reducing_gap, which lets
+    Image.reduce() do the bulk integer downscale before the LANCZOS pass.
 
-    except Exception as e:
-        logging.error(f"PDF preview error for {file_path}: {e}")
-        logging.error(traceback.format_exc())
-        return None
+    The box is in the image's own orientation; callers rotate afterwards.
+    Images that already fit are returned unchanged.
+    """
+    target = _fit_size(img.size, box_size)
+    lazy = bool(getattr(img, 'tile', None))
+    # An undecoded image above the ceiling goes through decode_to_size even when it fits
+    if target[0] >= img.width and target[1] >= img.height and not (lazy and is_oversize(img)):
+        return img
+    if lazy:
+        # Not decoded yet: decode near the target size, within the per-worker memory
+        # ceiling (gigantic scans are decoded in bands or refused, never fully loaded)
+        return decode_to_size(img, target, reducing_gap=reducing_gap)
+    return img.resize(target, Image.LANCZOS, reducing_gap=reducing_gap)
+
+def _decode_upright_preview(file_path, max_edge):
+    """Decode an image file upright with its long edge at most max_edge (thumbnail pyramid loader)."""
+    ext = Path(file_path).suffix.lower()
+    if ext == '.dng':
+        return reduce_image_to_box(get_raw_preview(file_path, long_edge=max_edge), (max_edge, max_edge))
+    if ext in {'.heic', '.heif'}:
+        return heif_preview.open_heif_preview(file_path, long_edge=max_edge)
+    img = Image.open(file_path)
+    descriptor = get_image_descriptor(file_path, img=img)
+    orientation = descriptor.orientation if descriptor is not None else 1
+    img = reduce_image_to_box(img, (max_edge, max_edge))
+    return apply_orientation(img, orientation)
+
+def load_image_preview(file_path, long_edge):
+    """
+    Upright preview of an image file covering long_edge pixels (or the whole
+    source, if smaller). Served from the persistent thumbnail pyramid when one
+    is configured, so repeated runs at other page sizes skip the original.
+    """
+    return thumbnail_pyramid.load_preview(file_path, long_edge, _decode_upright_preview)
 
 def get_image_thumbnail(file_path, box_size=(320, 320), cmyk_mode=False):
     ext = Path(file_path).suffix.lower()
+    box_w, box_h = box_size
     try:
-        if ext.lower() == '.dng':
-            import rawpy
-            import numpy as np
-            with rawpy.imread(str(file_path)) as raw:
-                rgb = raw.postprocess()
-            img = Image.fromarray(rgb)
+        if thumbnail_pyramid.enabled():
+            # Smallest cached pyramid level that covers the box (already upright)
+            img = load_image_preview(file_path, max(box_w, box_h))
+            # Rotate image if box is portrait and image is landscape
+            rotate = box_h > box_w and img.width > img.height
+            decode_box = (box_h, box_w) if rotate else (box_w, box_h)
+            img = reduce_image_to_box(img, decode_box)
+        elif ext.lower() == '.dng':
+            # Embedded preview when it is big enough, otherwise a half-size demosaic
+            img = get_raw_preview(file_path, long_edge=max(box_w, box_h))
+            # Rotate image if box is portrait and image is landscape
+            rotate = box_h > box_w and img.width > img.height
+            decode_box = (box_h, box_w) if rotate else (box_w, box_h)
+            img = reduce_image_to_box(img, decode_box)
         else:
+            # Image.open only reads the header, so the decode box (in the source
+            # orientation) is known before any pixels are decoded. The descriptor
+            # comes from the file catalog, or from this same open on a cache miss.
             img = Image.open(file_path)
+            descriptor = get_image_descriptor(file_path, img=img)
+            orientation = descriptor.orientation if descriptor is not None else 1
+            display_w, display_h = descriptor.display_size if descriptor is not None else img.size
+            rotate = box_h > box_w and display_w > display_h
+            decode_box = (box_h, box_w) if rotate else (box_w, box_h)
+            if orientation in (5, 6, 7, 8):
+                decode_box = decode_box[::-1]
+            img = reduce_image_to_box(img, decode_box)
+            # Apply the EXIF orientation to the already reduced pixels
+            img = apply_orientation(img, orientation)
 
         # Composite transparent images onto white/light background BEFORE any CMYK conversion
         if img.mode in ("RGBA", "LA"):
@@ -717,17 +529,15 @@ def get_image_thumbnail(file_path, box_size=(320, 320), cmyk_mode=False):
             background.paste(img, mask=img.split()[-1])
             img = background
 
+        # Rotate image if box is portrait and image is landscape (after the downscale,
+        # so the transpose only touches preview-sized pixels)
+        if rotate:
+            img = img.transpose(Image.Transpose.ROTATE_90)
         img_w, img_h = img.size
-        box_w, box_h = box_size
-        # Rotate image if box is portrait and image is landscape
-        if box_h > box_w and img_w > img_h:
-            img = img.rotate(90, expand=True)
-            img_w, img_h = img.size
         # Scale to fit box, maximizing coverage
-        scale_factor = min(box_w / img_w, box_h / img_h)
-        new_w = int(img_w * scale_factor)
-        new_h = int(img_h * scale_factor)
-        img = img.resize((new_w, new_h), Image.LANCZOS)
+        new_w, new_h = _fit_size((img_w, img_h), (box_w, box_h))
+        if (new_w, new_h) != (img_w, img_h):
+            img = img.resize((new_w, new_h), Image.LANCZOS, reducing_gap=3.0)
         # Center in box
 
         # Set the background color behind the image thumbnail
@@ -746,450 +556,102 @@ def get_image_thumbnail(file_path, box_size=(320, 320), cmyk_mode=False):
         logging.error(f"Error creating image thumbnail for {file_path}: {e}")
         return None
 
-def get_font_preview(file_path, box_w, box_h):
-    """
-    Generate a preview image for a font file (TTF, OTF).
-    
-    Args:
-        file_path: Path to the font file
-        box_w: Width of the preview box
-        box_h: Height of the preview box
-        
-    Returns:
-        A PIL Image containing a preview of the font with sample text
-    """
-    try:
-        # Create a white background image
-        preview = Image.new('RGB', (box_w, box_h), (255, 255, 255))
-        draw = ImageDraw.Draw(preview)
-        
-        # Try to load the font
-        font_path = str(file_path)
-        
-        # Sample text to display
-        sample_text = "The OMATA One. As useful as art."
-        pangram = "The quick brown fox jumps over the lazy dog"
-        numbers = "0123456789"
-        special_chars = "!@#$%^&*()_+-=[]{}|;:'\",.<>/?"
-        
-        # Font sizes to display
-        # Font sizes to display
-        sizes = [36, 48, 64, 72]
-        
-        # Get font metadata if possible
-        font_metadata = []
-        if FONTTOOLS_AVAILABLE:
-            try:
-                font = ttLib.TTFont(font_path)
-                
-                # Try to get font family name
-                if 'name' in font:
-                    for record in font['name'].names:
-                        if record.nameID == 1 and record.isUnicode():  # Font Family name
-                            family_name = record.toUnicode()
-                            font_metadata.append(f"Family: {family_name}")
-                            break
-                    
-                    for record in font['name'].names:
-                        if record.nameID == 2 and record.isUnicode():  # Font Subfamily name
-                            style = record.toUnicode()
-                            font_metadata.append(f"Style: {style}")
-                            break
-                            
-                    for record in font['name'].names:
-                        if record.nameID == 5 and record.isUnicode():  # Version
-                            version = record.toUnicode()
-                            font_metadata.append(f"Version: {version}")
-                            break
-            except Exception as e:
-                logging.error(f"Could not read font metadata: {e}")
-        
-        if not font_metadata:
-            font_metadata = ["Font: " + os.path.basename(font_path)]
-        
-        # Draw font metadata
-        # Use a much larger font for metadata
-        big_metadata_font_size = max(24, int(box_h * 0.02))
-        try:
-            metadata_font = ImageFont.truetype(font_path, big_metadata_font_size)
-        except Exception:
-            metadata_font = ImageFont.load_default()
-        y_pos = 10
-        for line in font_metadata:
-            draw.text((10, y_pos), line, fill=(0, 0, 0), font=metadata_font)
-            # Increase spacing for big font
-            y_pos += big_metadata_font_size + 10
-        
-        y_pos += 20  # Extra space after metadata
-        
-        # Draw sample text in different sizes
-        for size in sizes:
-            try:
-                font = ImageFont.truetype(font_path, size)
-                text = f"{size}pt: {sample_text}"
-                draw.text((10, y_pos), text, fill=(0, 0, 0), font=font)
-                y_pos += size + 60
-            except Exception as e:
-                logging.warning(f"Error loading font at size {size}: {e}")
-                # Use default font as fallback
-                fallback_font = ImageFont.load_default()
-                draw.text((10, y_pos), f"Size {size}pt not available", fill=(255, 0, 0), font=fallback_font)
-                y_pos += 80
-        
-        # Draw numbers and special characters
-        try:
-            size = 124
-            font = ImageFont.truetype(font_path, size)
-            draw.text((10, y_pos), numbers, fill=(0, 0, 0), font=font)
-            y_pos += size + 60
-            
-            size=72
-            font = ImageFont.truetype(font_path, size)
-            draw.text((10, y_pos), special_chars, fill=(0, 0, 0), font=font)
-            y_pos += size + 60
-        except Exception as e:
-            logging.warning(f"Error drawing numbers/special chars: {e}")
-        
-        # Draw pangram
-        try:
-            pangram_size = 42
-            font = ImageFont.truetype(font_path, pangram_size)
-            
-            # Wrap text to fit width
-            wrapped_text = textwrap.fill(pangram, width=int(box_w / (pangram_size * 0.6)))
-            draw.text((10, y_pos), wrapped_text, fill=(0, 0, 0), font=font)
-            
-            # Move position down based on number of lines
-            lines = wrapped_text.count('\n') + 1
-            y_pos += (pangram_size + 20) * lines
-        except Exception as e:
-            logging.warning(f"Error drawing pangram: {e}")
-
-
-        return preview
-    except Exception as e:
-        logging.error(f"Error creating font preview: {e}")
-        logging.error(traceback.format_exc())
-        # Create a fallback image
-        fallback = Image.new('RGB', (box_w, box_h), (240, 240, 240))
-        draw = ImageDraw.Draw(fallback)
-        fallback_font = ImageFont.load_default()
-        draw.text((10, 10), f"Font preview not available", fill=(255, 0, 0), font=fallback_font)
-        draw.text((10, 30), f"Error: {str(e)}", fill=(255, 0, 0), font=fallback_font)
-        return fallback
-
-def get_gpx_preview(file_path, box_w, box_h):
-    try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            gpx = gpxpy.parse(f)
-        points = []
-        for track in gpx.tracks:
-            for segment in track.segments:
-                for p in segment.points:
-                    points.append((p.longitude, p.latitude))
-        if not points:
-            return None
-        lons, lats = zip(*points)
-        min_lon, max_lon = min(lons), max(lons)
-        min_lat, max_lat = min(lats), max(lats)
-        # Normalize and scale
-        def scale(val, minv, maxv, size):
-            if maxv == minv:
-                return size // 2
-            return int((val - minv) / (maxv - minv) * (size - 20) + 10)
-        img = Image.new('RGB', (box_w, box_h), (245, 245, 245))
-        draw = ImageDraw.Draw(img)
-        prev = None
-        for lon, lat in points:
-            x = scale(lon, min_lon, max_lon, box_w)
-            y = box_h - scale(lat, min_lat, max_lat, box_h)
-            if prev:
-                draw.line([prev, (x, y)], fill=(0, 120, 160), width=3)
-            prev = (x, y)
-        return img
-    except Exception:
-        return None
-
-def get_video_preview(file_path, box_w, box_h, grid_cols=3, grid_rows=3, rotate_frames_if_portrait=True):
-    try:
-        cap = cv2.VideoCapture(str(file_path))
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        if frame_count == 0:
-            cap.release()
-            return None
-        # Select frames using a normal distribution (bell curve) centered in the video
-        #import numpy as np
-        num_frames = grid_cols * grid_rows
-        mean = frame_count / 2
-        stddev = frame_count / 4
-        idxs = np.random.normal(loc=mean, scale=stddev, size=num_frames)
-        idxs = np.clip(idxs, 0, frame_count - 1)
-        idxs = np.round(idxs).astype(int)
-        # Ensure unique and sorted indices for visual consistency
-        idxs = sorted(set(idxs))
-        # If not enough unique frames, fill in with evenly spaced frames
-        while len(idxs) < num_frames:
-            extra = np.linspace(0, frame_count - 1, num_frames)
-            idxs = sorted(set(list(idxs) + list(np.round(extra).astype(int))))
-            if len(idxs) > num_frames:
-                idxs = idxs[:num_frames]
-        thumbs = []
-        thumb_w = box_w // grid_cols
-        thumb_h = box_h // grid_rows
-        portrait_mode = box_h > box_w
-        for idx in idxs:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-            ret, frame = cap.read()
-            if not ret:
-                continue
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(frame)
-            # Rotate individual frame if preview box is portrait
-            if rotate_frames_if_portrait and portrait_mode and pil_img.width > pil_img.height:
-                pil_img = pil_img.rotate(90, expand=True)
-            pil_img.thumbnail((thumb_w, thumb_h))
-            thumbs.append(pil_img)
-        cap.release()
-        grid_img = Image.new('RGB', (box_w, box_h), (245, 245, 245))
-        for i, thumb in enumerate(thumbs):
-            x = (i % grid_cols) * thumb_w + (thumb_w - thumb.width)//2
-            y = (i // grid_cols) * thumb_h + (thumb_h - thumb.height)//2
-            grid_img.paste(thumb, (x, y))
-        #logging.debug(f"Grid size: {grid_img.size} for file {file_path}")
-        return grid_img
-    except Exception:
-        return None
+def warm_card_fonts(width, height):
+    """Load the fonts every card of this size uses, once per process."""
+    font_cache.warm(card_font_sizes(width, height) + (FIT_SUMMARY_FONT_SIZE,))
 
-def get_video_frames(file_path, total_frames=9, rotate_frames_if_portrait=True):
+def get_video_frames(file_path, total_frames=9, rotate_frames_if_portrait=True, max_size=None):
     """
     Extracts up to total_frames from the video file and returns them as PIL Images.
+    Decoding is shared with the parallel prefetcher in video_decode_pool.
     """
     try:
-        cap = cv2.VideoCapture(str(file_path))
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        if frame_count == 0:
-            cap.release()
-            return []
-        # Evenly spaced frame indices
-        indices = [int(i) for i in np.linspace(0, frame_count - 1, total_frames)]
-        frames = []
-        #portrait_mode = False
-        for idx in indices:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-            ret, frame = cap.read()
-            if not ret:
-                continue
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(frame)
-            # Rotate individual frame if preview box is portrait
-            if rotate_frames_if_portrait and pil_img.width > pil_img.height:
-                pil_img = pil_img.rotate(90, expand=True)
-            frames.append(pil_img)
-        cap.release()
-        return frames
+        return extract_video_frames(file_path, total_frames=total_frames, rotate_frames_if_portrait=rotate_frames_if_portrait, max_size=max_size)
     except Exception:
         logging.warning("Error extracting video frames", exc_info=True)
         return []
 
-def get_video_frames_weighted(file_path, total_frames=24, rotate_frames_if_portrait=True):
+def get_heif_image(file_path, long_edge=None):
+    # Embedded thumbnail when one covers long_edge, otherwise one decode downsized at once
+    if long_edge and thumbnail_pyramid.enabled():
+        return load_image_preview(file_path, long_edge)
+    return heif_preview.open_heif_preview(file_path, long_edge=long_edge)
+
+
+# A template is a full page (about 35 MB for RGB A4 at 300 DPI) held outside
+# the memory governor's budget, so only the current page size or two are kept
+@functools.lru_cache(maxsize=2)
+def _card_template(width, height, border_color, color_border_width):
     """
-    Extracts frames from the video file with more frames from the middle 80%.
+    The static chrome shared by every card of one size: background and outer
+    trim border. Cards start from a copy and draw their file type's header
+    bar on it; never draw on the returned image directly.
     """
-    try:
-        cap = cv2.VideoCapture(str(file_path))
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        if frame_count == 0:
-            cap.release()
-            return []
-
-        # Calculate how many frames for each segment
-        first_pct = 0.05
-        middle_pct = 0.80
-        last_pct = 0.35
-
-        first_n = max(1, int(total_frames * first_pct))
-        middle_n = max(1, int(total_frames * middle_pct))
-        last_n = total_frames - first_n - middle_n
-
-        # Frame ranges
-        first_range = (0, int(frame_count * first_pct))
-        middle_range = (int(frame_count * first_pct), int(frame_count * (first_pct + middle_pct)))
-        last_range = (int(frame_count * (first_pct + middle_pct)), frame_count - 1)
-
-        indices = []
-        # First 10%
-        indices += [int(i) for i in np.linspace(first_range[0], first_range[1], first_n, endpoint=False)]
-        # Middle 80%
-        indices += [int(i) for i in np.linspace(middle_range[0], middle_range[1], middle_n, endpoint=False)]
-        # Last 10%
-        indices += [int(i) for i in np.linspace(last_range[0], last_range[1], last_n, endpoint=True)]
-
-        # Remove duplicates and sort
-        indices = sorted(set(indices))
-
-        frames = []
-        for idx in indices:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-            ret, frame = cap.read()
-            if not ret:
-                continue
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(frame)
-            if rotate_frames_if_portrait and pil_img.width > pil_img.height:
-                pil_img = pil_img.rotate(90, expand=True)
-            frames.append(pil_img)
-        cap.release()
-        return frames
-    except Exception:
-        logging.warning("Error extracting weighted video frames", exc_info=True)
-        return []
+    template = Image.new('RGB', (width, height), (250, 250, 250))
+    draw = ImageDraw.Draw(template)
+    draw.rectangle([0, 0, width, height], outline=border_color, width=color_border_width)
+    render_metrics.increment("card_template.build")
+    return template
 
-# Check for pillow-heif availability
-try:
-    PILLOW_HEIF_AVAILABLE = True
-except ImportError:
-    PILLOW_HEIF_AVAILABLE = False
 
-def get_heif_image(file_path):
-    if not PILLOW_HEIF_AVAILABLE:
-        logging.warning("pillow-heif library is not available. Cannot process HEIC files.")
-        return None
-    try:
-        img = Image.open(file_path)
-        logging.info(f"Successfully processed HEIC file using Pillow: {file_path}")
-        return img
-    except Exception as e:
-        logging.error(f"Error processing HEIC file {file_path} with Pillow: {e}")
-        return None
-
-def get_fit_gps_preview(file_path, box_w, box_h):
-    if not FITPARSE_AVAILABLE:
-        return None
-    try:
-        fitfile = FitFile(str(file_path))
-        points = []
-        for record in fitfile.get_messages('record'):
-            lat = None
-            lon = None
-            for d in record:
-                if d.name == 'position_lat':
-                    lat = d.value
-                elif d.name == 'position_long':
-                    lon = d.value
-            if lat is not None and lon is not None:
-                # Convert semicircles to degrees
-                lat = lat * (180.0 / 2**31)
-                lon = lon * (180.0 / 2**31)
-                points.append((lon, lat))
-        if not points:
-            return None
-        lons, lats = zip(*points)
-        min_lon, max_lon = min(lons), max(lons)
-        min_lat, max_lat = min(lats), max(lats)
-        def scale(val, minv, maxv, size):
-            if maxv == minv:
-                return size // 2
-            return int((val - minv) / (maxv - minv) * (size - 20) + 10)
-        img = Image.new('RGB', (box_w, box_h), (245, 245, 245))
-        draw = ImageDraw.Draw(img)
-        prev = None
-        for lon, lat in points:
-            x = scale(lon, min_lon, max_lon, box_w)
-            y = box_h - scale(lat, min_lat, max_lat, box_h)
-            if prev:
-                draw.line([prev, (x, y)], fill=(0, 120, 160), width=3)
-            prev = (x, y)
-        return img
-    except Exception:
-        return None
+def create_file_info_card(
+    file_path,
+    width=800,
+    height=800,
+    cmyk_mode=False,
+    exclude_file_path=False,
+    border_color=(245, 245, 245),
+    border_inch_width=0.125,
+    include_video_frames=False,
+    max_video_frames=30,
+    metadata_text=None,
+    title=None,
+    metadata=None,
+    video_mode="grid",
+    all_pdf_pages=False,
+    _pdf_preview_img=None,
+    _video_frames=None,
+    ignore_unknown_files=True,
+    outer_padding_inches=0.5,
+):
+    """
+    Render the card (or, for all-pages PDFs, the list of cards) for file_path.
 
-MAPBOX_TOKEN = os.getenv('MAPBOX_TOKEN', '').strip()
-logging.info("Using Mapbox token: %s", MAPBOX_TOKEN if MAPBOX_TOKEN else "Not set")
-def downsample_points(points, max_points=100):
-    if len(points) <= max_points:
-        return points
-    step = max(1, len(points) // max_points)
-    return points[::step]
-
-def get_mapbox_tile_for_bounds(min_lat, max_lat, min_lon, max_lon, width, height, api_key=None, path_points=None):
-    # Ensure the API key is resolved at runtime (avoid referencing MAPBOX_TOKEN at function-definition time)
-    if api_key is None:
-        api_key = os.getenv('MAPBOX_TOKEN', '').strip()
-
-    center_lat = (min_lat + max_lat) / 2
-    center_lon = (min_lon + max_lon) / 2
-    # Calculate zoom level based on bounding box and image size
-    # Reference: https://docs.mapbox.com/help/glossary/zoom-level/
-    def lat_rad(lat):
-        from math import radians, log, tan, pi
-        sin = math.sin(radians(lat))
-        return log((1 + sin) / (1 - sin)) / 2
-    WORLD_DIM = 256  # Mapbox tile size in pixels
-    def zoom_for_bounds(min_lat, max_lat, min_lon, max_lon, width, height):
-        # Clamp latitude to avoid math domain errors
-        min_lat = max(min_lat, -85.05112878)
-        max_lat = min(max_lat, 85.05112878)
-        lat_fraction = (lat_rad(max_lat) - lat_rad(min_lat)) / math.pi
-        lon_fraction = (max_lon - min_lon) / 360.0
-        lat_zoom = math.log2(height / WORLD_DIM / lat_fraction) if lat_fraction > 0 else 20
-        lon_zoom = math.log2(width / WORLD_DIM / lon_fraction) if lon_fraction > 0 else 20
-        zoom = min(lat_zoom, lon_zoom, 22)
-        zoom = max(0, zoom)
-        calculated_zoom = float(zoom)
-        adjusted_zoom = max(0.0, calculated_zoom - 0.3)  # Adjust zoom to avoid too high resolution
-        return adjusted_zoom
-    zoom = zoom_for_bounds(min_lat, max_lat, min_lon, max_lon, min(width, 1280), min(height, 1280))
-
-    import urllib.parse
-    path_str = ""
-    if path_points and len(path_points) > 1:
-        path_points = downsample_points(path_points, max_points=100)
-        # Mapbox expects [lon,lat] pairs for polyline encoding
-        poly_points = [(lat, lon) for lon, lat in path_points]
-        encoded = polyline.encode(poly_points)
-        encoded_url = urllib.parse.quote(encoded, safe='')
-        path_str = f"/path-5+f44-0.7({encoded_url})"
-    # Log style info from Mapbox Styles API
-    style_username = "darthjulian"
-    style_id = "ciwqpkc0s00882qnxuuscegmn"
-    style_api_url = f"https://api.mapbox.com/styles/v1/{style_username}/{style_id}?access_token={api_key}"
-    try:
-        style_resp = requests.get(style_api_url)
-        if style_resp.status_code == 200:
-            style_json = style_resp.json()
-            logging.info(f"Mapbox style name: {style_json.get('name')}")
-            logging.info(f"Mapbox style owner: {style_json.get('owner')}")
-            logging.info(f"Mapbox style visibility: {style_json.get('visibility')}")
-        else:
-            logging.warning(f"Could not fetch Mapbox style info: {style_resp.status_code} {style_resp.text}")
-    except Exception as e:
-        logging.warning(f"Exception fetching Mapbox style info: {e}")
-    url = (
-       # f"https://api.mapbox.com/styles/v1/mapbox/outdoors-v12/static"
-        f"https://api.mapbox.com/styles/v1/darthjulian/ciwqpkc0s00882qnxuuscegmn/static"
-        f"{path_str}/{center_lon},{center_lat},{zoom},0,50/{width}x{height}"
-        f"?access_token={api_key}"
+    Cards are always composed in RGB; with cmyk_mode the finished card is
+    separated once through color_pipeline (press ICC transform when one is
+    configured) instead of drawing with per-color CMYK approximations.
+    """
+    card = _compose_file_info_card(
+        file_path,
+        width=width,
+        height=height,
+        exclude_file_path=exclude_file_path,
+        border_color=border_color,
+        border_inch_width=border_inch_width,
+        include_video_frames=include_video_frames,
+        max_video_frames=max_video_frames,
+        metadata_text=metadata_text,
+        title=title,
+        metadata=metadata,
+        video_mode=video_mode,
+        all_pdf_pages=all_pdf_pages,
+        _pdf_preview_img=_pdf_preview_img,
+        _video_frames=_video_frames,
+        ignore_unknown_files=ignore_unknown_files,
+        outer_padding_inches=outer_padding_inches,
     )
-    resp = requests.get(url)
-    logging.info("Mapbox URL: %s", url)
-    logging.info("Mapbox zoom: %s", zoom)
-    logging.info("Mapbox status: %s", resp.status_code)
-    if resp.status_code == 200:
-        return Image.open(io.BytesIO(resp.content))
-    else:
-        logging.error("Mapbox error: %s %s", resp.status_code, resp.text)
-        logging.error("Bounds are (%f, %f, %f, %f)", min_lat, max_lat, min_lon, max_lon)
-        logging.error("Width: %d, Height: %d", width, height)
-        logging.error("Zoom level: %f", zoom)
-        exit(-1)  # Exit with error code if Mapbox request fails
-    return None
 
+    if not cmyk_mode or card is None:
+        return card
+    if isinstance(card, list):
+        return [to_press_cmyk(c) for c in card]
+    return to_press_cmyk(card)
 
-def create_file_info_card(
+
+def _compose_file_info_card(
     file_path,
     width=800,
     height=800,
-    cmyk_mode=False,
     exclude_file_path=False,
     border_color=(245, 245, 245),
     border_inch_width=0.125,
@@ -1201,6 +663,7 @@ def create_file_info_card(
     video_mode="grid",
     all_pdf_pages=False,
     _pdf_preview_img=None,
+    _video_frames=None,
     ignore_unknown_files=True,
     outer_padding_inches=0.5,  # New parameter: outer padding in inches at 300 DPI
 ):
@@ -1220,82 +683,50 @@ def create_file_info_card(
     if file_path.name.startswith("._") or file_path.name.startswith(".") or file_path.name == ".DS_Store":
         logging.info(f"Ignoring weird dot file: {file_path.name}")
         return None
-    # Proportional scaling
-    base_width = 800
-    base_height = 1000
-    scale = min(width / base_width, height / base_height)
+    # Layout phase, part one: page-size dependent measurements (cached per size)
+    geometry = card_geometry(width, height, outer_padding_inches, border_inch_width)
+
+    scale = geometry.scale
     #logging.debug(f"Scaling card to {width}x{height} with scale factor {scale:.2f}")
     # Proportional paddings
     border_width = max(2, int(1 * scale))  # Using a more reasonable but still very visible border width
-    # Convert outer_padding_inches to pixels at 300 DPI
-    outer_padding_px = int(outer_padding_inches * 300)
-    outer_padding = max(outer_padding_px, int(outer_padding_px * scale))  # Padding between border and outer edges of content
+    # Padding between border and outer edges of content (outer_padding_inches at 300 DPI)
+    outer_padding = geometry.outer_padding
 
-    # Create the full-sized background image that is the canvas for the preview
+    # The canvas itself (background, header bar, trim border) comes from a cached
+    # per-size template once the file type is known; see "Draw card" below
     # Use non-alpha modes so downstream PDF assembly doesn't hit alpha issues
-    try:
-        if cmyk_mode:
-            # Light background in CMYK
-            img = Image.new('CMYK', (width, height), rgb_to_cmyk(250, 250, 250))
-        else:
-            # Light background in RGB
-            img = Image.new('RGB', (width, height), (250, 250, 250))
-    except Exception as e:
-        logging.error(f"Error creating background image: {e}")
-    draw = ImageDraw.Draw(img)
 
-    # Draw the border around the content area
-    # Determine the color mode first to avoid variable reference issues
-    rgb_mode = not cmyk_mode
-    preview_background_color = (250, 250, 250) if rgb_mode else rgb_to_cmyk(250, 250, 250)
-    # Define a reliable black text color for the current mode
-    text_black = (0, 0, 0) if rgb_mode else (0, 0, 0, 255)
-    if rgb_mode:
-        # For RGB mode, use standard black border
-        draw.rectangle(
-            [outer_padding, outer_padding, width - outer_padding - 1, height - outer_padding - 1],
-            outline=(255, 0, 0), 
-            width=0
-        )
-    else:
-        # For CMYK mode, use solid black (K channel only at 100%) for maximum visibility
-        # Draw multiple concentric borders to ensure visibility
-        for i in range(0, min(10, border_width), 2):  # Draw up to 5 concentric borders
-            draw.rectangle(
-                [
-                    outer_padding + i,
-                    outer_padding + i,
-                    width - outer_padding - 1 - i,
-                    height - outer_padding - 1 - i
-                ],
-                outline=(0, 0, 0, 5),  # 100% black in CMYK
-                width=max(5, border_width // 5)  # Make each border line thick
-            )
+    # Composed in RGB; create_file_info_card separates CMYK cards afterwards
+    preview_background_color = (250, 250, 250)
+    text_black = (0, 0, 0)
+
+    # Trim border drawn around the whole card, part of the template
+    color_border_width = geometry.color_border_width
+
 
     # Proportional font sizes
-    title_font_size = int(20 * scale)
-    info_font_size = int(18 * scale)  # Smaller font size for metadata
-    preview_font_size = int(12 * scale)
-    fit_font_size = int(15 * scale)
+    title_font_size, info_font_size, preview_font_size, fit_font_size = (
+        geometry.title_font_size, geometry.info_font_size, geometry.preview_font_size, geometry.fit_font_size)
     # Proportional paddings (keeping the original border_width value)
-    icon_space = int((30) * scale)
-    metadata_line_height = int(info_font_size * 1.05)  # Tighter line spacing for metadata
-    spacing_between_metadata_and_content_preview = int(icon_space * scale)
-    preview_box_padding = int(10 * scale)
-    header_height = int(25 * scale)
+    icon_space = geometry.icon_space
+    metadata_line_height = geometry.metadata_line_height
+    spacing_between_metadata_and_content_preview = geometry.spacing_between_metadata_and_content_preview
+    preview_box_padding = geometry.preview_box_padding
+    header_height = geometry.header_height
 
     # Add a margin between the header/title and the metadata box
-    metadata_top_margin = int(12 * scale)
+    metadata_top_margin = geometry.metadata_top_margin
 
     # Load fonts
     try:
         
-        font_path = get_font_path()
-        title_font = ImageFont.truetype(str(font_path), title_font_size)
+        # Shared across cards: same page size means the same four fonts
+        title_font = get_font(title_font_size)
         
-        info_font = ImageFont.truetype(str(font_path), info_font_size)
-        preview_font = ImageFont.truetype(str(font_path), preview_font_size)
-        fit_font = ImageFont.truetype(str(font_path), fit_font_size)
+        info_font = get_font(info_font_size)
+        preview_font = get_font(preview_font_size)
+        fit_font = get_font(fit_font_size)
     except Exception as e:
         logging.error(f"Error loading custom font: {e}")
         logging.error("Could not load custom font, falling back to default font")
@@ -1452,15 +883,9 @@ def create_file_info_card(
         if exif_candidate:
             logging.debug(f"File {file_path} is an EXIF-capable image type: {ext}")
             try:
-                exif_img = Image.open(file_path)
-                if hasattr(exif_img, '_getexif'):
-                    exif_data = exif_img._getexif()
-                elif hasattr(exif_img, 'getexif'):
-                    exif_data = exif_img.getexif()
-                try:
-                    exif_img.close()
-                except Exception:
-                    pass
+                # Shared with file ordering and thumbnailing, so this is usually a cache hit
+                descriptor = get_image_descriptor(file_path)
+                exif_data = descriptor.exif if descriptor is not None else None
             except Exception:
                 exif_data = None
         if exif_data is not None:
@@ -1508,6 +933,12 @@ def create_file_info_card(
     ## END OF NO METADATA
     ##
     ##
+
+    # Container-level video facts (duration, fps, size, codec, rotation) come from a
+    # cheap probe that is cached per file, so both movie cards share it
+    if file_type_info['group'] == 'movie':
+        for key, value in video_card_metadata(probe_video(file_path)).items():
+            file_info.setdefault(key, value)
     
     # --- Custom metadata_text support (multiline, wrapped) ---
     # If metadata_text is provided, use it instead of the default metadata lines.
@@ -1521,72 +952,30 @@ def create_file_info_card(
             custom_metadata_text = str(metadata_text)
         # if exclude_file_path is False:
         #     custom_metadata_text = f"{custom_metadata_text}\n\n{str(file_path.parent)}"
-    # Compute metadata block height
-    # Default: number of key/value pairs * line height
-    content_area_width_for_wrap = width - 2 * outer_padding
-    if custom_metadata_text:
-        # Measure single-line height and derive spacing to match metadata_line_height advance
-        tmp_img = Image.new("RGBA", (width, height))
-        tmp_draw = ImageDraw.Draw(tmp_img)
-        l, t, r, b = tmp_draw.textbbox((0, 0), "Ag", font=info_font)
-        single_h = b - t
-        custom_line_spacing_px = max(0, int(metadata_line_height - single_h))
-
-        # Use the SAME padding for measure and draw
-        meta_pad = int(30 * scale)
-
-        # Choose background colors matching the target image mode
-        bg_rgb = (245, 245, 245)
-        bg_outline_rgb = (200, 200, 200)
-        if cmyk_mode:
-            bg_fill = rgb_to_cmyk(*bg_rgb)
-            bg_outline = rgb_to_cmyk(*bg_outline_rgb)
-        else:
-            bg_fill = bg_rgb
-            bg_outline = bg_outline_rgb
-
-        # Measure wrapped text height (text only), then add vertical padding
-        measure = draw_text_box(
-            tmp_draw,
-            custom_metadata_text,
-            info_font,
-            box=(outer_padding, outer_padding + header_height, content_area_width_for_wrap, height - (outer_padding + header_height)),
-            padding=meta_pad,
-            line_spacing=custom_line_spacing_px,
-            align="center",
-            v_align="top",
-            fill=text_fill,
-            background_fill=bg_fill,
-            background_radius=int(3 * scale),
-            background_outline=bg_outline,
-            background_outline_width=1,
-        )
-        metadata_height = measure["used_size"][1] + (meta_pad * 2)
-    else:
-        metadata_lines = len(file_info)
-        metadata_height = metadata_lines * metadata_line_height
+    # Layout phase, part two: wrap the metadata and place the preview box before
+    # decoding anything, so previews are requested at their final size
+    content_area_width_for_wrap = geometry.content_area_width_for_wrap
+    layout = plan_card_layout(
+        geometry,
+        info_font,
+        preview_font,
+        field_lines=metadata_display_lines(file_info),
+        field_count=len(file_info),
+        custom_metadata_text=custom_metadata_text or None,
+        path_lines=card_path_lines(file_path) if exclude_file_path is False else (),
+    )
+    metadata_height = layout.metadata_height
     logging.debug(f"Metadata height: {metadata_height}")
-    # Content area dimensions, accounting for outer padding
-    content_area_left = outer_padding
-    content_area_right = width - outer_padding
-    content_area_width = content_area_right - content_area_left
-    
-    # Preview box within the content area
-    preview_box_left = content_area_left + int(content_area_width * 0.005)
-    preview_box_right = content_area_right - int(content_area_width * 0.005)
-    preview_box_top = outer_padding + header_height + metadata_top_margin + metadata_height + spacing_between_metadata_and_content_preview
+    preview_box_left, preview_box_top, preview_box_right, preview_box_bottom = layout.preview_box
     logging.debug(f"Preview box top: {preview_box_top}, icon space: {icon_space}, metadata height: {metadata_height}")
-    preview_box_bottom = height - outer_padding - int(30 * scale)
-    preview_box_height = preview_box_bottom - preview_box_top - preview_box_padding * 2
-    max_line_width_pixels = preview_box_right - preview_box_left - preview_box_padding * 2
-    temp_img = Image.new('RGBA', (width, height))
-    temp_draw = ImageDraw.Draw(temp_img)
-    bbox = temp_draw.textbbox((0, 0), 'A', font=preview_font)
-    line_height = bbox[3] - bbox[1] + int(3 * scale)
-    char_bbox = temp_draw.textbbox((0, 0), 'A', font=preview_font)
-    char_width = char_bbox[2] - char_bbox[0]
-    max_line_length = max(10, max_line_width_pixels // char_width)
-    max_preview_lines = max(1, preview_box_height // line_height)
+    max_line_width_pixels, preview_box_height = layout.preview_size
+    line_height = layout.line_height
+    max_line_length = layout.max_line_length
+    max_preview_lines = layout.max_preview_lines
+
+
+
+
 
     # --- Preview logic by file type ---
     preview_lines = []
@@ -1617,7 +1006,6 @@ def create_file_info_card(
             image = get_image_thumbnail(
                 file_path,
                 box_size=(max_line_width_pixels, preview_box_height),
-                cmyk_mode=cmyk_mode
             )
             if image is not None:
                 img_w, img_h = image.size
@@ -1635,58 +1023,30 @@ def create_file_info_card(
         elif ext in {'.gif'}:
             try:
                 img = Image.open(file_path)
-                frames = []
-                # Extract all frames from the GIF
-                for frame_idx in range(img.n_frames):
+                # Choose the grid from the frame count and canvas size alone; every GIF
+                # frame has the canvas size, so no pixels are needed to score a layout
+                n_total = getattr(img, "n_frames", 1)
+                frame_w, frame_h = img.size
+
+                # Every cell holds an evenly spaced frame; all frames share one size
+                grid = solve_grid([(frame_w, frame_h)] * n_total, (max_line_width_pixels, preview_box_height), fill_cells=True)
+                if grid is None:
+                    raise Exception("Preview box too small for a frame grid.")
+
+                # Decode only the chosen frames, seeking forward through the file once
+                decoded = {}
+                for frame_idx in sorted(set(grid.indices)):
                     img.seek(frame_idx)
-                    frame = img.convert("RGBA")
-                    frames.append(frame.copy())
-                # Determine grid size based on number of frames
-                n_total = len(frames)
-                              
-                best_score = -1
-                best_grid = None
-                best_indices = None
-
-                for rows in range(1, n_total + 1):
-                    cols = int(math.ceil(n_total / rows))
-                    num_cells = rows * cols
-                    thumb_w = max_line_width_pixels // cols
-                    thumb_h = preview_box_height // rows
-                    # Select evenly spaced frames to fill the grid
-                    indices = [int(i) for i in np.linspace(0, n_total - 1, num_cells)]
-                    total_used_area = 0
-                    for idx in indices:
-                        w, h = frames[idx].size
-                        frame_scale = min(thumb_w / w, thumb_h / h)
-                        used_w = int(w * frame_scale)
-                        used_h = int(h * frame_scale)
-                        total_used_area += used_w * used_h
-                    score = total_used_area
-                    if score > best_score:
-                        best_score = score
-                        best_grid = (rows, cols, thumb_w, thumb_h)
-                        best_indices = indices
-
-                grid_rows, grid_cols, thumb_w, thumb_h = best_grid
-                selected_frames = [frames[idx] for idx in best_indices]
-                gif_frame_thumbs = []
-                for frame in selected_frames:
-                    thumb = ImageOps.contain(frame, (thumb_w, thumb_h), Image.LANCZOS)
-                    gif_frame_thumbs.append(thumb)
-
-                grid_img = Image.new('RGBA', (max_line_width_pixels, preview_box_height), (245, 245, 245, 255))
-                for idx, thumb in enumerate(gif_frame_thumbs):
-                    x = (idx % grid_cols) * thumb_w + (thumb_w - thumb.width)//2
-                    y = (idx // grid_cols) * thumb_h + (thumb_h - thumb.height)//2
-                    grid_img.paste(thumb, (x, y), mask=thumb)
+                    decoded[frame_idx] = img.convert("RGBA")
+
+                grid_img = compose_grid(decoded, grid, (max_line_width_pixels, preview_box_height), mode='RGBA', background=(245, 245, 245, 255))
 
                 gif_thumb_grid = grid_img.convert("RGBA")
                 image_thumb = gif_thumb_grid
             except Exception as e:
                 preview_lines = [f"GIF error: {e}"]
         elif ext in {'.heic', '.heif'}:
-            image = get_heif_image(file_path)
+            image = get_heif_image(file_path, long_edge=max(max_line_width_pixels, preview_box_height))
             if image is not None:
                 img_w, img_h = image.size
                 if width < height and img_w > img_h:
@@ -1723,7 +1083,7 @@ def create_file_info_card(
         elif ext.lower() == '.pdf':
             try:
                 # Ask get_pdf_preview for overview and per-page thumbs when requested
-                pdf_result = get_pdf_preview(str(file_path), max_line_width_pixels, preview_box_height, all_pages=all_pdf_pages)
+                pdf_result = pdf_preview.get_pdf_preview(str(file_path), max_line_width_pixels, preview_box_height, all_pages=all_pdf_pages)
                 if isinstance(pdf_result, list):
                     # pdf_result[0] is overview (if present), pdf_result[1:] are per-page thumbs
                     cards = []
@@ -1742,11 +1102,10 @@ def create_file_info_card(
                             page_metadata = dict(metadata) if metadata else {}
                             page_metadata["PDF Page"] = f"{page_number} of {total_pages}"
                         # Create a single card for this preview image by reusing create_file_info_card but injecting the preview image.
-                        card_img = create_file_info_card(
+                        card_img = _compose_file_info_card(
                             file_path,
                             width=width,
                             height=height,
-                            cmyk_mode=cmyk_mode,
                             exclude_file_path=exclude_file_path,
                             border_color=border_color,
                             border_inch_width=border_inch_width,
@@ -1770,90 +1129,55 @@ def create_file_info_card(
 
         elif ext.lower() in FILE_TYPE_GROUPS['movie']['extensions']:
             try:
-                import cv2
-                cap = cv2.VideoCapture(str(file_path))
-                ret, frame = cap.read()
-                cap.release()
-                if not ret or frame is None:
-                    raise Exception("Could not read first frame from video.")
+                probe = probe_video(file_path)
+                if probe is not None and not probe.get("frame_count") and not probe.get("duration"):
+                    raise Exception("Video has no frames according to its container metadata.")
                 if video_mode == "first_frame":
+                    pil_img = video_preview.read_first_frame(file_path)
+                    if pil_img is None:
+                        raise Exception("Could not read first frame from video.")
                     # Only show the first frame as the preview
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    pil_img = Image.fromarray(frame)
-                    # Rotate if needed
-                    if height > width and pil_img.width > pil_img.height:
+                    # Rotate if needed (orientation from the container probe when available)
+                    landscape = is_landscape(probe)
+                    if landscape is None:
+                        landscape = pil_img.width > pil_img.height
+                    if height > width and landscape:
                         pil_img = pil_img.rotate(90, expand=True)
                     image_thumb = ImageOps.contain(pil_img, (max_line_width_pixels, preview_box_height), Image.LANCZOS)
                 else:
                     # --- Dynamic grid computation for video frames (like GIF logic) ---
                     # Extract frames
                     total_frames = max_video_frames if max_video_frames > 0 else 9
-                    frames = get_video_frames(file_path, total_frames=total_frames, rotate_frames_if_portrait=True)
+                    # Frames may already have been decoded by a VideoFramePrefetcher worker
+                    if _video_frames is not None:
+                        frames = _video_frames
+                    else:
+                        frames = get_video_frames(file_path, total_frames=total_frames, rotate_frames_if_portrait=True)
                     n_total = len(frames)
                     if n_total == 0:
                         raise Exception("No frames extracted from video.")
-                    best_score = -1
-                    best_grid = None
-                    best_indices = None
-
-                    for rows in range(1, n_total + 1):
-                        cols = int(math.ceil(n_total / rows))
-                        num_cells = rows * cols
-                        thumb_w = max_line_width_pixels // cols
-                        thumb_h = preview_box_height // rows
-                        # Select evenly spaced frames to fill the grid
-                        indices = [int(i) for i in np.linspace(0, n_total - 1, num_cells)]
-                        total_used_area = 0
-                        for idx in indices:
-                            w, h = frames[idx].size
-                            frame_scale = min(thumb_w / w, thumb_h / h)
-                            used_w = int(w * frame_scale)
-                            used_h = int(h * frame_scale)
-                            total_used_area += used_w * used_h
-                        score = total_used_area
-                        if score > best_score:
-                            best_score = score
-                            best_grid = (rows, cols, thumb_w, thumb_h)
-                            best_indices = indices
-
-                    grid_rows, grid_cols, thumb_w, thumb_h = best_grid
-                    selected_frames = [frames[idx] for idx in best_indices]
-                    video_frame_thumbs = []
-                    for frame in selected_frames:
-                        thumb = ImageOps.contain(frame, (thumb_w, thumb_h), Image.LANCZOS)
-                        video_frame_thumbs.append(thumb)
-
-                    grid_img = Image.new('RGBA', (max_line_width_pixels, preview_box_height), (245, 245, 245, 255))
-
-                    for idx, thumb in enumerate(video_frame_thumbs):
-                        x = (idx % grid_cols) * thumb_w + (thumb_w - thumb.width)//2
-                        y = (idx // grid_cols) * thumb_h + (thumb_h - thumb.height)//2
-                        # Ensure thumb is RGBA
-                        if thumb.mode != "RGBA":
-                            thumb = thumb.convert("RGBA")
-                        # Use alpha channel as mask if present
-                        grid_img.paste(thumb, (x, y), mask=thumb.split()[-1] if thumb.mode == "RGBA" else None)
+
+                    # Fill every cell with evenly spaced frames (sizes may differ after rotation)
+                    grid = solve_grid([frame.size for frame in frames], (max_line_width_pixels, preview_box_height), fill_cells=True)
+                    if grid is None:
+                        raise Exception("Preview box too small for a frame grid.")
+
+                    grid_img = compose_grid(frames, grid, (max_line_width_pixels, preview_box_height), mode='RGBA', background=(245, 245, 245, 255))
 
                     image_thumb = grid_img.convert("RGBA")
             except Exception as e:
                 preview_lines = [f"Video error: {e}"]
         # Defer drawing to later section after header/metadata are drawn.
         elif ext.lower() == '.gpx':
-            gpx_thumb = get_gpx_preview(file_path, max_line_width_pixels, preview_box_height)
+            gpx_thumb = gps_preview.get_gpx_preview(file_path, max_line_width_pixels, preview_box_height)
             # Mapbox integration for GPX with polyline
             try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    gpx = gpxpy.parse(f)
-                points = []
-                for track in gpx.tracks:
-                    for segment in track.segments:
-                        for p in segment.points:
-                            points.append((p.longitude, p.latitude))
+                points = gps_preview.gpx_route_points(file_path)
                 if points:
                     lons, lats = zip(*points)
                     min_lon, max_lon = min(lons), max(lons)
                     min_lat, max_lat = min(lats), max(lats)
-                    mapbox_img = get_mapbox_tile_for_bounds(min_lat, max_lat, min_lon, max_lon, min(max_line_width_pixels, 1280), min(preview_box_height, 1280), path_points=points)
+                    mapbox_img = gps_preview.get_mapbox_tile_for_bounds(min_lat, max_lat, min_lon, max_lon, min(max_line_width_pixels, 1280), min(preview_box_height, 1280), path_points=points)
                     if mapbox_img:
                         gpx_thumb = mapbox_img
             except Exception:
@@ -1862,27 +1186,16 @@ def create_file_info_card(
             preview_lines = get_excel_preview(file_path, max_rows=max_preview_lines, max_cols=8)
 
         elif ext.lower() in {'.fit', '.tcx'}:
-            preview_lines, fit_meta = get_fit_summary_preview(file_path)
-            fit_gps_thumb = get_fit_gps_preview(file_path, max_line_width_pixels, preview_box_height)
+            preview_lines, fit_meta = gps_preview.get_fit_summary_preview(file_path)
+            fit_gps_thumb = gps_preview.get_fit_gps_preview(file_path, max_line_width_pixels, preview_box_height)
             # Mapbox integration for FIT/TCX with polyline
             try:
-                fitfile = FitFile(str(file_path))
-                points = []
-                for record in fitfile.get_messages('record'):
-                    lat = None
-                    lon = None
-                    for d in record:
-                        if d.name == 'position_lat':
-                            lat = d.value * (180.0 / 2**31)
-                        elif d.name == 'position_long':
-                            lon = d.value * (180.0 / 2**31)
-                    if lat is not None and lon is not None:
-                        points.append((lon, lat))
+                points = gps_preview.fit_route_points(file_path)
                 if points:
                     lons, lats = zip(*points)
                     min_lon, max_lon = min(lons), max(lons)
                     min_lat, max_lat = min(lats), max(lats)
-                    mapbox_img = get_mapbox_tile_for_bounds(min_lat, max_lat, min_lon, max_lon, min(max_line_width_pixels, 1280), min(preview_box_height, 1280), path_points=points)
+                    mapbox_img = gps_preview.get_mapbox_tile_for_bounds(min_lat, max_lat, min_lon, max_lon, min(max_line_width_pixels, 1280), min(preview_box_height, 1280), path_points=points)
                     if mapbox_img:
                         fit_gps_thumb = mapbox_img
             except Exception:
@@ -1909,7 +1222,7 @@ def create_file_info_card(
         elif file_type_info['group'] == 'font':
             # For font files, generate a visual preview
             try:
-                image_thumb = get_font_preview(file_path, max_line_width_pixels, preview_box_height)
+                image_thumb = font_preview.get_font_preview(file_path, max_line_width_pixels, preview_box_height)
                 if image_thumb:
                     preview_text_replaced_with_image = True
                     preview_lines = []  # No text preview needed
@@ -1979,19 +1292,11 @@ def create_file_info_card(
                                 thumbs.append(img)
                             except Exception:
                                 continue
+
                     # Make a grid if images found
-                    if thumbs:
-                        grid_cols = 2
-                        grid_rows = 2
-                        thumb_w = max_line_width_pixels // grid_cols
-                        thumb_h = preview_box_height // grid_rows
-                        grid_img = Image.new('RGB', (max_line_width_pixels, preview_box_height), (245, 245, 245))
-                        for idx, thumb in enumerate(thumbs):
-                            thumb.thumbnail((thumb_w, thumb_h))
-                            x = (idx % grid_cols) * thumb_w + (thumb_w - thumb.width)//2
-                            y = (idx // grid_cols) * thumb_h + (thumb_h - thumb.height)//2
-                            grid_img.paste(thumb, (x, y))
-                        image_thumb = grid_img
+                    grid = solve_grid([thumb.size for thumb in thumbs], (max_line_width_pixels, preview_box_height))
+                    if grid is not None:
+                        image_thumb = compose_grid(thumbs, grid, (max_line_width_pixels, preview_box_height), mode='RGB', background=(245, 245, 245), upscale=False)
             except Exception as e:
                 preview_lines = [f"KEY error: {e}"]
         elif ext.lower() == '.pptx' or ext.lower() == '.ppt':
@@ -2016,7 +1321,7 @@ def create_file_info_card(
                     # Select images at evenly distributed intervals
                     indices = [0]
                     if n_preview > 1 and n_total > 1:
-                        #import numpy as np
+                        import numpy as np
                         remaining = np.linspace(1, n_total - 1, n_preview - 1)
                         indices += [int(round(i)) for i in remaining]
                     indices = sorted(set(indices))
@@ -2030,28 +1335,17 @@ def create_file_info_card(
                                 thumbs.append(img)
                             except Exception:
                                 continue
-                    # Dynamically determine grid_cols and grid_rows
-                    if thumbs:
-                        aspect_ratio = max_line_width_pixels / max(preview_box_height, 1)
-                        grid_rows = int(math.ceil(math.sqrt(len(thumbs) / aspect_ratio)))
-                        grid_cols = int(math.ceil(len(thumbs) / grid_rows))
-                        thumb_w = max_line_width_pixels // grid_cols
-                        thumb_h = preview_box_height // grid_rows
-                        grid_img = Image.new('RGB', (max_line_width_pixels, preview_box_height), (245, 245, 245))
-                        for idx, thumb in enumerate(thumbs):
-                            thumb.thumbnail((thumb_w, thumb_h))
-                            x = (idx % grid_cols) * thumb_w + (thumb_w - thumb.width)//2
-                            y = (idx // grid_cols) * thumb_h + (thumb_h - thumb.height)//2
-                            grid_img.paste(thumb, (x, y))
-                        image_thumb = grid_img
+
+                    # Pick the grid that shows the most image area
+                    grid = solve_grid([thumb.size for thumb in thumbs], (max_line_width_pixels, preview_box_height))
+                    if grid is not None:
+                        image_thumb = compose_grid(thumbs, grid, (max_line_width_pixels, preview_box_height), mode='RGB', background=(245, 245, 245), upscale=False)
             except Exception as e:
                 preview_lines = [f"PPTX error: {e}"]
         elif ext.lower() == '.ai':
             try:
-                pages = convert_from_path(str(file_path), first_page=1, last_page=1)
-                if pages:
-                    image_thumb = process_pdf_or_ai_page(pages[0], max_line_width_pixels, preview_box_height)
-                else:
+                image_thumb = pdf_preview.get_ai_preview(file_path, max_line_width_pixels, preview_box_height)
+                if image_thumb is None:
                     preview_lines = ["AI file: PDF preview not available."]
             except Exception as e:
                 preview_lines = [f"AI error: {e}"]
@@ -2078,29 +1372,12 @@ def create_file_info_card(
                 preview_lines = get_hex_preview(file_path, max_preview_lines * 16)
 
     # --- Draw card ---
-    if cmyk_mode:
-        from pdf_to_images import create_cmyk_image
-        img = create_cmyk_image(width, height, (0, 0, 0, 0))
-        rgb_mode = False
-    else:
-        # We already created the image above, just ensuring it's handled consistently
-        rgb_mode = True
+    # Start from a copy of the pre-rendered chrome for this size
+    img = _card_template(width, height, tuple(border_color), color_border_width).copy()
     draw = ImageDraw.Draw(img)
-    if not rgb_mode:
-        r, g, b = file_type_info['color']
-        if r == 0 and g == 0 and b == 0:
-            color = (0, 0, 0, 100)
-        else:
-            c = 255 - r
-            m = 255 - g
-            y = 255 - b
-            k = min(c, m, y)
-            c = (c - k) if k < 255 else 0
-            m = (m - k) if k < 255 else 0
-            y = (y - k) if k < 255 else 0
-            color = (c, m, y, k)
-    else:
-        color = file_type_info['color']
+    color = tuple(file_type_info['color'])
+    draw.rectangle([outer_padding, outer_padding, width - outer_padding, outer_padding + header_height], fill=color)
+
     # We already set border_width earlier based on scale
     # Header within the content area
     # This is where we draw the title
@@ -2110,12 +1387,7 @@ def create_file_info_card(
     ### HERE IS WHERE WE DRAW THE HEADER and HEADER TEXT
     ###
     ####################################
-    if rgb_mode:
-        draw.rectangle([outer_padding, outer_padding, width-outer_padding, outer_padding+header_height], fill=file_type_info['color'])
-        text_color = 'white'
-    else:
-        draw.rounded_rectangle([outer_padding, outer_padding, width-outer_padding, outer_padding+header_height], 5, fill=color)
-        text_color = (0, 0, 0, 0)
+    text_color = 'white'
     # Position the file name vertically centered in the header area, accounting for outer padding
     # Determine the title text for the header
     if file_info.get("_title") is not None:
@@ -2169,7 +1441,7 @@ def create_file_info_card(
     ### HERE IS WHERE WE DRAW THE AVATAR THING
     ###
     ###
-    avatar_size = int(120 * scale)
+    avatar_size = geometry.avatar_size
     avatar_img = None
 
     qr_avatar_data = metadata.get('qr_data') if metadata else None
@@ -2230,35 +1502,21 @@ def create_file_info_card(
     # Initialize variables to safe defaults before conditionals
     meta_pad = int(10 * scale)
     custom_line_spacing_px = 0
-    if cmyk_mode:
-        bg_fill = (0, 0, 0, 1)  # CMYK very light gray
-        bg_outline = (0, 0, 0, 255)  # 100% black
-        text_fill = (0, 0, 0, 255)
-    else:
-        bg_rgb = (255, 255, 255)
-        bg_outline_rgb = (0, 0, 0)
-        bg_fill = bg_rgb
-        bg_outline = bg_outline_rgb
-        text_fill = (0, 0, 0)
-
-    if custom_metadata_text:
-        # Recompute spacing to match measurement
+    bg_rgb = (255, 255, 255)
+    bg_outline_rgb = (0, 0, 0)
+    bg_fill = bg_rgb
+    bg_outline = bg_outline_rgb
+    text_fill = (0, 0, 0)
+
+    if layout.custom_metadata:
+        # Same spacing the layout measured with
         y_offset = 0
-        tmp_img2 = Image.new("RGBA", (width, height))
-        tmp_draw2 = ImageDraw.Draw(tmp_img2)
-        l, t, r, b = tmp_draw2.textbbox((0, 0), "Ag", font=info_font)
-        single_h = b - t
-        custom_line_spacing_px = max(0, int(metadata_line_height - single_h))
+        custom_line_spacing_px = layout.custom_line_spacing
         meta_pad = int(10 * scale)
 
-        if cmyk_mode:
-            bg_fill = (0, 0, 0, 1)  # CMYK white
-            bg_outline = (0, 0, 0, 255)  # 100% black
-            text_fill = (0, 0, 0, 255)  # K-only text
-        else:
-            bg_fill = bg_rgb
-            bg_outline = bg_outline_rgb
-            text_fill = (0, 0, 0, 255)
+        bg_fill = bg_rgb
+        bg_outline = bg_outline_rgb
+        text_fill = (0, 0, 0, 255)
         draw_text_box(
             draw,
             custom_metadata_text,
@@ -2282,77 +1540,28 @@ def create_file_info_card(
         ## HERE WE DRAW METADATA TEXT ##
         ##                            ##
         ################################
-        for key, value in file_info.items():
-            #logging.info(f"Metadata key: {key}, value: {value}")
-            if value is None or value == '':
-                continue
-            elif key.lower() == 'sequence_group' or key.lower() == 'sequence_index':
-                continue # Skip sequence info in metadata display
-            elif key.lower() == 'creation_timestamp' or key.lower() == 'ts' or key.lower() == 'timestamp':
-                try:
-                    # Try to convert to f loat and then to datetime
-                    ts_float = float(value)
-                    dt = datetime.fromtimestamp(ts_float)
-                    line = dt.strftime("%B %d, %Y %H:%M:%S")
-                except Exception:
-                    pass
-            
-            elif key.lower() == 'qr_data':
-                continue  # Skip QR data in metadata display
-            elif key.lower() == '_title':
-                continue # Skip _title as it's shown in header
-            elif key.lower() == 'name' or key.lower() == 'filename' or key.lower() == 'filepath' or key.lower() == 'created':
-                line = f"{value}"
-            elif key.lower() == '_blank':
-                line = ""
-            elif key.startswith('_'):
-                line = f"{value}"
+        # Lines were formatted and wrapped (to the width beside the avatar) by the layout
+        y = layout.metadata_top
+
+        for wrapped_line in layout.metadata_lines:
+            if avatar_img is not None and y < (avatar_y_coordinate + avatar_size):
+                draw.text((avatar_x_coordinate + avatar_size + meta_pad, y), wrapped_line, fill=text_black, font=info_font, anchor="lt")
+                y += metadata_line_height
             else:
-                line = f"{key}: {value}"
-            # Wrap the line to fit within the content area width
-            wrapped_lines = wrap_text_by_pixel(draw, line, info_font, content_area_width_for_wrap - avatar_size)
-            for wrapped_line in wrapped_lines:
-                if avatar_img is not None and y < (avatar_y_coordinate + avatar_size):
-                    draw.text((avatar_x_coordinate + avatar_size + meta_pad, y), wrapped_line, fill=text_black, font=info_font, anchor="lt")
-                    y += metadata_line_height
-                else:
-                    draw.text((outer_padding, y), wrapped_line, fill=text_black, font=info_font, anchor="lt")
-                    y += metadata_line_height
+                draw.text((outer_padding, y), wrapped_line, fill=text_black, font=info_font, anchor="lt")
+                y += metadata_line_height
                     
-        if exclude_file_path is False:
-            last_parts = Path(file_path).parts[-3:]
-            short_path = "/".join(last_parts)
-            filename = Path(file_path).name
-            # Truncate filename if longer than 25 characters
-            # And if we have one of those huge unwieldly filenames that
-            # Instagram produces, just show the last two parts of the file path
-            if len(filename) > 50:
-                filename = f"{filename[:25]}...{filename[-25:]}"
-                short_path = "/".join(last_parts[:-1])
-
-            # Place path using computed metadata_height to avoid relying on incremental y
-            meta_bottom = y # outer_padding + header_height + metadata_top_margin + metadata_height
-            gap = max(4, int(6 * scale))
-            path_y = int(meta_bottom + gap)
-
-            # Draw the short path (excluding filename) BELOW the metadata we just wrote.
-            # Use path_y instead of the incrementally advanced y to avoid drift.
-            if len(last_parts) > 1:
-                draw.text((width//2, path_y), short_path, fill=text_black, font=info_font, anchor="mm")
-                draw.text((width//2, path_y + metadata_line_height), filename, fill=text_black, font=info_font, anchor="mm")
-                y_offset = metadata_line_height * 2 + 5
-            else:
-                draw.text((width//2, path_y), filename, fill=text_black, font=info_font, anchor="mm")
-                y_offset = metadata_line_height + 5
+        if layout.path_lines:
+            # Short path (excluding filename) and filename below the metadata, centered
+            path_y = layout.path_y
+
+            for path_index, path_line in enumerate(layout.path_lines):
+                draw.text((width//2, path_y + path_index * metadata_line_height), path_line, fill=text_black, font=info_font, anchor="mm")
 
-            # Advance y based on the placement we used for path
-            y = path_y + y_offset
             #logging.debug(f"File Path is {short_path}")
             #logging.debug(f"Last Parts is {last_parts} and it is {len(last_parts)} elements long")
-    # Make sure the preview area starts below the last metadata line
-    preview_box_top = max(preview_box_top, int(y + spacing_between_metadata_and_content_preview))
-    preview_box_height = preview_box_bottom - preview_box_top - preview_box_padding * 2
-    max_preview_lines = max(1, preview_box_height // line_height)
+    # The layout already placed the preview area below the last metadata line
+
 
     y = preview_box_top
     ###
@@ -2391,7 +1600,7 @@ def create_file_info_card(
         img.paste(fit_gps_thumb, (int(x0), int(y0)))
         # Draw summary below the map if space allows
         try:
-            fit_font = ImageFont.truetype("/Users/julian/OMATA Dropbox/Julian Bleecker/PRODUCTION ASSETS/FONTS/3270/3270NerdFontMono-Regular.ttf", 12)
+            fit_font = get_font(FIT_SUMMARY_FONT_SIZE)
         except:
             fit_font = ImageFont.load_default()
         text_y = y0 + img_h + 10
@@ -2407,7 +1616,7 @@ def create_file_info_card(
     # If no GPS map, just show summary text as before
     if ext == '.fit' and preview_lines:
         try:
-            fit_font = ImageFont.truetype("/Users/julian/OMATA Dropbox/Julian Bleecker/PRODUCTION ASSETS/FONTS/3270/3270NerdFontMono-Regular.ttf", 12)
+            fit_font = get_font(FIT_SUMMARY_FONT_SIZE)
         except:
             fit_font = ImageFont.load_default()
         text_y = preview_box_top + preview_box_padding
@@ -2447,10 +1656,7 @@ def create_file_info_card(
             draw_frame = ImageDraw.Draw(overview_img)
             min_border_px = int(border_inch_width * dpi)
             color_border_width = min_border_px
-            if cmyk_mode:
-                draw_frame.rectangle([0, 0, width, height], outline=rgb_to_cmyk(*border_color), width=color_border_width)
-            else:
-                draw_frame.rectangle([0, 0, width, height], outline=border_color, width=color_border_width)
+            draw_frame.rectangle([0, 0, width, height], outline=border_color, width=color_border_width)
             # Always produce an overview card
             if not include_video_frames:
                 return overview_img
@@ -2473,10 +1679,7 @@ def create_file_info_card(
                 dpi = 300
                 min_border_px = int(border_inch_width * dpi)
                 color_border_width = min_border_px
-                if cmyk_mode:
-                    draw_frame.rectangle([0, 0, width, height], outline=rgb_to_cmyk(*border_color), width=color_border_width)
-                else:
-                    draw_frame.rectangle([0, 0, width, height], outline=border_color, width=color_border_width)
+                draw_frame.rectangle([0, 0, width, height], outline=border_color, width=color_border_width)
                 cards.append(frame_img)
             return cards
     elif image_thumb is not None:
@@ -2542,18 +1745,11 @@ def create_file_info_card(
             text_y += line_height
     
     
-    # I need to convert from RGB to CMYK
-    dpi = 300  # or whatever your output DPI is
-    #border_inch_width = 0.125  # Minimum border in inches
-    min_border_px = int(border_inch_width * dpi)  # 0.125 * 300 = 37 pixels
-
-    color_border_width = min_border_px #max(min_border_px, int(10 * scale), 20)
-    
-    # color_border_width = min(int(20 * scale), 20)  # Scales with 'scale', but never exceeds 15
-    if cmyk_mode:
-        draw.rectangle([0, 0, width, height], outline=rgb_to_cmyk(*border_color), width=color_border_width)
-    else:
+    # The trim border is in the template; redraw it only if content could reach into it
+    if outer_padding < color_border_width:
         draw.rectangle([0, 0, width, height], outline=border_color, width=color_border_width)
+    
+    
     return img
 
 def determine_file_type(file_path):
@@ -2581,7 +1777,7 @@ def get_slack_user_name(slack_user_id, users_json_path):
         logging.error(f"Error reading users.json: {e}")
     return None
 
-def save_card_as_tiff(img, output_path, cmyk_mode=False):
+def save_card_as_tiff(img, output_path, cmyk_mode=False, codec=None, card_type=None):
     """
     Save a card image as a TIFF file with proper handling for CMYK mode.
     This function ensures borders are preserved during CMYK conversion.
@@ -2590,9 +1786,32 @@ def save_card_as_tiff(img, output_path, cmyk_mode=False):
         img: The PIL Image object to save
         output_path: The path where the TIFF should be saved
         cmyk_mode: Whether to save in CMYK mode (True) or RGB mode (False)
+        codec: Intermediate codec spec ("deflate", "lzw", "zstd", "none",
+            "png[:level]"); defaults to the configured one (see card_writer)
+        card_type: File type the card shows; PDF assembly uses it to pick
+            JPEG or Flate for the page (see pdf_policy)
+
+    Returns:
+        The path written; its suffix follows the codec (.png for PNG cards)
     """
+    card_codec = card_writer.card_codec(cmyk_mode, codec)
+    output_path = card_codec.output_path(output_path)
+    # Save time and bytes per card feed the render history used by --plan
+    with render_metrics.timed("save.tiff"):
+        _write_card_tiff(img, output_path, cmyk_mode, card_codec)
+    render_metrics.increment("tiff.cards")
+    pdf_policy.record_card_type(output_path, card_type)
+    try:
+        render_metrics.increment("tiff.bytes", os.path.getsize(output_path))
+    except OSError:
+        pass
+    return output_path
+
+def _write_card_tiff(img, output_path, cmyk_mode, card_codec):
     try:
         if cmyk_mode:
+            if img.mode != 'CMYK':
+                img = to_press_cmyk(img)
             # For CMYK mode, we need to make sure the border is even more pronounced
             # Draw an additional solid border around the entire image
             draw = ImageDraw.Draw(img)
@@ -2604,14 +1823,9 @@ def save_card_as_tiff(img, output_path, cmyk_mode=False):
             #         width=4  # Thick line
             #     )
             
-            # Save with LibTIFF and specific compression settings
-            img.save(
-                output_path, 
-                format='TIFF',
-                compression='none',  # No compression for maximum quality
-                dpi=(300, 300)       # Set DPI to 300
-            )
-            logging.info(f"Saved CMYK TIFF with reinforced border: {output_path}")
+            # Lossless codec validated to pass through img2pdf, at 300 DPI
+            card_codec.save(img, output_path)
+            logging.info(f"Saved CMYK {card_codec.name} card with reinforced border: {output_path}")
             logging.info(f"{output_path}")
         else:
             # For RGB mode, add a clear border too
@@ -2620,8 +1834,8 @@ def save_card_as_tiff(img, output_path, cmyk_mode=False):
             draw.rectangle([0, 0, w-1, h-1], outline=(0, 0, 0), width=5)
             
             # Standard save
-            img.save(output_path, format='TIFF', compression='tiff_deflate')
-            logging.info(f"Saved RGB TIFF with reinforced border: {output_path}")
+            card_codec.save(img, output_path)
+            logging.info(f"Saved RGB {card_codec.name} card with reinforced border: {output_path}")
             logging.info(f"{output_path}")
 
     except Exception as e:
@@ -2630,22 +1844,6 @@ def save_card_as_tiff(img, output_path, cmyk_mode=False):
         img.save(output_path)
         logging.warning(f"Used fallback save method for: {output_path}")
 
-def process_pdf_or_ai_page(page, max_width, max_height):
-    """
-    Takes a PIL Image (PDF or AI page), rotates if landscape, and scales to fit the preview box.
-    Returns the processed image.
-    """
-    img_w, img_h = page.size
-    # Rotate if landscape
-    if img_w > img_h:
-        page = page.rotate(90, expand=True)
-        img_w, img_h = page.size
-    # Scale to fit preview box
-    scale_factor = min(max_width / img_w, max_height / img_h, 1) * 0.95
-    new_w = int(img_w * scale_factor)
-    new_h = int(img_h * scale_factor)
-    return page.resize((new_w, new_h), Image.LANCZOS)
-
 def get_excel_preview(file_path, max_rows=10, max_cols=8):
     ext = file_path.suffix.lower()
     preview_lines = []
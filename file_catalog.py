@@ -0,0 +1,73 @@
+"""
+Per-process catalog of cheap-to-keep, expensive-to-compute file metadata.
+
+Entries are keyed by the resolved path plus size and mtime, so an edited file
+gets a fresh entry automatically. Each entry is a plain dict that collects the
+different kinds of metadata we learn about a file (``stat``, ``video_probe``,
+...) so every stage of a run can reuse what an earlier stage already read.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+PathLike = Union[str, Path]
+CatalogKey = Tuple[str, int, int]
+
+_entries: Dict[CatalogKey, Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def _catalog_key(file_path: PathLike) -> Optional[CatalogKey]:
+    try:
+        resolved = Path(file_path).resolve()
+        st = os.stat(resolved)
+    except OSError:
+        return None
+    return (str(resolved), st.st_size, st.st_mtime_ns)
+
+
+def get_entry(file_path: PathLike) -> Dict[str, Any]:
+    """Return the (possibly empty) catalog entry for file_path."""
+    key = _catalog_key(file_path)
+    if key is None:
+        return {}
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            entry = {"stat": {"path": key[0], "size": key[1], "mtime_ns": key[2]}}
+            _entries[key] = entry
+        return entry
+
+
+def cached(file_path: PathLike, kind: str, compute: Callable[[Path], Any]) -> Any:
+    """
+    Return entry[kind] for file_path, computing and storing it on first use.
+
+    Failures in compute() are logged and cached as None so a broken file is
+    not re-read for every card that asks about it.
+    """
+    entry = get_entry(file_path)
+    if kind in entry:
+        return entry[kind]
+    try:
+        value = compute(Path(file_path))
+    except Exception as exc:
+        logging.warning("Could not compute %s for %s: %s", kind, file_path, exc)
+        value = None
+    with _lock:
+        entry[kind] = value
+    return value
+
+
+def clear() -> None:
+    """Drop every cached entry (mainly useful between independent runs)."""
+    with _lock:
+        _entries.clear()
+
+
+__all__ = ["get_entry", "cached", "clear"]
@@ -0,0 +1,86 @@
+"""
+Process-wide cache of loaded FreeType fonts.
+
+Every card used to call ``ImageFont.truetype`` for its title, info, preview
+and FIT fonts, and font previews loaded each sample size of the target font
+again per card. ``get_font`` hands out one shared ``FreeTypeFont`` per
+(path, size, index, layout engine), so thousands of cards at one page size
+reuse the same FreeType faces. ``warm`` loads a set of sizes up front so the
+first card of a run does not pay for them.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+from PIL import ImageFont
+
+import render_metrics
+from config_loader import get_font_path
+
+FontKey = Tuple[str, int, int, Optional[int]]
+
+# Font previews load arbitrary font files; keep the least recently used ones bounded
+MAX_CACHED_FONTS = 256
+
+_fonts: "OrderedDict[FontKey, ImageFont.FreeTypeFont]" = OrderedDict()
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _card_font_path() -> str:
+    return get_font_path()
+
+
+def get_font(
+    size: int,
+    path=None,
+    index: int = 0,
+    layout_engine: Optional[int] = None,
+) -> ImageFont.FreeTypeFont:
+    """
+    Return the shared font for (path, size, index, layout_engine).
+
+    path None means the configured card font. Raises OSError like
+    ``ImageFont.truetype`` when the font cannot be loaded, so callers keep
+    their ``load_default()`` fallbacks.
+    """
+    font_path = str(path) if path else _card_font_path()
+    key = (font_path, int(size), index, layout_engine)
+    with _lock:
+        font = _fonts.get(key)
+        if font is not None:
+            _fonts.move_to_end(key)
+    if font is not None:
+        render_metrics.increment("font_cache.hit")
+        return font
+
+    font = ImageFont.truetype(font_path, int(size), index=index, layout_engine=layout_engine)
+    render_metrics.increment("font_cache.load")
+    with _lock:
+        font = _fonts.setdefault(key, font)
+        while len(_fonts) > MAX_CACHED_FONTS:
+            _fonts.popitem(last=False)
+    return font
+
+
+def warm(sizes: Iterable[int], path=None) -> None:
+    """Load the given sizes of a font (default: the card font) into the cache."""
+    for size in sizes:
+        try:
+            get_font(size, path)
+        except OSError as exc:
+            logging.debug("Could not preload font %s at %s: %s", path or _card_font_path(), size, exc)
+
+
+def clear() -> None:
+    with _lock:
+        _fonts.clear()
+    _card_font_path.cache_clear()
+
+
+__all__ = ["get_font", "warm", "clear", "MAX_CACHED_FONTS"]
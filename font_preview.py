@@ -0,0 +1,160 @@
+"""
+Sample-sheet previews for font files.
+
+Imported on first use through preview_registry; fontTools (for the family,
+style and version names) is only loaded when a run contains fonts.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import textwrap
+import traceback
+
+from PIL import Image, ImageDraw, ImageFont
+
+from font_cache import get_font
+
+try:
+    from fontTools import ttLib
+    FONTTOOLS_AVAILABLE = True
+except ImportError:
+    FONTTOOLS_AVAILABLE = False
+    logging.warning("fontTools not available. Font metadata will be limited.")
+
+
+def get_font_preview(file_path, box_w, box_h):
+    """
+    Generate a preview image for a font file (TTF, OTF).
+    
+    Args:
+        file_path: Path to the font file
+        box_w: Width of the preview box
+        box_h: Height of the preview box
+        
+    Returns:
+        A PIL Image containing a preview of the font with sample text
+    """
+    try:
+        # Create a white background image
+        preview = Image.new('RGB', (box_w, box_h), (255, 255, 255))
+        draw = ImageDraw.Draw(preview)
+        
+        # Try to load the font
+        font_path = str(file_path)
+        
+        # Sample text to display
+        sample_text = "The OMATA One. As useful as art."
+        pangram = "The quick brown fox jumps over the lazy dog"
+        numbers = "0123456789"
+        special_chars = "!@#$%^&*()_+-=[]{}|;:'\",.<>/?"
+        
+        # Font sizes to display
+        # Font sizes to display
+        sizes = [36, 48, 64, 72]
+        
+        # Get font metadata if possible
+        font_metadata = []
+        if FONTTOOLS_AVAILABLE:
+            try:
+                font = ttLib.TTFont(font_path)
+                
+                # Try to get font family name
+                if 'name' in font:
+                    for record in font['name'].names:
+                        if record.nameID == 1 and record.isUnicode():  # Font Family name
+                            family_name = record.toUnicode()
+                            font_metadata.append(f"Family: {family_name}")
+                            break
+                    
+                    for record in font['name'].names:
+                        if record.nameID == 2 and record.isUnicode():  # Font Subfamily name
+                            style = record.toUnicode()
+                            font_metadata.append(f"Style: {style}")
+                            break
+                            
+                    for record in font['name'].names:
+                        if record.nameID == 5 and record.isUnicode():  # Version
+                            version = record.toUnicode()
+                            font_metadata.append(f"Version: {version}")
+                            break
+            except Exception as e:
+                logging.error(f"Could not read font metadata: {e}")
+        
+        if not font_metadata:
+            font_metadata = ["Font: " + os.path.basename(font_path)]
+        
+        # Draw font metadata
+        # Use a much larger font for metadata
+        big_metadata_font_size = max(24, int(box_h * 0.02))
+        try:
+            metadata_font = get_font(big_metadata_font_size, font_path)
+        except Exception:
+            metadata_font = ImageFont.load_default()
+        y_pos = 10
+        for line in font_metadata:
+            draw.text((10, y_pos), line, fill=(0, 0, 0), font=metadata_font)
+            # Increase spacing for big font
+            y_pos += big_metadata_font_size + 10
+        
+        y_pos += 20  # Extra space after metadata
+        
+        # Draw sample text in different sizes
+        for size in sizes:
+            try:
+                font = get_font(size, font_path)
+                text = f"{size}pt: {sample_text}"
+                draw.text((10, y_pos), text, fill=(0, 0, 0), font=font)
+                y_pos += size + 60
+            except Exception as e:
+                logging.warning(f"Error loading font at size {size}: {e}")
+                # Use default font as fallback
+                fallback_font = ImageFont.load_default()
+                draw.text((10, y_pos), f"Size {size}pt not available", fill=(255, 0, 0), font=fallback_font)
+                y_pos += 80
+        
+        # Draw numbers and special characters
+        try:
+            size = 124
+            font = get_font(size, font_path)
+            draw.text((10, y_pos), numbers, fill=(0, 0, 0), font=font)
+            y_pos += size + 60
+            
+            size=72
+            font = get_font(size, font_path)
+            draw.text((10, y_pos), special_chars, fill=(0, 0, 0), font=font)
+            y_pos += size + 60
+        except Exception as e:
+            logging.warning(f"Error drawing numbers/special chars: {e}")
+        
+        # Draw pangram
+        try:
+            pangram_size = 42
+            font = get_font(pangram_size, font_path)
+            
+            # Wrap text to fit width
+            wrapped_text = textwrap.fill(pangram, width=int(box_w / (pangram_size * 0.6)))
+            draw.text((10, y_pos), wrapped_text, fill=(0, 0, 0), font=font)
+            
+            # Move position down based on number of lines
+            lines = wrapped_text.count('\n') + 1
+            y_pos += (pangram_size + 20) * lines
+        except Exception as e:
+            logging.warning(f"Error drawing pangram: {e}")
+
+
+        return preview
+    except Exception as e:
+        logging.error(f"Error creating font preview: {e}")
+        logging.error(traceback.format_exc())
+        # Create a fallback image
+        fallback = Image.new('RGB', (box_w, box_h), (240, 240, 240))
+        draw = ImageDraw.Draw(fallback)
+        fallback_font = ImageFont.load_default()
+        draw.text((10, 10), f"Font preview not available", fill=(255, 0, 0), font=fallback_font)
+        draw.text((10, 30), f"Error: {str(e)}", fill=(255, 0, 0), font=fallback_font)
+        return fallback
+
+
+__all__ = ["FONTTOOLS_AVAILABLE", "get_font_preview"]
@@ -0,0 +1,322 @@
+"""
+GPX and FIT/TCX activity previews: route drawings, Mapbox static maps and
+FIT summaries.
+
+Imported on first use through preview_registry, so gpxpy, fitparse,
+requests, polyline and the .env file (MAPBOX_TOKEN) are only loaded when a
+run contains activity files.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import math
+import os
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw
+
+# Patch for Python 3.13 compatibility
+import collections
+if not hasattr(collections, 'MutableMapping'):
+    import collections.abc
+    collections.MutableMapping = collections.abc.MutableMapping
+
+import dotenv
+import gpxpy
+import polyline
+import requests
+
+try:
+    from fitparse import FitFile
+    FITPARSE_AVAILABLE = True
+except ImportError:
+    FITPARSE_AVAILABLE = False
+
+dotenv.load_dotenv()
+
+# FIT positions are stored in semicircles
+SEMICIRCLES_TO_DEGREES = 180.0 / 2**31
+
+
+def gpx_route_points(file_path) -> List[Tuple[float, float]]:
+    """(lon, lat) of every track point in a GPX file."""
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        gpx = gpxpy.parse(f)
+    points = []
+    for track in gpx.tracks:
+        for segment in track.segments:
+            for p in segment.points:
+                points.append((p.longitude, p.latitude))
+    return points
+
+
+def fit_route_points(file_path) -> List[Tuple[float, float]]:
+    """(lon, lat) of every positioned record in a FIT file."""
+    fitfile = FitFile(str(file_path))
+    points = []
+    for record in fitfile.get_messages('record'):
+        lat = None
+        lon = None
+        for d in record:
+            if d.name == 'position_lat':
+                lat = d.value * SEMICIRCLES_TO_DEGREES
+            elif d.name == 'position_long':
+                lon = d.value * SEMICIRCLES_TO_DEGREES
+        if lat is not None and lon is not None:
+            points.append((lon, lat))
+    return points
+
+def get_fit_preview(file_path, max_records=40):
+    if not FITPARSE_AVAILABLE:
+        return ["fitparse not installed"]
+    try:
+        fitfile = FitFile(str(file_path))
+        lines = []
+        for i, record in enumerate(fitfile.get_messages()):
+            if i >= max_records:
+                break
+            lines.append(f"{record.get('name', 'Record')}: {record}")
+        if not lines:
+            lines = ["No records found"]
+        return lines
+    except Exception as e:
+        return [f"FIT error: {e}"]
+
+def get_fit_summary_preview(file_path):
+    if not FITPARSE_AVAILABLE:
+        return ["fitparse not installed"], {}
+    try:
+        fitfile = FitFile(str(file_path))
+        summary = []
+        meta = {}
+        # Try to extract session/activity summary
+        for msg in fitfile.get_messages('session'):
+            fields = {d.name: d.value for d in msg}
+            summary.append(f"Session: {fields.get('sport', 'N/A')} {fields.get('sub_sport', '')}")
+            if 'start_time' in fields:
+                summary.append(f"Start: {fields['start_time']}")
+                meta['start_time'] = fields['start_time']
+            if 'total_timer_time' in fields:
+                summary.append(f"Duration: {fields['total_timer_time']:.1f} sec")
+            if 'total_distance' in fields:
+                summary.append(f"Distance: {fields['total_distance']/1000:.2f} km")
+            if 'total_ascent' in fields:
+                summary.append(f"Ascent: {fields['total_ascent']} m")
+            if 'avg_speed' in fields:
+                summary.append(f"Avg Speed: {fields['avg_speed']*3.6:.2f} km/h")
+            if 'max_speed' in fields:
+                summary.append(f"Max Speed: {fields['max_speed']*3.6:.2f} km/h")
+            if 'total_calories' in fields:
+                summary.append(f"Calories: {fields['total_calories']}")
+            summary.append("")
+        # If no session, try activity
+        if not summary:
+            for msg in fitfile.get_messages('activity'):
+                fields = {d.name: d.value for d in msg}
+                summary.append(f"Activity: {fields.get('type', 'N/A')}")
+                if 'timestamp' in fields:
+                    summary.append(f"Timestamp: {fields['timestamp']}")
+                    meta['timestamp'] = fields['timestamp']
+                summary.append("")
+        # GPS points summary
+        gps_points = []
+        for record in fitfile.get_messages('record'):
+            lat = None
+            lon = None
+            for d in record:
+                if d.name == 'position_lat':
+                    lat = d.value
+                elif d.name == 'position_long':
+                    lon = d.value
+            if lat is not None and lon is not None:
+                lat = lat * (180.0 / 2**31)
+                lon = lon * (180.0 / 2**31)
+                gps_points.append((lat, lon))
+        if gps_points:
+            summary.append(f"GPS Points: {len(gps_points)}")
+            summary.append(f"Start: ({gps_points[0][0]:.5f}, {gps_points[0][1]:.5f})")
+            summary.append(f"End:   ({gps_points[-1][0]:.5f}, {gps_points[-1][1]:.5f})")
+            # Optionally show a few sample points
+            if len(gps_points) > 2:
+                summary.append(f"Sample: ({gps_points[len(gps_points)//2][0]:.5f}, {gps_points[len(gps_points)//2][1]:.5f})")
+        # Fallback: show number of records
+        n_records = sum(1 for _ in fitfile.get_messages('record'))
+        summary.append(f"Records: {n_records}")
+        meta['records'] = n_records
+        # Add all metadata fields from file header
+        if hasattr(fitfile, 'file_id'):
+            for k, v in fitfile.file_id.items():
+                summary.append(f"{k}: {v}")
+                meta[k] = v
+        return summary[:40], meta
+    except Exception as e:
+        return [f"FIT error: {e}"], {}
+
+def get_gpx_preview(file_path, box_w, box_h):
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            gpx = gpxpy.parse(f)
+        points = []
+        for track in gpx.tracks:
+            for segment in track.segments:
+                for p in segment.points:
+                    points.append((p.longitude, p.latitude))
+        if not points:
+            return None
+        lons, lats = zip(*points)
+        min_lon, max_lon = min(lons), max(lons)
+        min_lat, max_lat = min(lats), max(lats)
+        # Normalize and scale
+        def scale(val, minv, maxv, size):
+            if maxv == minv:
+                return size // 2
+            return int((val - minv) / (maxv - minv) * (size - 20) + 10)
+        img = Image.new('RGB', (box_w, box_h), (245, 245, 245))
+        draw = ImageDraw.Draw(img)
+        prev = None
+        for lon, lat in points:
+            x = scale(lon, min_lon, max_lon, box_w)
+            y = box_h - scale(lat, min_lat, max_lat, box_h)
+            if prev:
+                draw.line([prev, (x, y)], fill=(0, 120, 160), width=3)
+            prev = (x, y)
+        return img
+    except Exception:
+        return None
+
+def get_fit_gps_preview(file_path, box_w, box_h):
+    if not FITPARSE_AVAILABLE:
+        return None
+    try:
+        fitfile = FitFile(str(file_path))
+        points = []
+        for record in fitfile.get_messages('record'):
+            lat = None
+            lon = None
+            for d in record:
+                if d.name == 'position_lat':
+                    lat = d.value
+                elif d.name == 'position_long':
+                    lon = d.value
+            if lat is not None and lon is not None:
+                # Convert semicircles to degrees
+                lat = lat * (180.0 / 2**31)
+                lon = lon * (180.0 / 2**31)
+                points.append((lon, lat))
+        if not points:
+            return None
+        lons, lats = zip(*points)
+        min_lon, max_lon = min(lons), max(lons)
+        min_lat, max_lat = min(lats), max(lats)
+        def scale(val, minv, maxv, size):
+            if maxv == minv:
+                return size // 2
+            return int((val - minv) / (maxv - minv) * (size - 20) + 10)
+        img = Image.new('RGB', (box_w, box_h), (245, 245, 245))
+        draw = ImageDraw.Draw(img)
+        prev = None
+        for lon, lat in points:
+            x = scale(lon, min_lon, max_lon, box_w)
+            y = box_h - scale(lat, min_lat, max_lat, box_h)
+            if prev:
+                draw.line([prev, (x, y)], fill=(0, 120, 160), width=3)
+            prev = (x, y)
+        return img
+    except Exception:
+        return None
+
+MAPBOX_TOKEN = os.getenv('MAPBOX_TOKEN', '').strip()
+logging.info("Using Mapbox token: %s", MAPBOX_TOKEN if MAPBOX_TOKEN else "Not set")
+def downsample_points(points, max_points=100):
+    if len(points) <= max_points:
+        return points
+    step = max(1, len(points) // max_points)
+    return points[::step]
+
+def get_mapbox_tile_for_bounds(min_lat, max_lat, min_lon, max_lon, width, height, api_key=None, path_points=None):
+    # Ensure the API key is resolved at runtime (avoid referencing MAPBOX_TOKEN at function-definition time)
+    if api_key is None:
+        api_key = os.getenv('MAPBOX_TOKEN', '').strip()
+
+    center_lat = (min_lat + max_lat) / 2
+    center_lon = (min_lon + max_lon) / 2
+    # Calculate zoom level based on bounding box and image size
+    # Reference: https://docs.mapbox.com/help/glossary/zoom-level/
+    def lat_rad(lat):
+        from math import radians, log, tan, pi
+        sin = math.sin(radians(lat))
+        return log((1 + sin) / (1 - sin)) / 2
+    WORLD_DIM = 256  # Mapbox tile size in pixels
+    def zoom_for_bounds(min_lat, max_lat, min_lon, max_lon, width, height):
+        # Clamp latitude to avoid math domain errors
+        min_lat = max(min_lat, -85.05112878)
+        max_lat = min(max_lat, 85.05112878)
+        lat_fraction = (lat_rad(max_lat) - lat_rad(min_lat)) / math.pi
+        lon_fraction = (max_lon - min_lon) / 360.0
+        lat_zoom = math.log2(height / WORLD_DIM / lat_fraction) if lat_fraction > 0 else 20
+        lon_zoom = math.log2(width / WORLD_DIM / lon_fraction) if lon_fraction > 0 else 20
+        zoom = min(lat_zoom, lon_zoom, 22)
+        zoom = max(0, zoom)
+        calculated_zoom = float(zoom)
+        adjusted_zoom = max(0.0, calculated_zoom - 0.3)  # Adjust zoom to avoid too high resolution
+        return adjusted_zoom
+    zoom = zoom_for_bounds(min_lat, max_lat, min_lon, max_lon, min(width, 1280), min(height, 1280))
+
+    import urllib.parse
+    path_str = ""
+    if path_points and len(path_points) > 1:
+        path_points = downsample_points(path_points, max_points=100)
+        # Mapbox expects [lon,lat] pairs for polyline encoding
+        poly_points = [(lat, lon) for lon, lat in path_points]
+        encoded = polyline.encode(poly_points)
+        encoded_url = urllib.parse.quote(encoded, safe='')
+        path_str = f"/path-5+f44-0.7({encoded_url})"
+    # Log style info from Mapbox Styles API
+    style_username = "darthjulian"
+    style_id = "ciwqpkc0s00882qnxuuscegmn"
+    style_api_url = f"https://api.mapbox.com/styles/v1/{style_username}/{style_id}?access_token={api_key}"
+    try:
+        style_resp = requests.get(style_api_url)
+        if style_resp.status_code == 200:
+            style_json = style_resp.json()
+            logging.info(f"Mapbox style name: {style_json.get('name')}")
+            logging.info(f"Mapbox style owner: {style_json.get('owner')}")
+            logging.info(f"Mapbox style visibility: {style_json.get('visibility')}")
+        else:
+            logging.warning(f"Could not fetch Mapbox style info: {style_resp.status_code} {style_resp.text}")
+    except Exception as e:
+        logging.warning(f"Exception fetching Mapbox style info: {e}")
+    url = (
+       # f"https://api.mapbox.com/styles/v1/mapbox/outdoors-v12/static"
+        f"https://api.mapbox.com/styles/v1/darthjulian/ciwqpkc0s00882qnxuuscegmn/static"
+        f"{path_str}/{center_lon},{center_lat},{zoom},0,50/{width}x{height}"
+        f"?access_token={api_key}"
+    )
+    resp = requests.get(url)
+    logging.info("Mapbox URL: %s", url)
+    logging.info("Mapbox zoom: %s", zoom)
+    logging.info("Mapbox status: %s", resp.status_code)
+    if resp.status_code == 200:
+        return Image.open(io.BytesIO(resp.content))
+    else:
+        logging.error("Mapbox error: %s %s", resp.status_code, resp.text)
+        logging.error("Bounds are (%f, %f, %f, %f)", min_lat, max_lat, min_lon, max_lon)
+        logging.error("Width: %d, Height: %d", width, height)
+        logging.error("Zoom level: %f", zoom)
+        exit(-1)  # Exit with error code if Mapbox request fails
+    return None
+
+
+__all__ = [
+    "FITPARSE_AVAILABLE",
+    "gpx_route_points",
+    "fit_route_points",
+    "get_fit_preview",
+    "get_fit_summary_preview",
+    "get_gpx_preview",
+    "get_fit_gps_preview",
+    "downsample_points",
+    "get_mapbox_tile_for_bounds",
+]
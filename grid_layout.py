@@ -0,0 +1,180 @@
+"""
+Shared "rows x cols" packing for multi-image previews.
+
+GIF, video, PDF overview and PPTX/Keynote previews all tile several images
+into the preview box and want the grid that leaves the least empty space.
+``solve_grid`` scores every row count at once with numpy and returns a
+``GridSolution`` (cell size, which item goes in which cell, and whether it is
+rotated). A fitted image's area depends only on its aspect ratio and the cell
+size, so solutions are memoized by (aspect-ratio signature, box size,
+options) and repeated cards of the same shape are solved once per process.
+``compose_grid`` pastes images according to a solution.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+
+Size = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class GridSolution:
+    rows: int
+    cols: int
+    cell_w: int
+    cell_h: int
+    # Item index shown in each cell, in row-major order
+    indices: Tuple[int, ...]
+    # Whether the item in each cell is rotated 90 degrees
+    rotations: Tuple[bool, ...]
+
+    def cell_origin(self, slot: int, thumb_size: Size) -> Tuple[int, int]:
+        """Top-left paste position that centres a thumb of thumb_size in cell slot."""
+        x = (slot % self.cols) * self.cell_w + (self.cell_w - thumb_size[0]) // 2
+        y = (slot // self.cols) * self.cell_h + (self.cell_h - thumb_size[1]) // 2
+        return x, y
+
+
+def _aspect(size: Size) -> float:
+    w, h = size
+    return round(w / h, 4) if w > 0 and h > 0 else 1.0
+
+
+def _fitted_area(cell_w: np.ndarray, cell_h: np.ndarray, aspect: np.ndarray) -> np.ndarray:
+    """Pixel area of an image with the given aspect ratio scaled to fit each cell."""
+    used_w = np.floor(np.minimum(cell_w, cell_h * aspect))
+    used_h = np.floor(np.minimum(cell_h, cell_w / aspect))
+    return used_w * used_h
+
+
+def _fill_indices(n_items: int, n_cells: int) -> np.ndarray:
+    # Evenly spaced items, repeating some when there are more cells than items
+    return np.linspace(0, n_items - 1, n_cells).astype(int)
+
+
+@lru_cache(maxsize=512)
+def _solve(
+    aspects: Tuple[float, ...],
+    box_w: int,
+    box_h: int,
+    allow_rotation: bool,
+    fill_cells: bool,
+) -> Optional[GridSolution]:
+    n = len(aspects)
+    unique_aspects, item_group = np.unique(np.asarray(aspects, dtype=float), return_inverse=True)
+
+    rows = np.arange(1, n + 1)
+    cols = np.ceil(n / rows).astype(int)
+    cell_w = box_w // cols
+    cell_h = box_h // rows
+    valid = (cell_w > 0) & (cell_h > 0)
+
+    # area[r, g]: fitted area of an aspect-group-g item in the cells of row count r
+    cw = cell_w[:, None].astype(float)
+    ch = cell_h[:, None].astype(float)
+    area = _fitted_area(cw, ch, unique_aspects[None, :])
+    rotated = None
+    if allow_rotation:
+        area_rot = _fitted_area(cw, ch, 1.0 / unique_aspects[None, :])
+        rotated = area_rot > area
+        area = np.where(rotated, area_rot, area)
+
+    # counts[r, g]: how many cells hold an aspect-group-g item for row count r
+    n_groups = len(unique_aspects)
+    if not fill_cells:
+        counts = np.bincount(item_group, minlength=n_groups)[None, :]
+    elif n_groups == 1:
+        counts = (rows * cols)[:, None]
+    else:
+        counts = np.zeros((n, n_groups))
+        for r in range(n):
+            cells = _fill_indices(n, int(rows[r] * cols[r]))
+            counts[r] = np.bincount(item_group[cells], minlength=n_groups)
+
+    scores = (area * counts).sum(axis=1)
+    scores[~valid] = -1
+    best = int(np.argmax(scores))
+    if scores[best] < 0:
+        return None
+
+    if fill_cells:
+        indices = tuple(int(i) for i in _fill_indices(n, int(rows[best] * cols[best])))
+    else:
+        indices = tuple(range(n))
+    if rotated is not None:
+        rotations = tuple(bool(rotated[best, item_group[i]]) for i in indices)
+    else:
+        rotations = (False,) * len(indices)
+    return GridSolution(
+        rows=int(rows[best]),
+        cols=int(cols[best]),
+        cell_w=int(cell_w[best]),
+        cell_h=int(cell_h[best]),
+        indices=indices,
+        rotations=rotations,
+    )
+
+
+def solve_grid(
+    item_sizes: Sequence[Size],
+    box_size: Size,
+    allow_rotation: bool = False,
+    fill_cells: bool = False,
+) -> Optional[GridSolution]:
+    """
+    Choose rows x cols for item_sizes in box_size, maximising the image area shown.
+
+    Args:
+        item_sizes: (width, height) of each item, in order.
+        box_size: (width, height) of the preview box.
+        allow_rotation: Let each item be rotated 90 degrees when that fits its cell better.
+        fill_cells: Fill every cell of the grid with evenly spaced items (repeating
+            some), as the GIF and video previews do, instead of one cell per item.
+
+    Returns:
+        The best GridSolution, or None for no items or a box too small for any grid.
+    """
+    if not item_sizes:
+        return None
+    aspects = tuple(_aspect(size) for size in item_sizes)
+    return _solve(aspects, int(box_size[0]), int(box_size[1]), bool(allow_rotation), bool(fill_cells))
+
+
+def compose_grid(
+    images: Union[Sequence[Image.Image], Mapping[int, Image.Image]],
+    solution: GridSolution,
+    box_size: Size,
+    mode: str = "RGB",
+    background=(255, 255, 255),
+    upscale: bool = True,
+) -> Image.Image:
+    """
+    Paste images[solution.indices[slot]] into each cell of a new box_size canvas.
+
+    Thumbs are centred in their cells and pasted through their alpha channel
+    when they have one. With upscale=False images smaller than a cell keep
+    their size.
+    """
+    canvas = Image.new(mode, box_size, background)
+    cell = (solution.cell_w, solution.cell_h)
+    for slot, idx in enumerate(solution.indices):
+        img = images[idx]
+        if solution.rotations[slot]:
+            img = img.rotate(90, expand=True)
+        if upscale:
+            thumb = ImageOps.contain(img, cell, Image.LANCZOS)
+        else:
+            thumb = img.copy()
+            thumb.thumbnail(cell)
+        mask = thumb.getchannel("A") if thumb.mode in ("RGBA", "LA") else None
+        canvas.paste(thumb, solution.cell_origin(slot, thumb.size), mask)
+    return canvas
+
+
+__all__ = ["GridSolution", "solve_grid", "compose_grid"]
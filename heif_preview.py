@@ -0,0 +1,80 @@
+"""
+Preview-sized decoding for HEIC/HEIF images.
+
+iPhone HEICs usually carry an embedded thumbnail, and decoding the full
+12-48 MP primary image only to shrink it for a card or a grid cell is where
+HEIC-heavy folders spend most of their time. ``open_heif_preview`` returns
+the smallest embedded thumbnail that covers the requested long edge, and
+otherwise decodes the primary image once and downsizes it straight away so
+no full-size copy outlives the call. Both file_card_generator and the
+directory_to_* tools use it.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from PIL import Image
+
+import render_metrics
+
+try:
+    import pillow_heif
+
+    pillow_heif.register_heif_opener()
+    PILLOW_HEIF_AVAILABLE = True
+except ImportError:
+    pillow_heif = None
+    PILLOW_HEIF_AVAILABLE = False
+
+
+def _embedded_thumbnail(img: Image.Image, long_edge: int) -> Optional[Image.Image]:
+    """Smallest embedded thumbnail whose long edge is >= long_edge, else None."""
+    find_thumbnail = getattr(pillow_heif, "thumbnail", None)
+    if find_thumbnail is None:
+        return None
+    thumb = find_thumbnail(img, min_box=long_edge)
+    if thumb is None or thumb is img or max(thumb.size) < long_edge:
+        return None
+    return thumb
+
+
+def open_heif_preview(file_path, long_edge: Optional[int] = None) -> Optional[Image.Image]:
+    """
+    Return an RGB(A) image of a HEIC/HEIF file whose long edge is at most
+    long_edge (and at least long_edge when the source is that large).
+
+    With long_edge=None the full-resolution primary image is returned.
+    Returns None when pillow-heif is missing or the file cannot be decoded.
+    """
+    if not PILLOW_HEIF_AVAILABLE:
+        logging.warning("pillow-heif library is not available. Cannot process HEIC files.")
+        return None
+    try:
+        with render_metrics.timed("heif_preview.decode"):
+            img = Image.open(file_path)
+            if long_edge:
+                thumb = _embedded_thumbnail(img, long_edge)
+                if thumb is not None:
+                    img = thumb
+                    render_metrics.increment("heif_preview.embedded_thumbnail")
+                else:
+                    render_metrics.increment("heif_preview.primary")
+                if max(img.size) > long_edge:
+                    scale = long_edge / max(img.size)
+                    target = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+                    img = img.resize(target, Image.LANCZOS, reducing_gap=3.0)
+            else:
+                img.load()
+                render_metrics.increment("heif_preview.primary")
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+        logging.debug(f"Loaded HEIC preview {img.size} for {file_path}")
+        return img
+    except Exception as e:
+        logging.error(f"Error processing HEIC file {file_path}: {e}")
+        return None
+
+
+__all__ = ["PILLOW_HEIF_AVAILABLE", "open_heif_preview"]
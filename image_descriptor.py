@@ -0,0 +1,161 @@
+"""
+One-open image metadata: EXIF, dimensions, mode and orientation.
+
+Ordering a run by capture date, printing ``DateTimeOriginal`` on the card and
+choosing a thumbnail decode size all need the same header information. Each
+used to open the file separately, which on network storage is a round trip
+per open. ``get_image_descriptor`` reads everything from a single
+``Image.open`` (header only, no pixel decode) and stores the result in the
+file catalog, so later stages reuse it. Callers that already hold an open
+image can pass it in to build the descriptor without opening the file again.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+import file_catalog
+import preview_registry
+
+EXIF_ORIENTATION = 0x0112
+EXIF_DATETIME = 0x0132
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_DATETIME_DIGITIZED = 0x9004
+EXIF_IFD_POINTER = 0x8769
+
+# Orientations 5-8 store the image rotated by 90 degrees
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+# EXIF orientation -> transpose that shows the image upright (as ImageOps.exif_transpose)
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+@dataclass(frozen=True)
+class ImageDescriptor:
+    """Header-level facts about an image file, gathered from one open."""
+
+    format: Optional[str]
+    mode: str
+    width: int
+    height: int
+    orientation: int = 1
+    exif: Dict[int, Any] = field(default_factory=dict)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        """Size after applying the EXIF orientation."""
+        if self.orientation in _TRANSPOSED_ORIENTATIONS:
+            return self.height, self.width
+        return self.width, self.height
+
+    @property
+    def date_time_original(self) -> Optional[str]:
+        return self.exif.get(EXIF_DATETIME_ORIGINAL)
+
+    def capture_timestamp(self) -> Optional[float]:
+        """POSIX timestamp of DateTimeOriginal, DateTimeDigitized or DateTime (first that parses)."""
+        for tag in (EXIF_DATETIME_ORIGINAL, EXIF_DATETIME_DIGITIZED, EXIF_DATETIME):
+            value = self.exif.get(tag)
+            if not isinstance(value, str):
+                continue
+            try:
+                # Format: "YYYY:MM:DD HH:MM:SS"
+                return datetime.strptime(value.strip("\x00 "), "%Y:%m:%d %H:%M:%S").timestamp()
+            except ValueError:
+                continue
+        return None
+
+
+def apply_orientation(img: Image.Image, orientation: int) -> Image.Image:
+    """
+    Transpose img upright for the given EXIF orientation. Unlike
+    ImageOps.exif_transpose this works on resized copies that no longer
+    carry the EXIF block.
+    """
+    method = _ORIENTATION_TRANSPOSE.get(orientation)
+    return img.transpose(method) if method is not None else img
+
+
+def _read_exif(img: Image.Image) -> Dict[int, Any]:
+    if img.format == "PNG" and "exif" not in img.info:
+        # Pillow decodes every pixel looking for an eXIf chunk after the image data
+        return {}
+    try:
+        exif = img.getexif()
+    except Exception as exc:
+        logging.debug("Could not read EXIF: %s", exc)
+        return {}
+    tags: Dict[int, Any] = dict(exif)
+    try:
+        # DateTimeOriginal and friends live in the Exif sub-IFD
+        tags.update(exif.get_ifd(EXIF_IFD_POINTER))
+    except Exception:
+        pass
+    tags.pop(EXIF_IFD_POINTER, None)
+    # Drop binary blobs (MakerNote, embedded previews) so cached entries stay small
+    return {tag: value for tag, value in tags.items() if not isinstance(value, bytes)}
+
+
+def describe_image(img: Image.Image) -> ImageDescriptor:
+    """Build a descriptor from an already opened image without decoding pixels."""
+    exif = _read_exif(img)
+    orientation = exif.get(EXIF_ORIENTATION, 1)
+    return ImageDescriptor(
+        format=img.format,
+        mode=img.mode,
+        width=img.width,
+        height=img.height,
+        orientation=orientation if isinstance(orientation, int) else 1,
+        exif=exif,
+    )
+
+
+def _describe_path(file_path) -> Optional[ImageDescriptor]:
+    # HEIC/HEIF support is a Pillow plugin registered when its renderer is imported
+    preview_registry.ensure_decoder(Path(file_path).suffix)
+    try:
+        with Image.open(file_path) as img:
+            return describe_image(img)
+    except UnidentifiedImageError:
+        # Not an image: cache the negative answer quietly
+        return None
+
+
+def get_image_descriptor(file_path, img: Optional[Image.Image] = None) -> Optional[ImageDescriptor]:
+    """
+    Return the cached descriptor for file_path, or None if Pillow cannot open it.
+
+    If img is given (an image already opened from file_path) and nothing is
+    cached yet, the descriptor is built from it instead of reopening the file.
+    """
+    if img is not None:
+        return file_catalog.cached(file_path, "image_descriptor", lambda _path: describe_image(img))
+    return file_catalog.cached(file_path, "image_descriptor", _describe_path)
+
+
+__all__ = [
+    "ImageDescriptor",
+    "describe_image",
+    "get_image_descriptor",
+    "apply_orientation",
+    "EXIF_ORIENTATION",
+    "EXIF_DATETIME_ORIGINAL",
+]
@@ -0,0 +1,380 @@
+"""
+Memory-bounded decoding for gigantic rasters.
+
+``Image.MAX_IMAGE_PIXELS`` is raised far above Pillow's default so scans and
+panoramas open at all, but a plain ``load()`` of a 20,000 x 20,000 TIFF needs
+over a gigabyte before any resizing happens. ``decode_to_size`` checks the
+decoded size from the header and, when it is above the per-worker ceiling,
+decodes with a strategy whose peak memory stays under it:
+
+* JPEG: DCT-domain downscale via ``draft()``.
+* JPEG 2000: decode a lower resolution level via ``reduce``.
+* Uncompressed rasters (TIFF, BMP, ...): decode a band of rows at a time and
+  shrink each band into the output. Multi-strip files are banded by strip; a
+  single uncompressed strip is split into row bands by offset and stride.
+* Compressed striped or tiled TIFFs (LZW, deflate, ... decoded by libtiff):
+  copy a band of strips, or of whole rows of tiles, at a time into a small
+  in-memory TIFF and let libtiff decode just that band.
+
+Anything else that would exceed the ceiling (PNG, single-strip compressed
+TIFFs, ...) raises ``LargeImageError`` instead of taking the run down with it;
+the card is then written without a preview.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import math
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+import render_metrics
+from config_loader import get_max_decode_mb
+
+Size = Tuple[int, int]
+
+# Explicit per-worker override (set_max_decode_mb); None means use config
+_max_decode_mb: Optional[int] = None
+
+# SHORT tags copied from a TIFF into the in-memory TIFF holding one band of its strips:
+# bits per sample, compression, photometric, fill order, samples per pixel,
+# planar configuration, predictor, color map, extra samples, sample format, YCbCr subsampling
+_BAND_TIFF_TAGS = (258, 259, 262, 266, 277, 284, 317, 320, 338, 339, 530)
+_IMAGE_WIDTH, _IMAGE_LENGTH, _STRIP_OFFSETS, _ROWS_PER_STRIP, _STRIP_BYTE_COUNTS = 256, 257, 273, 278, 279
+_PLANAR_CONFIGURATION, _JPEG_TABLES = 284, 347
+_TILE_WIDTH, _TILE_LENGTH, _TILE_OFFSETS, _TILE_BYTE_COUNTS = 322, 323, 324, 325
+_SHORT, _LONG, _UNDEFINED = 3, 4, 7
+
+
+class LargeImageError(RuntimeError):
+    """Raised when an image cannot be decoded within the memory ceiling."""
+
+
+def set_max_decode_mb(megabytes: Optional[int]) -> None:
+    """Override the decode ceiling for this process (None restores the configured value)."""
+    global _max_decode_mb
+    _max_decode_mb = int(megabytes) if megabytes else None
+
+
+def max_decode_bytes() -> int:
+    return (_max_decode_mb or get_max_decode_mb()) * 1024 * 1024
+
+
+def decoded_bytes(size: Size, mode: str) -> int:
+    """Bytes Pillow needs to hold an image of size and mode in memory."""
+    bands = Image.getmodebands(mode)
+    # Pillow stores 3-band modes in 4 bytes per pixel
+    return size[0] * size[1] * (4 if bands == 3 else bands)
+
+
+def is_oversize(img: Image.Image, ceiling: Optional[int] = None) -> bool:
+    """True if fully decoding img (an unloaded image) would exceed the ceiling."""
+    return decoded_bytes(img.size, img.mode) > (ceiling or max_decode_bytes())
+
+
+def _raw_row_tiles(img: Image.Image, ceiling: int) -> Optional[List]:
+    """Split img's single uncompressed tile into tiles of whole rows, or None if it has none."""
+    if len(img.tile) != 1:
+        return None
+    name, box, offset, args = tuple(img.tile[0])[:4]
+    width, height = img.size
+    if name != "raw" or tuple(box) != (0, 0, width, height):
+        return None
+    if isinstance(args, str):
+        args = (args,)
+    rawmode = args[0]
+    stride = args[1] if len(args) > 1 else 0
+    ystep = args[2] if len(args) > 2 else 1
+    if not stride:
+        try:
+            stride = len(Image.new(img.mode, (width, 1)).tobytes("raw", rawmode))
+        except Exception:
+            return None
+    # Bands are grouped from these tiles, so keep each well under the ceiling
+    rows = max(1, min(height, ceiling // 8 // max(1, decoded_bytes((width, 1), img.mode))))
+    tiles = []
+    for y0 in range(0, height, rows):
+        y1 = min(height, y0 + rows)
+        # Bottom-up rasters (BMP) store the last row first
+        first_stored_row = y0 if ystep > 0 else height - y1
+        tiles.append(("raw", (0, y0, width, y1), offset + first_stored_row * stride, (rawmode, stride, ystep)))
+    return tiles
+
+
+def _band_tiles(img: Image.Image, ceiling: int) -> Optional[List]:
+    """Tiles of img that can be decoded a band at a time, or None."""
+    if not getattr(img, "filename", None):
+        return None
+    # libtiff-compressed TIFFs decode as a single opaque tile
+    if getattr(img, "use_load_libtiff", False):
+        return None
+    if len(img.tile) >= 2:
+        return list(img.tile)
+    return _raw_row_tiles(img, ceiling)
+
+
+def _tile_bands(tiles: List, width: int, mode: str, ceiling: int) -> List[Tuple[int, int, List]]:
+    """Group tiles into horizontal bands (y0, y1, tiles) that each fit in the ceiling."""
+    rows: dict = {}
+    for tile in tiles:
+        x0, y0, x1, y1 = tile[1]
+        rows.setdefault((y0, y1), []).append(tile)
+    bands = []
+    band_y0, band_tiles = None, []
+    for (y0, y1), row_tiles in sorted(rows.items()):
+        if band_y0 is None:
+            band_y0 = y0
+        elif decoded_bytes((width, y1 - band_y0), mode) > ceiling and band_tiles:
+            bands.append((band_y0, y0, band_tiles))
+            band_y0, band_tiles = y0, []
+        band_tiles.extend(row_tiles)
+        band_y1 = y1
+    if band_tiles:
+        bands.append((band_y0, band_y1, band_tiles))
+    return bands
+
+
+class _BandResizer:
+    """
+    Shrink an image that arrives as consecutive bands of rows into ``out``.
+
+    An output row is resampled only once every source row under its filter
+    has arrived, and the last few source rows of each band are kept for the
+    next one, so band boundaries leave no seams and rounding never stretches
+    a band.
+    """
+
+    def __init__(self, mode: str, size: Size, target: Size, reducing_gap: float):
+        self.out = Image.new(mode, target)
+        self.height = size[1]
+        self.scale_y = target[1] / size[1]
+        self.reducing_gap = reducing_gap
+        # Source rows a LANCZOS output row reaches past its own (support: 3 output rows)
+        self.margin = math.ceil(3 / self.scale_y) + 1
+        self.next_row = 0
+        self.tail: Optional[Image.Image] = None
+        self.tail_y0 = 0
+
+    def add(self, band: Image.Image, band_y0: int) -> None:
+        """Resample the output rows that band (source rows from band_y0) completes."""
+        if self.tail is not None:
+            joined = Image.new(band.mode, (band.width, self.tail.height + band.height))
+            joined.paste(self.tail, (0, 0))
+            joined.paste(band, (0, self.tail.height))
+            band, band_y0 = joined, self.tail_y0
+        band_y1 = band_y0 + band.height
+        if band_y1 >= self.height:
+            end_row = self.out.height
+        else:
+            end_row = min(self.out.height, math.floor((band_y1 - self.margin) * self.scale_y))
+        if end_row > self.next_row:
+            top = self.next_row / self.scale_y - band_y0
+            bottom = min(float(band.height), end_row / self.scale_y - band_y0)
+            resized = band.resize(
+                (self.out.width, end_row - self.next_row), Image.LANCZOS,
+                box=(0, top, band.width, bottom), reducing_gap=self.reducing_gap,
+            )
+            self.out.paste(resized, (0, self.next_row))
+            self.next_row = end_row
+        keep_from = max(0, math.floor(self.next_row / self.scale_y) - self.margin - band_y0)
+        self.tail = band.crop((0, keep_from, band.width, band.height))
+        self.tail_y0 = band_y0 + keep_from
+
+
+def _decode_in_bands(img: Image.Image, tiles: List, target: Size, ceiling: int, reducing_gap: float) -> Image.Image:
+    width, height = img.size
+    resizer = _BandResizer(img.mode, img.size, target, reducing_gap)
+    # A band is copied once more when joined to the rows kept from the previous one
+    for band_y0, band_y1, band_tiles in _tile_bands(tiles, width, img.mode, ceiling // 2):
+        # A fresh open per band: Pillow decodes whatever tiles are listed into an
+        # image of the current size, so shift the band's tiles to y=0
+        with Image.open(img.filename) as band:
+            band.tile = [
+                (t[0], (t[1][0], t[1][1] - band_y0, t[1][2], t[1][3] - band_y0)) + tuple(t[2:])
+                for t in band_tiles
+            ]
+            band._size = (width, band_y1 - band_y0)
+            band.load()
+            resizer.add(band, band_y0)
+    return resizer.out
+
+
+def _band_tiff(
+    tags, width: int, rows: int, block: Size, byte_counts: Tuple[int, ...], data: bytes, tiled: bool = False
+) -> bytes:
+    """
+    A TIFF holding only the given compressed strips or tiles (rows tall),
+    described by tags. block is the (width, height) of a tile, or the full
+    width and rows per strip.
+    """
+    endian = "<" if tags.prefix == b"II" else ">"
+    # The strips follow the header; the IFD and its out-of-line values follow the strips
+    offsets, position = [], 8
+    for count in byte_counts:
+        offsets.append(position)
+        position += count
+    entries: Dict[int, Tuple[int, int, bytes]] = {}
+    for tag in _BAND_TIFF_TAGS:
+        if tag in tags:
+            values = tags[tag] if isinstance(tags[tag], tuple) else (tags[tag],)
+            entries[tag] = (_SHORT, len(values), struct.pack(f"{endian}{len(values)}H", *values))
+    if _JPEG_TABLES in tags:
+        entries[_JPEG_TABLES] = (_UNDEFINED, len(tags[_JPEG_TABLES]), bytes(tags[_JPEG_TABLES]))
+    if tiled:
+        layout = (
+            (_TILE_WIDTH, (block[0],)),
+            (_TILE_LENGTH, (block[1],)),
+            (_TILE_OFFSETS, tuple(offsets)),
+            (_TILE_BYTE_COUNTS, tuple(byte_counts)),
+        )
+    else:
+        layout = (
+            (_STRIP_OFFSETS, tuple(offsets)),
+            (_ROWS_PER_STRIP, (block[1],)),
+            (_STRIP_BYTE_COUNTS, tuple(byte_counts)),
+        )
+    for tag, values in ((_IMAGE_WIDTH, (width,)), (_IMAGE_LENGTH, (rows,))) + layout:
+        entries[tag] = (_LONG, len(values), struct.pack(f"{endian}{len(values)}L", *values))
+
+    ifd_offset = position + (position & 1)
+    aux_offset = ifd_offset + 2 + 12 * len(entries) + 4
+    ifd, aux = struct.pack(f"{endian}H", len(entries)), b""
+    for tag, (typ, count, payload) in sorted(entries.items()):
+        if len(payload) <= 4:
+            ifd += struct.pack(f"{endian}HHL", tag, typ, count) + payload.ljust(4, b"\0")
+        else:
+            ifd += struct.pack(f"{endian}HHLL", tag, typ, count, aux_offset + len(aux))
+            aux += payload + b"\0" * (len(payload) & 1)
+    ifd += b"\0\0\0\0"
+    header = tags.prefix + struct.pack(f"{endian}HL", 42, ifd_offset)
+    return header + data + b"\0" * (position & 1) + ifd + aux
+
+
+def _decode_tiff_bands(img: Image.Image, target: Size, ceiling: int, reducing_gap: float) -> Image.Image:
+    """
+    Decode a compressed striped or tiled TIFF a band of strips (or of whole
+    rows of tiles) at a time through libtiff. Raises LargeImageError when its
+    layout cannot be split.
+    """
+    tags = getattr(img, "tag_v2", None)
+    if tags is None or not getattr(img, "filename", None):
+        raise LargeImageError("not a TIFF file")
+    if tags.get(_PLANAR_CONFIGURATION, 1) != 1:
+        raise LargeImageError("planar TIFF")
+    width, height = img.size
+    tiled = _TILE_WIDTH in tags
+    if tiled:
+        block = (int(tags[_TILE_WIDTH]), int(tags.get(_TILE_LENGTH) or 0))
+        offsets = tuple(tags.get(_TILE_OFFSETS) or ())
+        byte_counts = tuple(tags.get(_TILE_BYTE_COUNTS) or ())
+        if not block[0] or not block[1]:
+            raise LargeImageError("tiled TIFF without a tile size")
+        # Tiles are stored a row of tiles at a time, left to right
+        per_row = math.ceil(width / block[0])
+        if len(offsets) != per_row * math.ceil(height / block[1]):
+            raise LargeImageError(f"{len(offsets)} tiles do not cover {width}x{height}")
+    else:
+        block = (width, min(height, int(tags.get(_ROWS_PER_STRIP, height))))
+        offsets = tuple(tags.get(_STRIP_OFFSETS) or ())
+        byte_counts = tuple(tags.get(_STRIP_BYTE_COUNTS) or ())
+        per_row = 1
+    if len(offsets) != len(byte_counts):
+        raise LargeImageError("offsets and byte counts disagree")
+    if len(offsets) < 2 * per_row:
+        raise LargeImageError("single-strip TIFF" if not tiled else "single row of tiles")
+    # The band's compressed blocks and its copy joined to the previous rows are held too
+    row_bytes = decoded_bytes((per_row * block[0], block[1]), img.mode)
+    rows_per_band = max(1, ceiling // 3 // max(1, row_bytes))
+    resizer = _BandResizer(img.mode, img.size, target, reducing_gap)
+    with open(img.filename, "rb") as fp:
+        for first_row in range(0, len(offsets) // per_row, rows_per_band):
+            first = first_row * per_row
+            band_slice = slice(first, first + rows_per_band * per_row)
+            band_counts = byte_counts[band_slice]
+            chunks = []
+            for offset, count in zip(offsets[band_slice], band_counts):
+                fp.seek(offset)
+                chunks.append(fp.read(count))
+            band_y0 = first_row * block[1]
+            band_y1 = min(height, band_y0 + len(band_counts) // per_row * block[1])
+            band_file = _band_tiff(tags, width, band_y1 - band_y0, block, band_counts, b"".join(chunks), tiled)
+            try:
+                with Image.open(io.BytesIO(band_file)) as band:
+                    band.load()
+                    if band.mode != img.mode or band.size != (width, band_y1 - band_y0):
+                        raise LargeImageError(f"band decoded as {band.size} {band.mode}")
+                    resizer.add(band, band_y0)
+            except OSError as exc:
+                raise LargeImageError(f"libtiff could not decode a band: {exc}") from exc
+    return resizer.out
+
+
+def decode_to_size(img: Image.Image, target: Size, reducing_gap: float = 3.0) -> Image.Image:
+    """
+    Decode an opened (unloaded) image and resize it to target, keeping peak
+    decode memory under the configured ceiling. Raises LargeImageError when
+    an oversize image has no bounded-memory decode.
+    """
+    ceiling = max_decode_bytes()
+    if not is_oversize(img, ceiling):
+        if img.format == "JPEG":
+            # draft() only ever picks a scale whose result is >= the requested size
+            img.draft(img.mode, target)
+        return img.resize(target, Image.LANCZOS, reducing_gap=reducing_gap)
+
+    logging.info(
+        "Large image %s (%dx%d %s) exceeds the %d MB decode ceiling; decoding with bounded memory",
+        getattr(img, "filename", "<image>"), img.width, img.height, img.mode, ceiling // (1024 * 1024),
+    )
+    if decoded_bytes(target, img.mode) > ceiling:
+        render_metrics.increment("large_image.refused")
+        raise LargeImageError(
+            f"{target[0]}x{target[1]} preview of {getattr(img, 'filename', '<image>')} is itself above the "
+            f"{ceiling // (1024 * 1024)} MB decode ceiling"
+        )
+    if img.format == "JPEG":
+        img.draft(img.mode, target)
+        if not is_oversize(img, ceiling):
+            render_metrics.increment("large_image.jpeg_draft")
+            return img.resize(target, Image.LANCZOS, reducing_gap=reducing_gap)
+    elif img.format == "JPEG2000":
+        reduce_level = 0
+        while img.width >> (reduce_level + 1) >= target[0] and img.height >> (reduce_level + 1) >= target[1]:
+            reduce_level += 1
+        img.reduce = reduce_level
+        if decoded_bytes((img.width >> reduce_level, img.height >> reduce_level), img.mode) <= ceiling:
+            img.load()
+            render_metrics.increment("large_image.jpeg2000_reduce")
+            return img.resize(target, Image.LANCZOS, reducing_gap=reducing_gap)
+    else:
+        tiles = _band_tiles(img, ceiling)
+        if tiles is not None:
+            render_metrics.increment("large_image.bands")
+            return _decode_in_bands(img, tiles, target, ceiling, reducing_gap)
+        if img.format == "TIFF":
+            try:
+                out = _decode_tiff_bands(img, target, ceiling, reducing_gap)
+            except LargeImageError as exc:
+                logging.debug("Cannot decode %s a band at a time: %s", getattr(img, "filename", "<image>"), exc)
+            else:
+                render_metrics.increment("large_image.tiff_bands")
+                return out
+
+    render_metrics.increment("large_image.refused")
+    raise LargeImageError(
+        f"{img.width}x{img.height} {img.format} image cannot be decoded within "
+        f"{ceiling // (1024 * 1024)} MB (raise large_image.max_decode_mb to allow it)"
+    )
+
+
+__all__ = [
+    "LargeImageError",
+    "set_max_decode_mb",
+    "max_decode_bytes",
+    "decoded_bytes",
+    "is_oversize",
+    "decode_to_size",
+]
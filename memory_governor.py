@@ -0,0 +1,196 @@
+"""
+Memory-aware admission for concurrent preview work.
+
+With video frames decoding in worker processes while the main process renders
+cards, a few 4K videos, all-pages PDFs or raw files at once can push the
+machine into swap. Every unit of work gets an estimated peak memory from its
+file type, size and dimensions (``estimate_peak_bytes``), and a process-wide
+``MemoryGovernor`` only admits it when the estimate fits in the remaining
+budget. Heavy items (more than a quarter of the budget) run one at a time;
+light items (text, hex, fonts, small images) flow around them. An item larger
+than the whole budget still runs, alone.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from image_descriptor import get_image_descriptor
+from large_image import decoded_bytes, max_decode_bytes
+from pdf_probe import probe_pdf
+from video_probe import probe_video
+
+MB = 1024 * 1024
+# Fixed overhead for a card: canvas, measurement scratch images, fonts
+BASE_CARD_BYTES = 64 * MB
+# pdf2image's default rasterization resolution
+PDF_RASTER_DPI = 200
+# Frames FFmpeg keeps buffered per decoder (reference frames, threads)
+VIDEO_DECODER_FRAMES = 16
+DEFAULT_BUDGET_FRACTION = 0.7
+
+
+def _card_bytes(card_size: Optional[Tuple[int, int]]) -> int:
+    if not card_size:
+        return BASE_CARD_BYTES
+    # Card canvas plus the full-size scratch images used while laying it out
+    return BASE_CARD_BYTES + card_size[0] * card_size[1] * 4 * 4
+
+
+def estimate_peak_bytes(
+    file_path,
+    file_type: str,
+    card_size: Optional[Tuple[int, int]] = None,
+    video_frames: int = 9,
+    frames_full_size: bool = True,
+) -> int:
+    """
+    Rough peak memory needed to render file_path's card(s).
+
+    Args:
+        file_type: The determine_file_type() group of the file.
+        card_size: Card (width, height) in pixels.
+        video_frames: Frames sampled for a movie grid.
+        frames_full_size: Whether sampled video frames are held at source
+            resolution (serial path) or thumbnailed on decode (prefetch workers).
+    """
+    path = Path(file_path)
+    estimate = _card_bytes(card_size)
+    try:
+        file_size = path.stat().st_size
+    except OSError:
+        return estimate
+
+    try:
+        if file_type in ("image", "animated"):
+            if path.suffix.lower() == ".dng":
+                # Raw buffer plus a half-size demosaic, roughly proportional to the file
+                return estimate + file_size * 4
+            descriptor = get_image_descriptor(path)
+            if descriptor is None:
+                return estimate + file_size * 4
+            pixels = min(decoded_bytes(descriptor.size, "RGBA"), max_decode_bytes())
+            # Decoded source plus RGBA compositing copy (GIFs keep one RGBA copy per grid cell)
+            copies = 32 if file_type == "animated" else 2
+            return estimate + pixels * copies
+        if file_type == "movie":
+            probe = probe_video(path) or {}
+            frame_bytes = (probe.get("width") or 1920) * (probe.get("height") or 1080) * 4
+            held = video_frames if frames_full_size else 1
+            return estimate + frame_bytes * (VIDEO_DECODER_FRAMES + held)
+        if file_type == "pdf":
+            probe = probe_pdf(path) or {}
+            pages = probe.get("pages") or 1
+            width_px = (probe.get("width_pt") or 612) / 72 * PDF_RASTER_DPI
+            height_px = (probe.get("height_pt") or 792) / 72 * PDF_RASTER_DPI
+            # Every page is rasterized up front by convert_from_path
+            return estimate + int(pages * width_px * height_px * 3)
+        if file_type == "presentation":
+            # Embedded media decoded for the preview grid
+            return estimate + file_size * 2
+    except Exception as exc:
+        logging.debug("Memory estimate failed for %s: %s", path, exc)
+    return estimate
+
+
+def _available_memory_bytes() -> int:
+    try:
+        import psutil
+
+        return int(psutil.virtual_memory().available)
+    except ImportError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return 4096 * MB
+
+
+class MemoryGovernor:
+    """
+    Admit work items against a shared memory budget.
+
+    ``admit(cost)`` blocks until cost fits (or nothing else is running) and
+    releases on exit; ``try_acquire``/``release`` are the non-blocking pair
+    for schedulers that can skip an item and come back to it.
+    """
+
+    def __init__(self, budget_bytes: int, heavy_fraction: float = 0.25):
+        self.budget = max(1, int(budget_bytes))
+        self.heavy_threshold = int(self.budget * heavy_fraction)
+        self._in_use = 0
+        self._heavy_running = 0
+        self._cond = threading.Condition()
+
+    def is_heavy(self, cost: int) -> bool:
+        return cost >= self.heavy_threshold
+
+    def _fits(self, cost: int) -> bool:
+        if self.is_heavy(cost) and self._heavy_running:
+            return False
+        return self._in_use == 0 or self._in_use + cost <= self.budget
+
+    def _take(self, cost: int) -> None:
+        self._in_use += cost
+        if self.is_heavy(cost):
+            self._heavy_running += 1
+
+    def try_acquire(self, cost: int) -> bool:
+        with self._cond:
+            if not self._fits(cost):
+                return False
+            self._take(cost)
+            return True
+
+    def acquire(self, cost: int) -> None:
+        with self._cond:
+            while not self._fits(cost):
+                self._cond.wait()
+            self._take(cost)
+
+    def release(self, cost: int) -> None:
+        with self._cond:
+            self._in_use = max(0, self._in_use - cost)
+            if self.is_heavy(cost):
+                self._heavy_running = max(0, self._heavy_running - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, cost: int) -> Iterator[None]:
+        self.acquire(cost)
+        try:
+            yield
+        finally:
+            self.release(cost)
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+
+_governor: Optional[MemoryGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def configure(budget_mb: Optional[int] = None) -> MemoryGovernor:
+    """Create the process-wide governor (budget_mb None or 0 = 70% of available RAM)."""
+    global _governor
+    budget = budget_mb * MB if budget_mb else int(_available_memory_bytes() * DEFAULT_BUDGET_FRACTION)
+    with _governor_lock:
+        _governor = MemoryGovernor(budget)
+    logging.info("Memory budget for concurrent previews: %d MB", budget // MB)
+    return _governor
+
+
+def get_governor() -> MemoryGovernor:
+    with _governor_lock:
+        governor = _governor
+    return governor if governor is not None else configure()
+
+
+__all__ = ["estimate_peak_bytes", "MemoryGovernor", "configure", "get_governor"]
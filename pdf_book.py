@@ -0,0 +1,247 @@
+"""
+One book from a chunked run's PDFs.
+
+A ``--cards-per-chunk`` run writes ``<name>_chunk_NNNN.pdf`` into every
+``chunk_NNNN`` directory. ``merge_chunk_pdfs`` concatenates them in chunk
+order into a single PDF with pikepdf, copying image streams as they are
+(nothing is decoded or re-encoded):
+
+- identical image XObjects (a card repeated across chunks, blank pages) are
+  stored once and shared by every page that shows them;
+- objects are packed into object streams, and the file can optionally be
+  linearized for fast first-page display;
+- the outline has one entry per chunk with the card titles below it.
+
+Card titles come from the chunk PDFs' own outlines, which
+``save_with_outline`` writes at assembly time from ``record_card_title``
+(or, for cards saved by another process, from the card file name).
+
+Run standalone to merge an existing output directory:
+
+    python pdf_book.py cards_output --output book.pdf --linearize
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import pikepdf
+
+PathLike = Union[str, Path]
+
+# 0007_holiday_clip_grid_card.tiff -> holiday_clip (grid)
+_CARD_NAME = re.compile(r"^\d+_(?P<stem>.+?)(?:_(?P<variant>firstframe|grid))?[_ ]card(?:_(?P<page>\d+))?$")
+_VARIANTS = {"firstframe": "first frame", "grid": "grid"}
+
+_lock = threading.Lock()
+_titles: Dict[Path, str] = {}
+
+
+def _key(path) -> Path:
+    try:
+        return Path(path).resolve()
+    except OSError:
+        return Path(path)
+
+
+def record_card_title(path, title: Optional[str]) -> None:
+    """Remember the title of the card saved at path for the PDF outline."""
+    if title:
+        with _lock:
+            _titles[_key(path)] = str(title)
+
+
+def card_title(path) -> str:
+    """Outline title for a card file: the recorded title, else one derived from its file name."""
+    with _lock:
+        title = _titles.get(_key(path))
+    match = _CARD_NAME.match(Path(path).stem)
+    if not match:
+        return title or Path(path).stem
+    title = title or match["stem"]
+    if match["variant"]:
+        title = f"{title} ({_VARIANTS[match['variant']]})"
+    if match["page"]:
+        title = f"{title}, {match['page']}"
+    return title
+
+
+def save_with_outline(pdf_bytes: bytes, titles: Sequence[str], output) -> None:
+    """Write pdf_bytes to output (path or file) with one outline entry per page titled from titles."""
+    with pikepdf.open(io.BytesIO(pdf_bytes)) as pdf:
+        with pdf.open_outline() as outline:
+            for index, title in enumerate(titles[:len(pdf.pages)]):
+                outline.root.append(pikepdf.OutlineItem(title, index))
+        pdf.save(output)
+
+
+def find_chunk_pdfs(output_dir: PathLike) -> List[Path]:
+    """
+    The chunk PDFs of a chunked run in chunk order, one per chunk directory
+    (the newest if a directory holds several).
+    """
+    newest: Dict[Path, Path] = {}
+    for pdf_path in Path(output_dir).glob("chunk_*/*_chunk_*.pdf"):
+        if pdf_path.name.startswith("."):
+            continue
+        current = newest.get(pdf_path.parent)
+        if current is None or pdf_path.stat().st_mtime > current.stat().st_mtime:
+            newest[pdf_path.parent] = pdf_path
+    return [newest[directory] for directory in sorted(newest)]
+
+
+def _outline_entries(pdf: pikepdf.Pdf) -> List[Tuple[str, int]]:
+    """(title, page index) of a PDF's top-level outline items that point at a page."""
+    page_index = {page.obj.objgen: index for index, page in enumerate(pdf.pages)}
+    entries = []
+    with pdf.open_outline() as outline:
+        for item in outline.root:
+            destination = item.destination
+            if destination is None and item.action is not None:
+                destination = item.action.get("/D")
+            if isinstance(destination, pikepdf.Array) and len(destination) and destination[0].objgen in page_index:
+                entries.append((item.title, page_index[destination[0].objgen]))
+    return entries
+
+
+def _image_key(xobject: pikepdf.Object, raw: bytes) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return (
+        hashlib.sha256(raw).hexdigest(),
+        tuple(sorted((str(key), repr(value)) for key, value in xobject.items() if key != "/Length")),
+    )
+
+
+def dedupe_images(pdf: pikepdf.Pdf) -> Tuple[int, int]:
+    """
+    Point every page at one copy of each distinct image XObject (same
+    encoded bytes and image dictionary). Returns (duplicates dropped, bytes
+    saved); the dropped copies are left unreferenced and are not written.
+    """
+    canonical: Dict[Tuple, pikepdf.Object] = {}
+    dropped: Dict[Tuple[int, int], int] = {}
+    for page in pdf.pages:
+        resources = page.obj.get("/Resources")
+        xobjects = resources.get("/XObject") if resources is not None else None
+        if xobjects is None:
+            continue
+        for name in list(xobjects.keys()):
+            xobject = xobjects[name]
+            if not isinstance(xobject, pikepdf.Stream) or xobject.get("/Subtype") != pikepdf.Name.Image:
+                continue
+            if "/SMask" in xobject or "/Mask" in xobject:
+                continue  # masks are separate objects; leave these alone
+            raw = xobject.read_raw_bytes()
+            key = _image_key(xobject, raw)
+            keep = canonical.setdefault(key, xobject)
+            if keep.objgen != xobject.objgen:
+                xobjects[name] = keep
+                dropped[xobject.objgen] = len(raw)
+    return len(dropped), sum(dropped.values())
+
+
+@dataclass
+class BookReport:
+    path: Path
+    chunks: int
+    pages: int
+    duplicate_images: int
+    bytes_deduplicated: int
+    size: int
+
+    def lines(self) -> List[str]:
+        return [
+            f"Merged {self.chunks} chunk PDFs ({self.pages} pages) into {self.path}: {self.size / (1024 * 1024):.1f} MB",
+            f"  {self.duplicate_images} duplicate images stored once ({self.bytes_deduplicated / (1024 * 1024):.1f} MB saved)",
+        ]
+
+
+def merge_pdfs(pdf_paths: Sequence[PathLike], output_path: PathLike, linearize: bool = False) -> BookReport:
+    """
+    Concatenate pdf_paths into output_path without re-encoding images,
+    deduplicating identical images, writing object streams and, with
+    linearize, a linearized file. Each source PDF becomes a top-level
+    outline entry holding its own outline entries.
+    """
+    output_path = Path(output_path)
+    book = pikepdf.new()
+    sources: List[pikepdf.Pdf] = []
+    groups: List[Tuple[str, int, List[Tuple[str, int]]]] = []
+    try:
+        for pdf_path in pdf_paths:
+            # Sources must stay open until the book is saved
+            source = pikepdf.open(pdf_path)
+            sources.append(source)
+            offset = len(book.pages)
+            groups.append((Path(pdf_path).stem, offset, [(title, offset + index) for title, index in _outline_entries(source)]))
+            book.pages.extend(source.pages)
+        duplicates, saved = dedupe_images(book)
+        with book.open_outline() as outline:
+            for group_title, first_page, entries in groups:
+                if len(groups) == 1:
+                    outline.root.extend(pikepdf.OutlineItem(title, page) for title, page in entries)
+                    continue
+                group = pikepdf.OutlineItem(group_title, first_page)
+                group.children.extend(pikepdf.OutlineItem(title, page) for title, page in entries)
+                outline.root.append(group)
+        book.save(
+            output_path,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            compress_streams=True,
+            linearize=linearize,
+        )
+        pages = len(book.pages)
+    finally:
+        book.close()
+        for source in sources:
+            source.close()
+    return BookReport(output_path, len(groups), pages, duplicates, saved, output_path.stat().st_size)
+
+
+def merge_chunk_pdfs(output_dir: PathLike, output_path: PathLike, linearize: bool = False) -> Optional[BookReport]:
+    """Merge a chunked run's PDFs (find_chunk_pdfs) into output_path; None when there are none."""
+    pdf_paths = find_chunk_pdfs(output_dir)
+    if not pdf_paths:
+        logging.warning("No chunk PDFs found in %s", output_dir)
+        return None
+    report = merge_pdfs(pdf_paths, output_path, linearize=linearize)
+    for line in report.lines():
+        logging.info(line)
+    return report
+
+
+__all__ = [
+    "record_card_title",
+    "card_title",
+    "save_with_outline",
+    "find_chunk_pdfs",
+    "dedupe_images",
+    "BookReport",
+    "merge_pdfs",
+    "merge_chunk_pdfs",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Merge the chunk PDFs of a chunked card run into one book")
+    parser.add_argument("output_dir", help="Card output directory containing chunk_NNNN subdirectories")
+    parser.add_argument("--output", default=None, help="Book PDF path (default: <output_dir>/<output_dir name>_book.pdf)")
+    parser.add_argument("--linearize", action="store_true", help="Linearize the book for fast first-page display")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    output_dir = Path(args.output_dir)
+    output_path = Path(args.output) if args.output else output_dir / f"{output_dir.resolve().name}_book.pdf"
+    if merge_chunk_pdfs(output_dir, output_path, linearize=args.linearize) is None:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+How card and page images are compressed in assembled PDFs.
+
+Lossless Flate keeps glyphs sharp but makes photo-heavy books enormous. A
+``PdfImagePolicy`` picks the encoding per image: high-quality DCT (JPEG)
+for photo, video, PDF-preview and animated cards, Flate for text, code,
+hex and the other mostly flat cards. Card types are recorded when a card is
+saved (``record_card_type``). Images without a recorded type, such as cards
+left by an earlier run or flipbook pages, are classified by
+``classify_image``, which counts the colours of a small thumbnail.
+
+``PolicyReport`` adds up, per encoding, the bytes written against an
+estimate of the Flate stream the same image would have needed, so every
+assembly can log how much the policy saved.
+"""
+
+from __future__ import annotations
+
+import io
+import threading
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional
+
+from config_loader import PDF_IMAGE_POLICIES, get_pdf_image_policy
+
+# Card types whose previews are photographic
+DCT_CARD_TYPES: FrozenSet[str] = frozenset({"image", "movie", "pdf", "animated"})
+# Thumbnail colours above which an image without a card type counts as a photo
+PHOTO_COLOR_THRESHOLD = 1024
+
+_lock = threading.Lock()
+_card_types: Dict[Path, str] = {}
+_overrides: Dict[str, object] = {}
+
+
+def _key(path) -> Path:
+    try:
+        return Path(path).resolve()
+    except OSError:
+        return Path(path)
+
+
+def record_card_type(path, card_type: Optional[str]) -> None:
+    """Remember which file type the card saved at path shows."""
+    if card_type:
+        with _lock:
+            _card_types[_key(path)] = card_type
+
+
+def card_type_of(path) -> Optional[str]:
+    """The file type recorded for the card at path, if it was saved in this process."""
+    with _lock:
+        return _card_types.get(_key(path))
+
+
+def classify_image(img) -> str:
+    """Return "photo" when a 64x64 sample of img has many colours, else "flat"."""
+    from PIL import Image
+
+    sample = img.resize((64, 64), Image.NEAREST)
+    if sample.mode not in ("RGB", "CMYK", "L"):
+        sample = sample.convert("RGB")
+    colors = sample.getcolors(maxcolors=PHOTO_COLOR_THRESHOLD)
+    return "photo" if colors is None else "flat"
+
+
+def estimate_flate_bytes(img, band_rows: int = 16, every: int = 8) -> int:
+    """
+    Estimate the size of img as a Flate (zlib level 6) image stream by
+    compressing one band of band_rows rows in every `every` and scaling up.
+    """
+    raw = img.tobytes()
+    row_bytes = max(1, len(raw) // max(1, img.height))
+    sampled = bytearray()
+    for top in range(0, img.height, band_rows * every):
+        sampled += raw[top * row_bytes:(top + band_rows) * row_bytes]
+    if not sampled:
+        return len(zlib.compress(raw, 6))
+    return int(len(zlib.compress(bytes(sampled), 6)) * len(raw) / len(sampled))
+
+
+@dataclass(frozen=True)
+class PdfImagePolicy:
+    mode: str = "auto"  # "auto", "lossless" or "dct"
+    jpeg_quality: int = 92
+    subsampling: str = "4:4:4"
+    dct_card_types: FrozenSet[str] = DCT_CARD_TYPES
+
+    def encoding_for(self, card_type: Optional[str] = None, img=None) -> str:
+        """
+        "dct" or "flate" for an image showing card_type; without a card type
+        img is classified. Images with an alpha channel always use Flate.
+        """
+        if self.mode == "lossless":
+            return "flate"
+        if img is not None and img.mode not in ("RGB", "CMYK", "L"):
+            return "flate"
+        if self.mode == "dct":
+            return "dct"
+        if card_type:
+            return "dct" if card_type in self.dct_card_types else "flate"
+        if img is not None:
+            return "dct" if classify_image(img) == "photo" else "flate"
+        return "flate"
+
+    def encode_jpeg(self, img) -> bytes:
+        """img as a baseline JPEG at this policy's quality and subsampling."""
+        buffer = io.BytesIO()
+        options = {"quality": self.jpeg_quality, "optimize": True, "dpi": (300, 300)}
+        if img.mode != "L":
+            options["subsampling"] = self.subsampling
+        img.save(buffer, format="JPEG", **options)
+        return buffer.getvalue()
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+@dataclass
+class PolicyReport:
+    images: Counter = field(default_factory=Counter)
+    written_bytes: Counter = field(default_factory=Counter)
+    flate_bytes: Counter = field(default_factory=Counter)  # estimated lossless size of the same images
+
+    def add(self, encoding: str, written: int = 0, flate: int = 0) -> None:
+        self.images[encoding] += 1
+        self.written_bytes[encoding] += written
+        self.flate_bytes[encoding] += flate
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.flate_bytes["dct"] - self.written_bytes["dct"]
+
+    def lines(self) -> List[str]:
+        """Human-readable summary lines."""
+        if not self.images:
+            return []
+        lines = [f"PDF images: {self.images['dct']} JPEG, {self.images['flate']} Flate"]
+        if self.images["dct"]:
+            # The lossless size is an estimate, so the difference can come out negative
+            change = f"saved ~{_mb(self.saved_bytes)}" if self.saved_bytes >= 0 else f"cost ~{_mb(-self.saved_bytes)} more"
+            lines.append(
+                f"  JPEG images: {_mb(self.written_bytes['dct'])} instead of ~{_mb(self.flate_bytes['dct'])} lossless, "
+                f"{change}"
+            )
+        return lines
+
+
+def configure(mode: Optional[str] = None, jpeg_quality: Optional[int] = None) -> PdfImagePolicy:
+    """Override the configured policy for this process (None keeps config.json's value)."""
+    with _lock:
+        if mode:
+            if mode not in PDF_IMAGE_POLICIES:
+                raise ValueError(f"Unknown PDF image policy {mode!r}; expected one of {', '.join(PDF_IMAGE_POLICIES)}")
+            _overrides["mode"] = mode
+        if jpeg_quality:
+            _overrides["jpeg_quality"] = min(100, max(1, int(jpeg_quality)))
+    return get_policy()
+
+
+def get_policy() -> PdfImagePolicy:
+    """The process-wide policy: config.json "pdf_output" with configure() overrides."""
+    settings = get_pdf_image_policy()
+    with _lock:
+        settings.update(_overrides)
+    return PdfImagePolicy(settings["mode"], settings["jpeg_quality"], settings["subsampling"])
+
+
+__all__ = [
+    "DCT_CARD_TYPES",
+    "record_card_type",
+    "card_type_of",
+    "classify_image",
+    "estimate_flate_bytes",
+    "PdfImagePolicy",
+    "PolicyReport",
+    "configure",
+    "get_policy",
+]
@@ -0,0 +1,118 @@
+"""
+PDF and Illustrator previews (pdf2image).
+
+Imported on first use through preview_registry, so runs without PDFs never
+load pdf2image. ``get_pdf_preview`` builds the overview grid (and per-page
+thumbnails for --all-pdf-pages); ``get_ai_preview`` rasterizes the first
+page of an .ai file.
+"""
+
+from __future__ import annotations
+
+import logging
+import traceback
+
+from PIL import Image, ImageOps
+from pdf2image import convert_from_path
+
+from grid_layout import solve_grid, compose_grid
+
+
+def get_pdf_preview(file_path, box_w, box_h, all_pages: bool = False, max_pages: int = 42):
+    try:
+        from pdf2image import convert_from_path
+        import numpy as np
+        # Convert PDF to PIL pages
+        all_pages_img = convert_from_path(str(file_path))
+        n_total = len(all_pages_img)
+        logging.info(f"PDF {file_path} page count is {n_total} pages")
+
+        if n_total == 0:
+            logging.warning(f"No pages found in PDF: {file_path}")
+            return None
+        
+        # If only one page, just return the single page image scaled to fit
+        if n_total == 1:
+            single_page_img = all_pages_img[0]
+            # Rotate if landscape and box is portrait
+            if box_h > box_w and single_page_img.width > single_page_img.height:
+                single_page_img = single_page_img.rotate(90, expand=True)
+            try:
+                thumb = ImageOps.contain(single_page_img, (box_w, box_h), Image.LANCZOS)
+            except Exception:
+                thumb = single_page_img.copy()
+                thumb.thumbnail((box_w, box_h))
+            return thumb
+
+        # Build overview grid (choose up to max_pages evenly distributed pages)
+        overview_cap = min(n_total, max_pages)
+        indices = [0]
+        if overview_cap > 1 and n_total > 1:
+            remaining = np.linspace(1, n_total - 1, overview_cap - 1)
+            indices += [int(round(i)) for i in remaining]
+        indices = sorted(set(indices))
+        selected_pages = [all_pages_img[i] for i in indices]
+
+        # Find best rows/cols to maximize thumbnail area, rotating pages that fit better sideways
+        grid = solve_grid([page.size for page in selected_pages], (box_w, box_h), allow_rotation=True)
+
+        # Build overview image
+        overview_img = None
+
+        if grid is not None:
+            overview_img = compose_grid(selected_pages, grid, (box_w, box_h), mode='RGB', background=(255, 255, 255))
+
+        if not all_pages:
+            return overview_img
+
+        # Build per-page thumbnails (one per PDF page) scaled to fit the preview box
+        per_page_imgs = []
+        for page in all_pages_img:
+            p = page.copy()
+            # rotate to better fit portrait preview if needed
+            if box_h > box_w and p.width > p.height:
+                p = p.rotate(90, expand=True)
+            try:
+                thumb = ImageOps.contain(p, (box_w, box_h), Image.LANCZOS)
+            except Exception:
+                thumb = p.copy()
+                thumb.thumbnail((box_w, box_h))
+            per_page_imgs.append(thumb)
+
+        # Return overview first (if available), then every page image
+        result = []
+        if overview_img is not None:
+            result.append(overview_img)
+        result.extend(per_page_imgs)
+        return result
+
+    except Exception as e:
+        logging.error(f"PDF preview error for {file_path}: {e}")
+        logging.error(traceback.format_exc())
+        return None
+
+def process_pdf_or_ai_page(page, max_width, max_height):
+    """
+    Takes a PIL Image (PDF or AI page), rotates if landscape, and scales to fit the preview box.
+    Returns the processed image.
+    """
+    img_w, img_h = page.size
+    # Rotate if landscape
+    if img_w > img_h:
+        page = page.rotate(90, expand=True)
+        img_w, img_h = page.size
+    # Scale to fit preview box
+    scale_factor = min(max_width / img_w, max_height / img_h, 1) * 0.95
+    new_w = int(img_w * scale_factor)
+    new_h = int(img_h * scale_factor)
+    return page.resize((new_w, new_h), Image.LANCZOS)
+
+def get_ai_preview(file_path, max_width, max_height):
+    """First page of an Illustrator (PDF-compatible) file fitted to the box, or None."""
+    pages = convert_from_path(str(file_path), first_page=1, last_page=1)
+    if not pages:
+        return None
+    return process_pdf_or_ai_page(pages[0], max_width, max_height)
+
+
+__all__ = ["get_pdf_preview", "process_pdf_or_ai_page", "get_ai_preview"]
@@ -0,0 +1,35 @@
+"""
+PDF page count and page size without rasterizing anything.
+
+``probe_pdf`` opens the document with pikepdf (object parsing only) and
+records the page count and the first page's size in points. Results live in
+the file catalog next to the other per-file metadata, so memory estimates and
+run planning share one open per PDF.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import file_catalog
+
+
+def _probe_uncached(file_path: Path) -> Optional[Dict[str, Any]]:
+    import pikepdf
+
+    with pikepdf.open(str(file_path)) as pdf:
+        pages = len(pdf.pages)
+        width_pt = height_pt = None
+        if pages:
+            x0, y0, x1, y1 = (float(v) for v in pdf.pages[0].mediabox)
+            width_pt, height_pt = abs(x1 - x0), abs(y1 - y0)
+    return {"pages": pages, "width_pt": width_pt, "height_pt": height_pt}
+
+
+def probe_pdf(file_path) -> Optional[Dict[str, Any]]:
+    """Return cached {"pages", "width_pt", "height_pt"} for file_path (None if unreadable)."""
+    return file_catalog.cached(file_path, "pdf_probe", _probe_uncached)
+
+
+__all__ = ["probe_pdf"]
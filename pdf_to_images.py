@@ -7,6 +7,8 @@ import argparse
 import os
 import io
 
+from color_pipeline import to_press_cmyk
+
 STANDARD_SIZES = {
     '8.5x11': (2550, 3300),  # 300 DPI
     'A0': (9933, 14043),
@@ -50,13 +52,9 @@ def rgb_to_cmyk_image(rgb_image):
     Returns:
         PIL.Image: A CMYK mode image
     """
-    # Make sure the image is in RGB mode first
-    if rgb_image.mode != 'RGB':
-        rgb_image = rgb_image.convert('RGB')
-        
-    # Convert to CMYK
-    cmyk_image = rgb_image.convert('CMYK')
-    return cmyk_image
+    # Press ICC transform when configured, plain conversion otherwise
+    return to_press_cmyk(rgb_image)
+    
 
 def parse_page_size(size_str, orientation='portrait'):
     if size_str in STANDARD_SIZES:
@@ -199,6 +197,9 @@ def arrange_grid(images, page_size, n, gap, hairline_width, hairline_color, padd
         
         img_y = y + padding + hairline_width
 
+        if page_img.mode == 'CMYK':
+            # Separate each RGB image once through the press transform before compositing
+            img = to_press_cmyk(img)
         page_img.paste(img, (img_x, img_y))
         draw_hairline_border(draw, (img_x, img_y, img_x + img.width - 1, img_y + img.height - 1), 
                            hairline_width, hairline_color)
@@ -298,6 +299,9 @@ def arrange_masonry(images, page_size, n, gap, hairline_width, hairline_color, p
         img_y = y + padding + hairline_width
 
         # Place image and draw border
+        if page_img.mode == 'CMYK':
+            # Separate each RGB image once through the press transform before compositing
+            img = to_press_cmyk(img)
         page_img.paste(img, (img_x, img_y))
         draw_hairline_border(draw, (img_x, img_y, img_x + img.width - 1, img_y + img.height - 1), 
                            hairline_width, hairline_color)
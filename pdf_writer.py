@@ -0,0 +1,115 @@
+"""
+Small PDF writer for pages that are already rendered as PIL images.
+
+Pillow's ``save_all`` PDF path encodes every page separately, even when the
+same page image is appended many times (the blank verso of a flipbook, for
+example). ``write_images_to_pdf`` embeds each distinct image object once and
+points every page that uses it at the same image XObject, so a 600-frame
+flipbook carries one blank page in the file instead of 300. Each distinct
+image is encoded as the pdf_policy chooses: JPEG for photographic pages,
+Flate for flat ones.
+"""
+
+from __future__ import annotations
+
+import logging
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+import pikepdf
+from PIL import Image
+
+import render_metrics
+from pdf_policy import PdfImagePolicy, PolicyReport, estimate_flate_bytes, get_policy
+
+PathLike = Union[str, Path]
+
+_COLOR_SPACES = {
+    "RGB": pikepdf.Name.DeviceRGB,
+    "CMYK": pikepdf.Name.DeviceCMYK,
+    "L": pikepdf.Name.DeviceGray,
+}
+
+
+def _image_xobject(pdf: pikepdf.Pdf, img: Image.Image, policy: PdfImagePolicy, report: PolicyReport) -> pikepdf.Object:
+    """Encode a PIL image as a JPEG or Flate image XObject, as policy chooses."""
+    if img.mode not in _COLOR_SPACES:
+        img = img.convert("RGB")
+    encoding = policy.encoding_for(img=img)
+    if encoding == "dct":
+        data = policy.encode_jpeg(img)
+        flate_bytes = estimate_flate_bytes(img)
+        # A JPEG no smaller than the lossless stream is no saving; keep Flate
+        if len(data) >= flate_bytes:
+            encoding = "flate"
+    if encoding == "dct":
+        report.add("dct", len(data), flate_bytes)
+        stream = pikepdf.Stream(pdf, data)
+        stream.Filter = pikepdf.Name.DCTDecode
+        if img.mode == "CMYK":
+            # Pillow writes Adobe-style inverted CMYK JPEGs
+            stream.Decode = [1, 0, 1, 0, 1, 0, 1, 0]
+    else:
+        data = zlib.compress(img.tobytes(), 6)
+        report.add("flate", len(data), len(data))
+        stream = pikepdf.Stream(pdf, data)
+        stream.Filter = pikepdf.Name.FlateDecode
+    stream.Type = pikepdf.Name.XObject
+    stream.Subtype = pikepdf.Name.Image
+    stream.Width = img.width
+    stream.Height = img.height
+    stream.ColorSpace = _COLOR_SPACES[img.mode]
+    stream.BitsPerComponent = 8
+    return pdf.make_indirect(stream)
+
+
+def write_images_to_pdf(
+    pages: Iterable[Image.Image],
+    pdf_path: PathLike,
+    dpi: float = 300.0,
+    policy: Optional[PdfImagePolicy] = None,
+) -> int:
+    """
+    Write one PDF page per image, embedding repeated image objects only once.
+
+    Args:
+        pages: PIL images in page order. Passing the *same* image object more
+            than once reuses its XObject rather than re-encoding it.
+        pdf_path: Destination PDF path.
+        dpi: Resolution used to convert pixel sizes to PDF points.
+        policy: JPEG/Flate choice per image (default: pdf_policy.get_policy()).
+
+    Returns:
+        The number of distinct images embedded in the PDF.
+    """
+    policy = policy or get_policy()
+    report = PolicyReport()
+    pdf = pikepdf.new()
+    xobjects: Dict[int, pikepdf.Object] = {}
+    # Hold a reference to every page so id() values stay unique for this call
+    seen = []
+    for img in pages:
+        key = id(img)
+        if key not in xobjects:
+            xobjects[key] = _image_xobject(pdf, img, policy, report)
+            seen.append(img)
+        width_pt = img.width / dpi * 72
+        height_pt = img.height / dpi * 72
+        contents = pikepdf.Stream(pdf, f"q {width_pt:.4f} 0 0 {height_pt:.4f} 0 0 cm /Im0 Do Q".encode("ascii"))
+        page = pikepdf.Dictionary(
+            Type=pikepdf.Name.Page,
+            MediaBox=[0, 0, width_pt, height_pt],
+            Resources=pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=xobjects[key])),
+            Contents=pdf.make_indirect(contents),
+        )
+        pdf.pages.append(pikepdf.Page(page))
+    pdf.save(str(pdf_path))
+    logging.debug("Wrote %d pages (%d distinct images) to %s", len(pdf.pages), len(seen), pdf_path)
+    for line in report.lines():
+        logging.info(line)
+    render_metrics.increment("pdf.dct_saved_bytes", report.saved_bytes)
+    return len(seen)
+
+
+__all__ = ["write_images_to_pdf"]
@@ -1,7 +1,9 @@
 from __future__ import annotations
-from typing import Iterable, List, Tuple, Union
+from typing import Iterable, List, Optional, Tuple, Union
 from PIL import ImageDraw, ImageFont
 
+from text_wrap import wrap_words
+
 Number = Union[int, float]
 Box = Tuple[int, int, int, int]  # (x, y, width, height)
 
@@ -15,24 +17,27 @@ def _norm_padding(pad: Union[Number, Tuple[Number, Number], Tuple[Number, Number
     l, t, r, b = pad  # type: ignore
     return int(l), int(t), int(r), int(b)
 
-def _text_width(draw: ImageDraw.ImageDraw, font: ImageFont.FreeTypeFont, s: str) -> int:
-    l, t, r, b = draw.textbbox((0, 0), s, font=font)
+# Measurements come straight from the font (same box as draw.textbbox for a
+# single line), so laying out text needs no canvas to draw on
+def _text_width(draw: Optional[ImageDraw.ImageDraw], font: ImageFont.FreeTypeFont, s: str) -> int:
+    l, t, r, b = font.getbbox(s)
     return r - l
 
-def _text_height(draw: ImageDraw.ImageDraw, font: ImageFont.FreeTypeFont, s: str) -> int:
-    l, t, r, b = draw.textbbox((0, 0), s if s else " ", font=font)
+def _text_height(draw: Optional[ImageDraw.ImageDraw], font: ImageFont.FreeTypeFont, s: str) -> int:
+    l, t, r, b = font.getbbox(s if s else " ")
     return b - t
 
 def wrap_text_to_width(
     text: str,
-    draw: ImageDraw.ImageDraw,
+    draw: Optional[ImageDraw.ImageDraw],
     font: ImageFont.FreeTypeFont,
     max_width: int,
     break_long_words: bool = True,
 ) -> List[str]:
     """
     Simple greedy word-wrap that respects single newlines.
-    Returns a list of lines whose pixel width <= max_width.
+    Returns a list of lines whose pixel width <= max_width. draw is unused
+    (kept for callers) and may be None.
     """
     lines: List[str] = []
     for para in text.split("\n"):
@@ -41,31 +46,45 @@ def wrap_text_to_width(
             lines.append("")
             continue
 
-        words = para.split(" ")
-        cur = ""
-        for w in words:
-            candidate = w if not cur else f"{cur} {w}"
-            if _text_width(draw, font, candidate) <= max_width:
-                cur = candidate
-            else:
-                if cur:
-                    lines.append(cur)
-                if break_long_words and _text_width(draw, font, w) > max_width:
-                    # hard-wrap inside a single long word
-                    piece = ""
-                    for ch in w:
-                        if _text_width(draw, font, piece + ch) <= max_width:
-                            piece += ch
-                        else:
-                            lines.append(piece)
-                            piece = ch
-                    cur = piece
-                else:
-                    cur = w
-        if cur:
-            lines.append(cur)
+        # Advance-table wrapping: no per-candidate textbbox, long words split by bisection
+        lines.extend(wrap_words(para.split(" "), font, max_width, break_long_words=break_long_words))
     return lines
 
+def measure_text_box(
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    box: Box,
+    padding: Union[Number, Tuple[Number, Number], Tuple[Number, Number, Number, Number]] = 0,
+    line_spacing: int = 0,
+    break_long_words: bool = True,
+) -> dict:
+    """
+    Lay out text the way draw_text_box would, without drawing anything.
+
+    Returns a dict with 'lines', 'line_heights', 'inner_size' (w, h) and
+    'used_size' (w, h) of the wrapped text block.
+    """
+    x, y, w, h = box
+    pad_l, pad_t, pad_r, pad_b = _norm_padding(padding)
+    inner_w = max(0, w - pad_l - pad_r)
+    inner_h = max(0, h - pad_t - pad_b)
+
+    # Wrap lines to inner width
+    lines = wrap_text_to_width(text, None, font, inner_w, break_long_words=break_long_words)
+
+    # Compute line heights and total block height
+    line_heights = [_text_height(None, font, ln) for ln in lines]
+    total_h = sum(line_heights) + (len(lines) - 1) * max(0, line_spacing)
+    total_h = max(0, total_h)
+
+    used_w = min(inner_w, max([_text_width(None, font, ln) for ln in lines], default=0))
+    return {
+        "lines": lines,
+        "line_heights": line_heights,
+        "inner_size": (inner_w, inner_h),
+        "used_size": (used_w, total_h),
+    }
+
 def draw_text_box(
     draw: ImageDraw.ImageDraw,
     text: str,
@@ -121,18 +140,13 @@ def draw_text_box(
             )
 
     pad_l, pad_t, pad_r, pad_b = _norm_padding(padding)
-    inner_w = max(0, w - pad_l - pad_r)
-    inner_h = max(0, h - pad_t - pad_b)
 
-    # Wrap lines to inner width
-    lines = wrap_text_to_width(text, draw, font, inner_w, break_long_words=break_long_words)
+    layout = measure_text_box(text, font, box, padding, line_spacing, break_long_words)
 
-    # Compute line heights and total block height
-    line_heights = [_text_height(draw, font, ln) for ln in lines]
-    if not lines:
-        line_heights = []
-    total_h = sum(line_heights) + (len(lines) - 1) * max(0, line_spacing)
-    total_h = max(0, total_h)
+    lines = layout["lines"]
+    line_heights = layout["line_heights"]
+    inner_w, inner_h = layout["inner_size"]
+    total_h = layout["used_size"][1]
 
     # Vertical alignment inside the inner box
     if v_align == "top":
@@ -167,10 +181,9 @@ def draw_text_box(
         )
         cur_y += line_heights[i] + (line_spacing if i < len(lines) - 1 else 0)
 
-    used_w = min(inner_w, max([_text_width(draw, font, ln) for ln in lines], default=0))
     return {
         "lines": lines,
         "anchor_xy": (x + pad_l, start_y),
-        "used_size": (used_w, total_h),
+        "used_size": layout["used_size"],
         "truncated": False,
     }
\ No newline at end of file
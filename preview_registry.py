@@ -0,0 +1,104 @@
+"""
+Per-type preview renderers, imported on first use.
+
+The renderers for PDFs, videos, GPS tracks, fonts and HEIC images each live
+in their own module (``pdf_preview``, ``video_preview``, ``gps_preview``,
+``font_preview``, ``heif_preview``), and only those modules import the heavy
+libraries (pdf2image, cv2, gpxpy/fitparse/requests, fontTools, pillow-heif).
+file_card_generator reaches them through ``lazy_module`` proxies, so
+importing it, in the CLI or in every spawned worker, no longer loads all of
+them: a run of JPEGs never imports cv2. ``RENDERER_MODULES`` maps file
+extensions to the module that renders them; ``preload`` imports just the
+modules a run's files need before the first card is timed.
+"""
+
+from __future__ import annotations
+
+import importlib
+import logging
+import threading
+from types import ModuleType
+from typing import Dict, Iterable, List, Optional
+
+# Extension -> renderer module (extensions without an entry render with core Pillow code)
+RENDERER_MODULES: Dict[str, str] = {
+    ".pdf": "pdf_preview",
+    ".ai": "pdf_preview",
+    ".gpx": "gps_preview",
+    ".fit": "gps_preview",
+    ".tcx": "gps_preview",
+    ".heic": "heif_preview",
+    ".heif": "heif_preview",
+    **{ext: "video_preview" for ext in (".mp4", ".mkv", ".avi", ".mov", ".m4v", ".webm")},
+    **{ext: "font_preview" for ext in (".ttf", ".otf", ".woff", ".woff2", ".eot")},
+}
+
+# Modules whose import registers a Pillow plugin that plain Image.open relies on
+_DECODER_MODULES = {".heic": "heif_preview", ".heif": "heif_preview"}
+
+_lock = threading.Lock()
+_proxies: Dict[str, "_LazyModule"] = {}
+
+
+class _LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            logging.debug("Importing preview renderer %s", self._name)
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name: str) -> _LazyModule:
+    """Return the shared proxy for module name (nothing is imported yet)."""
+    with _lock:
+        proxy = _proxies.get(name)
+        if proxy is None:
+            proxy = _proxies[name] = _LazyModule(name)
+    return proxy
+
+
+def renderer_module(ext: str) -> Optional[_LazyModule]:
+    """The (lazy) renderer module for a file extension, or None for core types."""
+    name = RENDERER_MODULES.get(ext.lower())
+    return lazy_module(name) if name else None
+
+
+def ensure_decoder(ext: str) -> None:
+    """Import the module that teaches Image.open to read ext, if one is needed."""
+    name = _DECODER_MODULES.get(ext.lower())
+    if name:
+        lazy_module(name)._load()
+
+
+def preload(extensions: Iterable[str]) -> List[str]:
+    """Import the renderer modules files with these extensions need; returns their names."""
+    names = sorted({RENDERER_MODULES[ext.lower()] for ext in extensions if ext.lower() in RENDERER_MODULES})
+    for name in names:
+        try:
+            lazy_module(name)._load()
+        except ImportError as exc:
+            # The renderer reports the missing dependency on the card itself
+            logging.warning("Preview renderer %s unavailable: %s", name, exc)
+    return names
+
+
+def loaded() -> List[str]:
+    """Renderer modules imported so far in this process."""
+    with _lock:
+        return sorted(name for name, proxy in _proxies.items() if proxy._module is not None)
+
+
+__all__ = ["RENDERER_MODULES", "lazy_module", "renderer_module", "ensure_decoder", "preload", "loaded"]
@@ -0,0 +1,76 @@
+"""
+Lightweight per-process counters and timers for a card rendering run.
+
+Decoders record which path they took (``raw_preview.embedded_jpeg``,
+``raw_preview.half_size``, ...) and how long it took, and the CLI logs a
+summary at the end of the run. Everything is in-memory and thread-safe;
+nothing is recorded unless some code calls ``increment`` or ``timed``.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+_counters: Dict[str, int] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+_lock = threading.Lock()
+
+
+def increment(name: str, amount: int = 1) -> None:
+    """Add amount to the counter called name."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record one duration sample for name."""
+    with _lock:
+        stats = _timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        stats["count"] += 1
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Context manager that records the wall time of its body under name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def snapshot() -> Dict[str, Dict]:
+    """Return a copy of all counters and timings recorded so far."""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "timings": {name: dict(stats) for name, stats in _timings.items()},
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+
+
+def log_summary(level: int = logging.INFO) -> None:
+    """Log every counter and timing, one line each (no-op when nothing was recorded)."""
+    data = snapshot()
+    for name, value in sorted(data["counters"].items()):
+        logging.log(level, "metric %s = %d", name, value)
+    for name, stats in sorted(data["timings"].items()):
+        mean = stats["total"] / stats["count"] if stats["count"] else 0.0
+        logging.log(
+            level, "metric %s: %d calls, %.3fs total, %.3fs mean, %.3fs max",
+            name, stats["count"], stats["total"], mean, stats["max"],
+        )
+
+
+__all__ = ["increment", "observe", "timed", "snapshot", "reset", "log_summary"]
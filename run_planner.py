@@ -0,0 +1,353 @@
+"""
+Dry-run planning for a card run (``create_file_cards.py --plan``).
+
+``plan_run`` walks the same inputs a real run would, after ``exclude_exts``
+and zip expansion, and probes each file cheaply: PDF page counts
+(pdf_probe), video frame counts (video_probe), GIF frame counts and image
+headers. Nothing is decoded or rendered. From that it predicts the cards,
+chunk PDFs, render time and bytes on disk the run would produce.
+
+Time and size estimates come from the render history: at the end of every
+real run ``record_run`` folds that run's render_metrics (seconds and cards
+per file type, TIFF and PDF bytes written) into a small JSON file, so plans
+track this machine's actual throughput. Types never rendered here fall back
+to ``DEFAULT_SECONDS_PER_CARD``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import zipfile
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from PIL import Image
+
+import card_writer
+import file_catalog
+import pdf_policy
+from card_layout import card_count
+from config_loader import get_render_history_path
+from file_card_generator import determine_file_type, format_file_size, get_file_type_info
+from memory_governor import estimate_peak_bytes
+from pdf_probe import probe_pdf
+from video_probe import format_duration, probe_video
+
+# Seconds to render one card of a type this machine has no history for
+DEFAULT_SECONDS_PER_CARD = {"movie": 4.0, "pdf": 3.0, "image": 1.0, "animated": 2.0}
+DEFAULT_SECONDS_OTHER = 0.3
+DEFAULT_SAVE_SECONDS_PER_CARD = 0.2
+DEFAULT_PDF_SECONDS_PER_PAGE = 0.3
+# img2pdf Flate-compresses card pixels; flat card chrome compresses well, photos less so
+DEFAULT_PDF_BYTES_RATIO = 0.5
+# Cards the PDF image policy sends to high-quality JPEG (see pdf_policy)
+DEFAULT_PDF_DCT_BYTES_RATIO = 0.1
+# Compressed card files (every card_writer codec except "none") against raw pixels
+DEFAULT_TIFF_BYTES_RATIO = 0.5
+# TIFF header and tags
+TIFF_OVERHEAD_BYTES = 8 * 1024
+
+
+@dataclass
+class PlannedFile:
+    path: Path
+    file_type: str
+    cards: int
+    pages: Optional[int] = None  # PDF pages
+    frames: Optional[int] = None  # video or GIF frames
+    note: Optional[str] = None
+
+
+@dataclass
+class RunPlan:
+    files: List[PlannedFile]
+    card_size: tuple
+    cmyk_mode: bool
+    cards_per_chunk: int
+    render_seconds: float = 0.0
+    save_seconds: float = 0.0
+    pdf_seconds: float = 0.0
+    tiff_bytes: int = 0
+    pdf_bytes: int = 0
+    peak_bytes: int = 0
+    history_types: List[str] = field(default_factory=list)
+
+    @property
+    def total_cards(self) -> int:
+        return sum(f.cards for f in self.files)
+
+    @property
+    def cards_by_type(self) -> Counter:
+        counts: Counter = Counter()
+        for f in self.files:
+            counts[f.file_type] += f.cards
+        return counts
+
+    @property
+    def pdf_count(self) -> int:
+        if not self.total_cards:
+            return 0
+        if self.cards_per_chunk and self.cards_per_chunk > 0:
+            return math.ceil(self.total_cards / self.cards_per_chunk)
+        return 1
+
+    @property
+    def total_seconds(self) -> float:
+        return self.render_seconds + self.save_seconds + self.pdf_seconds
+
+
+def load_history(path: Optional[Path] = None) -> Dict[str, Any]:
+    """Return the recorded render history (empty when none has been recorded)."""
+    path = path or get_render_history_path()
+    if path is None or not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception as exc:
+        logging.warning("Ignoring unreadable render history %s: %s", path, exc)
+        return {}
+
+
+def _add(bucket: Dict[str, float], **values: float) -> None:
+    for key, value in values.items():
+        bucket[key] = bucket.get(key, 0) + value
+
+
+def record_run(snapshot: Dict[str, Dict], path: Optional[Path] = None) -> None:
+    """
+    Fold a render_metrics snapshot into the render history: "render.<type>"
+    timings with "cards.<type>" counts, "save.tiff" with "tiff.bytes" and
+    "pdf.assemble" with "pdf.pages"/"pdf.bytes".
+    """
+    path = path or get_render_history_path()
+    if path is None:
+        return
+    counters = snapshot.get("counters", {})
+    timings = snapshot.get("timings", {})
+    history = load_history(path)
+    render = history.setdefault("render", {})
+    recorded = False
+    for name, stats in timings.items():
+        if not name.startswith("render."):
+            continue
+        file_type = name[len("render."):]
+        cards = counters.get(f"cards.{file_type}", 0)
+        if cards:
+            _add(render.setdefault(file_type, {}), cards=cards, seconds=stats["total"])
+            recorded = True
+    if counters.get("tiff.cards"):
+        _add(
+            history.setdefault("tiff", {}),
+            cards=counters["tiff.cards"],
+            bytes=counters.get("tiff.bytes", 0),
+            seconds=timings.get("save.tiff", {}).get("total", 0.0),
+        )
+        recorded = True
+    if counters.get("pdf.pages"):
+        _add(
+            history.setdefault("pdf", {}),
+            pages=counters["pdf.pages"],
+            bytes=counters.get("pdf.bytes", 0),
+            seconds=timings.get("pdf.assemble", {}).get("total", 0.0),
+        )
+        recorded = True
+    if not recorded:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(history, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as exc:
+        logging.warning("Could not write render history %s: %s", path, exc)
+
+
+def _per_unit(bucket: Optional[Dict[str, float]], unit: str, key: str) -> Optional[float]:
+    if not bucket or not bucket.get(unit):
+        return None
+    return bucket.get(key, 0) / bucket[unit]
+
+
+def _gif_frames_uncached(file_path: Path) -> int:
+    with Image.open(file_path) as img:
+        return getattr(img, "n_frames", 1)
+
+
+def _entry_path(entry) -> Path:
+    if isinstance(entry, dict):
+        return Path(entry.get("filepath") or entry.get("uri") or entry.get("file"))
+    return Path(entry)
+
+
+def _zip_members(zip_path: Path) -> List[str]:
+    with zipfile.ZipFile(zip_path, "r") as z:
+        # Same filter as expand_zip_files
+        return [
+            name for name in z.namelist()
+            if not (name.startswith("._") or name.startswith("__MACOSX") or name.startswith(".DS"))
+        ]
+
+
+def _plan_file(path: Path, all_pdf_pages: bool, ignore_unknown_files: bool, zip_name: Optional[str] = None) -> PlannedFile:
+    file_type = determine_file_type(path)
+    if ignore_unknown_files and get_file_type_info(path)["group"] == "unknown":
+        return PlannedFile(path, file_type, 0, note="unknown type, skipped")
+    planned = PlannedFile(path, file_type, card_count(file_type))
+    if zip_name:
+        # Zip members are not extracted while planning, so they are not probed
+        planned.note = f"in {zip_name}, not probed"
+        return planned
+    if file_type == "movie":
+        probe = probe_video(path)
+        if probe is None:
+            planned.note = "unreadable video"
+        else:
+            planned.frames = probe.get("frame_count")
+    elif file_type == "pdf":
+        probe = probe_pdf(path)
+        if probe is None:
+            planned.note = "unreadable PDF"
+        else:
+            planned.pages = probe["pages"]
+            planned.cards = card_count(file_type, planned.pages, all_pdf_pages)
+    elif file_type == "animated":
+        planned.frames = file_catalog.cached(path, "gif_frames", _gif_frames_uncached)
+    return planned
+
+
+def plan_run(
+    entries: Iterable,
+    card_size: tuple,
+    cmyk_mode: bool = False,
+    exclude_exts: Optional[List[str]] = None,
+    all_pdf_pages: bool = False,
+    max_video_frames: int = 30,
+    cards_per_chunk: int = 0,
+    ignore_unknown_files: bool = True,
+    expand_zips: bool = True,
+    history: Optional[Dict[str, Any]] = None,
+) -> RunPlan:
+    """
+    Predict what a run over entries (paths, or dicts with 'filepath') would
+    produce without rendering anything. expand_zips plans zip members as
+    cards (directory runs); file-list runs leave zips out.
+    """
+    exclude_exts = exclude_exts or []
+    history = load_history() if history is None else history
+    files: List[PlannedFile] = []
+    peak = 0
+    for entry in entries:
+        path = _entry_path(entry)
+        if path.suffix.lower() == ".zip":
+            if not expand_zips:
+                continue
+            try:
+                members = _zip_members(path)
+            except Exception as exc:
+                logging.warning("Cannot list zip %s: %s", path, exc)
+                continue
+            for name in members:
+                member = Path(f"{path.stem}__{Path(name).name}")
+                if member.suffix.lower() in exclude_exts:
+                    continue
+                files.append(_plan_file(member, all_pdf_pages, ignore_unknown_files, zip_name=path.name))
+            continue
+        if path.suffix.lower() in exclude_exts:
+            continue
+        try:
+            if not path.is_file():
+                continue
+        except OSError:
+            continue
+        planned = _plan_file(path, all_pdf_pages, ignore_unknown_files)
+        files.append(planned)
+        if planned.cards:
+            peak = max(peak, estimate_peak_bytes(
+                path, planned.file_type, card_size=card_size,
+                video_frames=max_video_frames if max_video_frames > 0 else 9,
+            ))
+
+    plan = RunPlan(files, card_size, cmyk_mode, cards_per_chunk, peak_bytes=peak)
+    render = history.get("render", {})
+    for file_type, cards in plan.cards_by_type.items():
+        per_card = _per_unit(render.get(file_type), "cards", "seconds")
+        if per_card is None:
+            per_card = DEFAULT_SECONDS_PER_CARD.get(file_type, DEFAULT_SECONDS_OTHER)
+        else:
+            plan.history_types.append(file_type)
+        plan.render_seconds += cards * per_card
+
+    channels = 4 if cmyk_mode else 3
+    raw_card_bytes = card_size[0] * card_size[1] * channels
+    compressed = card_writer.card_codec(cmyk_mode).name != "none"
+    default_tiff = raw_card_bytes * DEFAULT_TIFF_BYTES_RATIO if compressed else raw_card_bytes
+    tiff_per_card = _per_unit(history.get("tiff"), "cards", "bytes") or default_tiff + TIFF_OVERHEAD_BYTES
+    save_per_card = _per_unit(history.get("tiff"), "cards", "seconds") or DEFAULT_SAVE_SECONDS_PER_CARD
+    policy = pdf_policy.get_policy()
+    dct_cards = sum(
+        cards for file_type, cards in plan.cards_by_type.items()
+        if policy.mode == "dct" or (policy.mode == "auto" and file_type in policy.dct_card_types)
+    )
+    default_pdf_ratio = DEFAULT_PDF_BYTES_RATIO
+    if plan.total_cards:
+        default_pdf_ratio += (DEFAULT_PDF_DCT_BYTES_RATIO - DEFAULT_PDF_BYTES_RATIO) * dct_cards / plan.total_cards
+    pdf_per_page = _per_unit(history.get("pdf"), "pages", "bytes") or raw_card_bytes * default_pdf_ratio
+    pdf_seconds_per_page = _per_unit(history.get("pdf"), "pages", "seconds") or DEFAULT_PDF_SECONDS_PER_PAGE
+    plan.save_seconds = plan.total_cards * save_per_card
+    plan.pdf_seconds = plan.total_cards * pdf_seconds_per_page
+    plan.tiff_bytes = int(plan.total_cards * tiff_per_card)
+    plan.pdf_bytes = int(plan.total_cards * pdf_per_page)
+    return plan
+
+
+def format_plan(plan: RunPlan) -> List[str]:
+    """Human-readable report lines for a plan."""
+    lines = [f"Plan for {len(plan.files)} files at {plan.card_size[0]}x{plan.card_size[1]} px{' (CMYK)' if plan.cmyk_mode else ''}"]
+    by_type = plan.cards_by_type
+    files_by_type = Counter(f.file_type for f in plan.files if f.cards)
+    for file_type in sorted(by_type):
+        if by_type[file_type]:
+            source = "history" if file_type in plan.history_types else "default"
+            lines.append(f"  {file_type:<12} {files_by_type[file_type]:>6} files {by_type[file_type]:>7} cards  (time from {source})")
+    pages = sum(f.pages or 0 for f in plan.files)
+    frames = sum(f.frames or 0 for f in plan.files)
+    if pages:
+        lines.append(f"PDF pages probed: {pages}")
+    if frames:
+        lines.append(f"Video/GIF frames probed: {frames}")
+    skipped = sum(1 for f in plan.files if not f.cards)
+    if skipped:
+        lines.append(f"Skipped (unknown type): {skipped}")
+    for f in plan.files:
+        if f.note and f.cards:
+            lines.append(f"  note: {f.path.name}: {f.note}")
+    lines.append(f"Cards: {plan.total_cards}")
+    if plan.cards_per_chunk and plan.cards_per_chunk > 0:
+        lines.append(f"Chunk PDFs: {plan.pdf_count} ({plan.cards_per_chunk} cards per chunk)")
+    else:
+        lines.append(f"PDFs: {plan.pdf_count}")
+    lines.append(
+        f"Estimated time: {format_duration(plan.total_seconds)} "
+        f"(render {format_duration(plan.render_seconds)}, save {format_duration(plan.save_seconds)}, "
+        f"PDF {format_duration(plan.pdf_seconds)})"
+    )
+    lines.append(f"Estimated intermediate TIFFs: {format_file_size(plan.tiff_bytes)}")
+    lines.append(f"Estimated PDF output: {format_file_size(plan.pdf_bytes)}")
+    if plan.peak_bytes:
+        lines.append(f"Largest single-card memory estimate: {format_file_size(plan.peak_bytes)}")
+    return lines
+
+
+__all__ = [
+    "PlannedFile",
+    "RunPlan",
+    "load_history",
+    "record_run",
+    "plan_run",
+    "format_plan",
+]
@@ -0,0 +1,113 @@
+"""
+Startup benchmark: cold import of file_card_generator and first-card latency.
+
+Every measurement runs in a fresh interpreter, so nothing is warm from an
+earlier import. For each tree it reports the import time, which heavy
+libraries the import pulled in, and the time to the first card for each
+sample file. Compare against an older revision with --baseline, which checks
+that revision out into a temporary git worktree:
+
+    python startup_benchmark.py --sample photo.jpg --sample clip.mp4 --baseline HEAD~1
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+HEAVY_MODULES = [
+    "cv2", "bs4", "pillow_heif", "pdf2image", "gpxpy", "requests",
+    "polyline", "dotenv", "numpy", "fitparse", "fontTools", "rawpy", "pikepdf",
+]
+
+# Runs inside the fresh interpreter; prints one JSON line
+_PROBE = r"""
+import json, sys, time
+sys.path.insert(0, {tree!r})
+start = time.perf_counter()
+import file_card_generator
+import_s = time.perf_counter() - start
+result = {{"import_s": import_s, "loaded": [m for m in {heavy!r} if m in sys.modules], "first_card_s": {{}}}}
+for sample in {samples!r}:
+    start = time.perf_counter()
+    file_card_generator.create_file_info_card(__import__("pathlib").Path(sample), width={width}, height={height})
+    result["first_card_s"][sample] = time.perf_counter() - start
+result["loaded_after_cards"] = [m for m in {heavy!r} if m in sys.modules]
+print("BENCH " + json.dumps(result))
+"""
+
+
+def _run_once(tree: Path, samples: List[str], width: int, height: int) -> Dict:
+    code = _PROBE.format(tree=str(tree), heavy=HEAVY_MODULES, samples=samples, width=width, height=height)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=str(tree), capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH "):
+            return json.loads(line[len("BENCH "):])
+    raise RuntimeError(f"benchmark run in {tree} failed:\n{proc.stderr[-2000:]}")
+
+
+def benchmark_tree(tree: Path, samples: List[str], repeat: int, width: int, height: int) -> Dict:
+    """Median import and first-card times over repeat fresh interpreters."""
+    runs = [_run_once(tree, samples, width, height) for _ in range(repeat)]
+    return {
+        "import_s": statistics.median(r["import_s"] for r in runs),
+        "loaded": runs[0]["loaded"],
+        "loaded_after_cards": runs[0]["loaded_after_cards"],
+        "first_card_s": {s: statistics.median(r["first_card_s"][s] for r in runs) for s in samples},
+    }
+
+
+def _report(label: str, result: Dict) -> None:
+    logging.info("%s: import %.0f ms", label, result["import_s"] * 1000)
+    logging.info("  heavy modules loaded by import: %s", ", ".join(result["loaded"]) or "none")
+    for sample, seconds in result["first_card_s"].items():
+        logging.info("  first card %s: %.0f ms", Path(sample).name, seconds * 1000)
+    if result["first_card_s"]:
+        logging.info("  heavy modules loaded after the cards: %s", ", ".join(result["loaded_after_cards"]) or "none")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure cold import and first-card latency of file_card_generator")
+    parser.add_argument("--sample", action="append", default=[], help="File to render as a first card (repeatable)")
+    parser.add_argument("--tree", default=str(Path(__file__).resolve().parent), help="Source tree to benchmark (default: this checkout)")
+    parser.add_argument("--baseline", default=None, help="Git revision to compare against, checked out into a temporary worktree")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per measurement; the median is reported (default: 5)")
+    parser.add_argument("--size", default="800x1000", help="Card size in pixels, WxH (default: 800x1000)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    samples = [str(Path(s).resolve()) for s in args.sample]
+    tree = Path(args.tree).resolve()
+
+    results = {"current": benchmark_tree(tree, samples, args.repeat, width, height)}
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as tmp:
+            worktree = Path(tmp) / "baseline"
+            subprocess.run(["git", "-C", str(tree), "worktree", "add", "--detach", str(worktree), args.baseline], check=True, capture_output=True)
+            try:
+                results[args.baseline] = benchmark_tree(worktree, samples, args.repeat, width, height)
+            finally:
+                subprocess.run(["git", "-C", str(tree), "worktree", "remove", "--force", str(worktree)], capture_output=True)
+
+    for label in reversed(list(results)):
+        _report(label, results[label])
+    if args.baseline:
+        before, after = results[args.baseline], results["current"]
+        logging.info("import: %.0f ms -> %.0f ms", before["import_s"] * 1000, after["import_s"] * 1000)
+        for sample in samples:
+            logging.info(
+                "first card %s: %.0f ms -> %.0f ms", Path(sample).name,
+                before["first_card_s"][sample] * 1000, after["first_card_s"][sample] * 1000,
+            )
+
+
+if __name__ == "__main__":
+    main()
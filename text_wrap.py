@@ -0,0 +1,160 @@
+"""
+Greedy pixel-width word wrapping from per-font advance tables.
+
+Wrapping used to call ``draw.textbbox`` for every candidate line and, for
+words wider than the line, for every prefix of the word, which is quadratic
+in long prompts and URLs. Here each (font, size) gets an ``AdvanceTable``:
+
+* Constant-width fonts (the bundled 3270 Nerd Font Mono) measure a string
+  as ``len(s) * advance``, exactly.
+* Proportional fonts without kerning sum cached per-character advances;
+  long words are split with a binary search over prefix sums.
+* Fonts whose pair widths differ from the sum of their glyph advances
+  (kerning, ligatures, complex shaping) use the same prefix sums to find
+  a candidate break and confirm it with ``font.getlength``.
+
+Widths are advance widths (``getlength``), the distance the pen moves, so
+a line's last glyph may overhang by its right side bearing.
+
+Tables are shared by every font object with the same face, size and layout
+engine, including fonts loaded from memory (``load_default``), and only the
+``MAX_TABLES`` most recently used are kept.
+"""
+
+from __future__ import annotations
+
+import bisect
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from PIL import ImageFont
+
+# Pairs that kern in nearly every proportional font
+_KERNING_PROBES = ("AV", "To", "Wa", "LT", "Yo", "fi")
+_MONOSPACE_PROBES = "iMW0 ."
+
+# Fonts (face, size and layout engine) whose tables are kept
+MAX_TABLES = 64
+
+_tables: "OrderedDict[Tuple, AdvanceTable]" = OrderedDict()
+_lock = threading.Lock()
+
+
+class AdvanceTable:
+    """Character advances for one font at one size."""
+
+    def __init__(self, font):
+        self.font = font
+        self._advances: Dict[str, float] = {}
+        probes = {self.advance(ch) for ch in _MONOSPACE_PROBES}
+        self.monospace_advance: Optional[float] = probes.pop() if len(probes) == 1 else None
+        self.shaped = any(
+            abs(font.getlength(pair) - sum(self.advance(ch) for ch in pair)) > 0.01
+            for pair in _KERNING_PROBES
+        )
+
+    def advance(self, ch: str) -> float:
+        width = self._advances.get(ch)
+        if width is None:
+            width = self._advances[ch] = float(self.font.getlength(ch))
+        return width
+
+    def _uniform(self, s: str) -> bool:
+        """True if every character of s has the font's constant advance."""
+        if self.monospace_advance is None:
+            return False
+        # Glyphs outside the font (emoji, CJK fallbacks) may not share the advance
+        return all(self.advance(ch) == self.monospace_advance for ch in set(s))
+
+    def width(self, s: str) -> float:
+        """Advance width of s."""
+        if self.shaped:
+            return float(self.font.getlength(s))
+        if self._uniform(s):
+            return len(s) * self.monospace_advance
+        return sum(self.advance(ch) for ch in s)
+
+    def fit(self, s: str, max_width: float) -> int:
+        """Length of the longest prefix of s that fits in max_width (at least 1)."""
+        if not self.shaped and self._uniform(s):
+            return max(1, min(len(s), int((max_width + 1e-6) // self.monospace_advance)))
+        prefix = list(itertools.accumulate(self.advance(ch) for ch in s))
+        end = bisect.bisect_right(prefix, max_width + 1e-6)
+        if self.shaped:
+            # Prefix sums ignore kerning; nudge the break until the shaped width agrees
+            while end > 1 and self.font.getlength(s[:end]) > max_width:
+                end -= 1
+            while end < len(s) and self.font.getlength(s[:end + 1]) <= max_width:
+                end += 1
+        return max(1, end)
+
+
+def _font_key(font) -> Tuple:
+    """Identity of a font; for FreeType fonts one that survives reloading it."""
+    if isinstance(font, ImageFont.FreeTypeFont):
+        # Fonts loaded from memory have a fresh file object as their path
+        path = font.path if isinstance(font.path, (str, bytes, os.PathLike)) else None
+        return (path, font.getname(), font.size, font.index, font.layout_engine)
+    # The cached table holds the font, so its id is not reused while the entry exists
+    return ("<bitmap>", id(font))
+
+
+def get_advance_table(font) -> AdvanceTable:
+    """Return the shared advance table for font (built on first use)."""
+    key = _font_key(font)
+    with _lock:
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+    if table is None:
+        table = AdvanceTable(font)
+        with _lock:
+            table = _tables.setdefault(key, table)
+            _tables.move_to_end(key)
+            while len(_tables) > MAX_TABLES:
+                _tables.popitem(last=False)
+    return table
+
+
+def wrap_words(words: List[str], font, max_width: float, break_long_words: bool = True) -> List[str]:
+    """
+    Greedily pack words (joined by single spaces) into lines no wider than
+    max_width. Words wider than a line are split across lines when
+    break_long_words is set, otherwise they get a line of their own.
+    """
+    table = get_advance_table(font)
+    space = table.width(" ")
+    lines: List[str] = []
+    cur = ""
+    cur_width = 0.0
+    for word in words:
+        word_width = table.width(word)
+        if cur:
+            candidate_width = table.width(f"{cur} {word}") if table.shaped else cur_width + space + word_width
+        else:
+            candidate_width = word_width
+        if candidate_width <= max_width:
+            cur = f"{cur} {word}" if cur else word
+            cur_width = candidate_width
+            continue
+        if cur:
+            lines.append(cur)
+        if break_long_words and word_width > max_width:
+            # Hard-wrap inside the word; the remainder starts the next line
+            while True:
+                end = table.fit(word, max_width)
+                if end >= len(word):
+                    break
+                lines.append(word[:end])
+                word = word[end:]
+        cur = word
+        cur_width = table.width(word)
+    if cur:
+        lines.append(cur)
+    return lines
+
+
+__all__ = ["MAX_TABLES", "AdvanceTable", "get_advance_table", "wrap_words"]
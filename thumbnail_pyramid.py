@@ -0,0 +1,201 @@
+"""
+Persistent multi-resolution thumbnail cache.
+
+The same archive is rendered to several page sizes (DIGEST, POCKETBOOK,
+LARGE_TAROT, directory_to_images grids), and every run used to decode every
+source image again. When a cache directory is configured, a file's upright
+previews are kept as a pyramid (4096/2048/1024/512 px long edge) keyed by a
+hash of the file's content; later requests load the smallest level that covers
+their box and never touch the original. A miss decodes only at the level it
+needs and writes that level and the ones below it, so a DNG or HEIC whose
+embedded preview covers a small box is never demosaiced or fully decoded just
+to fill the 4096 px level; larger levels are filled when first requested.
+
+Layout::
+
+    <cache_dir>/<hash[:2]>/<hash>/<level>.jpg|png   pyramid levels
+    <cache_dir>/index/<key>                         path+size+mtime -> hash
+
+The index means unchanged files are not re-hashed on every run.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from PIL import Image
+
+import file_catalog
+import render_metrics
+from config_loader import get_thumbnail_cache_dir
+
+PathLike = Union[str, Path]
+
+PYRAMID_LEVELS = (512, 1024, 2048, 4096)
+JPEG_QUALITY = 92
+_HASH_CHUNK_BYTES = 1 << 20
+
+# Explicit configure() wins over env/config.json; False means "not configured yet"
+_configured_dir: Union[Path, None, bool] = False
+
+
+def configure(cache_dir: Optional[PathLike]) -> None:
+    """Set (or with None, disable) the cache directory for this process."""
+    global _configured_dir
+    _configured_dir = Path(cache_dir).expanduser() if cache_dir else None
+
+
+def cache_dir() -> Optional[Path]:
+    if _configured_dir is not False:
+        return _configured_dir
+    return get_thumbnail_cache_dir()
+
+
+def enabled() -> bool:
+    return cache_dir() is not None
+
+
+def _hash_file(file_path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def content_hash(file_path: PathLike) -> Optional[str]:
+    """Content hash of file_path, via the on-disk index when size and mtime are unchanged."""
+    root = cache_dir()
+
+    def compute(path: Path) -> str:
+        stat = file_catalog.get_entry(path).get("stat") or {}
+        index_key = hashlib.blake2b(
+            f"{stat.get('path')}|{stat.get('size')}|{stat.get('mtime_ns')}".encode("utf-8"),
+            digest_size=16,
+        ).hexdigest()
+        index_file = root / "index" / index_key if root else None
+        if index_file is not None and index_file.exists():
+            return index_file.read_text(encoding="ascii").strip()
+        value = _hash_file(path)
+        if index_file is not None:
+            _atomic_write_bytes(index_file, value.encode("ascii"))
+        return value
+
+    return file_catalog.cached(file_path, "content_hash", compute)
+
+
+def _level_for(long_edge: int) -> Optional[int]:
+    for level in PYRAMID_LEVELS:
+        if level >= long_edge:
+            return level
+    return None
+
+
+def _level_path(level_dir: Path, level: int) -> Optional[Path]:
+    for suffix in (".jpg", ".png"):
+        candidate = level_dir / f"{level}{suffix}"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _save_level(img: Image.Image, level_dir: Path, level: int) -> None:
+    if img.mode in ("RGBA", "LA", "PA", "P"):
+        img = img.convert("RGBA")
+        fmt, suffix, params = "PNG", ".png", {"compress_level": 3}
+    else:
+        if img.mode not in ("RGB", "L", "CMYK"):
+            img = img.convert("RGB")
+        fmt, suffix, params = "JPEG", ".jpg", {"quality": JPEG_QUALITY, "subsampling": 0}
+    buf = io.BytesIO()
+    img.save(buf, fmt, **params)
+    _atomic_write_bytes(level_dir / f"{level}{suffix}", buf.getvalue())
+
+
+def _shrink_to(img: Image.Image, long_edge: int) -> Image.Image:
+    if max(img.size) <= long_edge:
+        return img
+    scale = long_edge / max(img.size)
+    size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+    return img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+
+def _build_pyramid(source: Image.Image, level_dir: Path, top: int) -> None:
+    """Write the levels up to top from source, keeping levels already cached."""
+    current = source
+    for level in reversed(PYRAMID_LEVELS):
+        if level > top:
+            continue
+        current = _shrink_to(current, level)
+        if _level_path(level_dir, level) is None:
+            _save_level(current, level_dir, level)
+
+
+def load_preview(
+    file_path: PathLike,
+    long_edge: int,
+    decode: Callable[[Path, int], Optional[Image.Image]],
+) -> Optional[Image.Image]:
+    """
+    Return an upright preview of file_path whose long edge is at least
+    long_edge (or the whole source, if smaller).
+
+    decode(path, max_edge) must return an upright image max_edge on its
+    long edge, or the whole source if that is smaller; it is only called on
+    a cache miss (or when the cache is disabled or long_edge exceeds the
+    largest level).
+    """
+    root = cache_dir()
+    level = _level_for(long_edge)
+    if root is None or level is None:
+        render_metrics.increment("thumbnail_pyramid.bypass")
+        return decode(Path(file_path), long_edge)
+
+    digest = content_hash(file_path)
+    if digest is None:
+        return decode(Path(file_path), long_edge)
+    level_dir = root / digest[:2] / digest
+
+    cached_path = _level_path(level_dir, level)
+    if cached_path is not None:
+        try:
+            with Image.open(cached_path) as img:
+                img.load()
+                render_metrics.increment("thumbnail_pyramid.hit")
+                return img.copy()
+        except OSError as exc:
+            logging.warning("Ignoring unreadable pyramid level %s: %s", cached_path, exc)
+            cached_path.unlink(missing_ok=True)
+
+    render_metrics.increment("thumbnail_pyramid.miss")
+    source = decode(Path(file_path), level)
+    if source is None:
+        return None
+    # A source smaller than the level is the whole image, so it is every larger level too
+    top = PYRAMID_LEVELS[-1] if max(source.size) < level else level
+    try:
+        _build_pyramid(source, level_dir, top)
+    except OSError as exc:
+        logging.warning("Could not write thumbnail pyramid for %s: %s", file_path, exc)
+    return _shrink_to(source, level)
+
+
+__all__ = ["PYRAMID_LEVELS", "configure", "cache_dir", "enabled", "content_hash", "load_preview"]
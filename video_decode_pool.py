@@ -0,0 +1,214 @@
+"""
+Parallel, thread-budgeted video frame extraction.
+
+Videos dominate card rendering time, and OpenCV's FFmpeg backend happily
+starts one decode thread per core for every capture. ``VideoFramePrefetcher``
+decodes several videos at once in a process pool while capping each decoder
+at ``cpu_count // workers`` threads, so N workers fill the machine instead of
+fighting over it. Frame extraction itself lives in ``extract_video_frames``
+so the serial path in file_card_generator and the pool share one
+implementation.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from memory_governor import MemoryGovernor, estimate_peak_bytes
+from video_probe import probe_video, is_landscape
+
+# Per-process decoder thread budget (0 = leave OpenCV/FFmpeg defaults alone)
+_decoder_threads = 0
+
+
+def decoder_thread_budget(total_workers: int, cpu_count: Optional[int] = None) -> int:
+    """Threads each decoder may use so total_workers decoders saturate, not oversubscribe, the CPU."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, cpu_count // max(1, total_workers))
+
+
+def configure_decoder_threads(threads: int) -> None:
+    """Apply a decoder thread budget to OpenCV in the current process."""
+    global _decoder_threads
+    _decoder_threads = max(0, int(threads))
+    if not _decoder_threads:
+        return
+    import cv2
+
+    cv2.setNumThreads(_decoder_threads)
+    # FFmpeg capture options are read when a capture is opened; the value maps
+    # to the decoder's -threads option
+    os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = f"threads;{_decoder_threads}"
+    logging.debug("Video decoder thread budget set to %d", _decoder_threads)
+
+
+def _open_capture(file_path):
+    import cv2
+
+    if _decoder_threads and hasattr(cv2, "CAP_PROP_N_THREADS"):
+        cap = cv2.VideoCapture(str(file_path), cv2.CAP_FFMPEG, [cv2.CAP_PROP_N_THREADS, _decoder_threads])
+        if cap.isOpened():
+            return cap
+        cap.release()
+    return cv2.VideoCapture(str(file_path))
+
+
+def extract_video_frames(file_path, total_frames=9, rotate_frames_if_portrait=True, max_size: Optional[Tuple[int, int]] = None):
+    """
+    Extract up to total_frames evenly spaced frames as PIL Images.
+
+    When max_size is given, each frame is downscaled to fit it right after
+    decoding, which keeps memory (and inter-process transfer) proportional to
+    the preview instead of the source resolution.
+    """
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    probe = probe_video(file_path)
+    cap = _open_capture(file_path)
+    try:
+        frame_count = (probe or {}).get("frame_count") or int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        landscape = is_landscape(probe)
+        if frame_count == 0:
+            return []
+        # Evenly spaced frame indices
+        indices = [int(i) for i in np.linspace(0, frame_count - 1, total_frames)]
+        frames = []
+        for idx in indices:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            pil_img = Image.fromarray(frame)
+            # Rotate individual frame if preview box is portrait
+            frame_landscape = landscape if landscape is not None else pil_img.width > pil_img.height
+            if rotate_frames_if_portrait and frame_landscape:
+                pil_img = pil_img.rotate(90, expand=True)
+            if max_size:
+                pil_img.thumbnail(max_size, Image.LANCZOS)
+            frames.append(pil_img)
+        return frames
+    finally:
+        cap.release()
+
+
+def _pool_initializer(threads: int) -> None:
+    configure_decoder_threads(threads)
+
+
+def _pool_extract(file_path: str, total_frames: int, rotate_frames_if_portrait: bool, max_size):
+    try:
+        return extract_video_frames(file_path, total_frames, rotate_frames_if_portrait, max_size)
+    except Exception:
+        logging.warning("Error extracting video frames from %s", file_path, exc_info=True)
+        return []
+
+
+class VideoFramePrefetcher:
+    """
+    Decode frames for an ordered list of videos ahead of the render loop.
+
+    At most ``lookahead`` videos are in flight, so decoded frames never pile
+    up faster than cards are rendered. ``get(path)`` blocks until that video's
+    frames are ready and schedules the next one; it returns None for paths
+    that were never scheduled so callers can fall back to serial decoding.
+    With a ``governor``, a video is only submitted once its estimated decode
+    memory fits the shared budget, so several 4K decodes do not start at once.
+    """
+
+    def __init__(
+        self,
+        video_paths: Iterable,
+        workers: int,
+        total_frames: int,
+        max_size: Optional[Tuple[int, int]] = None,
+        rotate_frames_if_portrait: bool = True,
+        lookahead: Optional[int] = None,
+        governor: Optional[MemoryGovernor] = None,
+    ):
+        self.workers = max(1, int(workers))
+        self.threads_per_decoder = decoder_thread_budget(self.workers)
+        self.total_frames = total_frames
+        self.max_size = max_size
+        self.rotate_frames_if_portrait = rotate_frames_if_portrait
+        self.lookahead = max(self.workers, lookahead or self.workers * 2)
+        self.governor = governor
+        self._pending: List[str] = [str(Path(p)) for p in video_paths]
+        self._futures: Dict[str, Future] = {}
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_pool_initializer,
+            initargs=(self.threads_per_decoder,),
+        )
+        logging.info(
+            "Decoding %d videos with %d workers x %d decoder threads",
+            len(self._pending), self.workers, self.threads_per_decoder,
+        )
+        self._fill()
+
+    def _submit(self, path: str, block: bool) -> bool:
+        cost = 0
+        if self.governor is not None:
+            # Frames are thumbnailed in the worker, so decoder buffers dominate
+            cost = estimate_peak_bytes(path, "movie", video_frames=self.total_frames, frames_full_size=False)
+            if block:
+                self.governor.acquire(cost)
+            elif not self.governor.try_acquire(cost):
+                return False
+        future = self._executor.submit(
+            _pool_extract, path, self.total_frames, self.rotate_frames_if_portrait, self.max_size
+        )
+        if self.governor is not None:
+            future.add_done_callback(lambda _f, governor=self.governor, cost=cost: governor.release(cost))
+        self._futures[path] = future
+        return True
+
+    def _fill(self) -> None:
+        while self._pending and len(self._futures) < self.lookahead:
+            path = self._pending[0]
+            if path not in self._futures and not self._submit(path, block=False):
+                # Over the memory budget: retry on the next get()
+                break
+            self._pending.pop(0)
+
+    def get(self, file_path):
+        key = str(Path(file_path))
+        if key not in self._futures and key in self._pending:
+            # Requested out of order (or held back by the memory budget): schedule it now
+            self._pending.remove(key)
+            self._submit(key, block=True)
+        future = self._futures.pop(key, None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        finally:
+            self._fill()
+
+    def close(self) -> None:
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._pending.clear()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+__all__ = [
+    "decoder_thread_budget",
+    "configure_decoder_threads",
+    "extract_video_frames",
+    "VideoFramePrefetcher",
+]
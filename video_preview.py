@@ -0,0 +1,141 @@
+"""
+Video previews decoded with OpenCV.
+
+Imported on first use through preview_registry, so runs without movies never
+load cv2. Frame-grid cards sample their frames through video_decode_pool;
+this module holds the first-frame card and the older sampling helpers.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from video_probe import probe_video, is_landscape
+
+
+def read_first_frame(file_path) -> Optional[Image.Image]:
+    """The first decodable frame of a video as an RGB image, or None."""
+    cap = cv2.VideoCapture(str(file_path))
+    ret, frame = cap.read()
+    cap.release()
+    if not ret or frame is None:
+        return None
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+def get_video_preview(file_path, box_w, box_h, grid_cols=3, grid_rows=3, rotate_frames_if_portrait=True):
+    try:
+        probe = probe_video(file_path)
+        cap = cv2.VideoCapture(str(file_path))
+        frame_count = (probe or {}).get("frame_count") or int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # Orientation comes from the container, so it is decided once before decoding
+        landscape = is_landscape(probe)
+        if frame_count == 0:
+            cap.release()
+            return None
+        # Select frames using a normal distribution (bell curve) centered in the video
+        #import numpy as np
+        num_frames = grid_cols * grid_rows
+        mean = frame_count / 2
+        stddev = frame_count / 4
+        idxs = np.random.normal(loc=mean, scale=stddev, size=num_frames)
+        idxs = np.clip(idxs, 0, frame_count - 1)
+        idxs = np.round(idxs).astype(int)
+        # Ensure unique and sorted indices for visual consistency
+        idxs = sorted(set(idxs))
+        # If not enough unique frames, fill in with evenly spaced frames
+        while len(idxs) < num_frames:
+            extra = np.linspace(0, frame_count - 1, num_frames)
+            idxs = sorted(set(list(idxs) + list(np.round(extra).astype(int))))
+            if len(idxs) > num_frames:
+                idxs = idxs[:num_frames]
+        thumbs = []
+        thumb_w = box_w // grid_cols
+        thumb_h = box_h // grid_rows
+        portrait_mode = box_h > box_w
+        for idx in idxs:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            pil_img = Image.fromarray(frame)
+            # Rotate individual frame if preview box is portrait
+            frame_landscape = landscape if landscape is not None else pil_img.width > pil_img.height
+            if rotate_frames_if_portrait and portrait_mode and frame_landscape:
+                pil_img = pil_img.rotate(90, expand=True)
+            pil_img.thumbnail((thumb_w, thumb_h))
+            thumbs.append(pil_img)
+        cap.release()
+        grid_img = Image.new('RGB', (box_w, box_h), (245, 245, 245))
+        for i, thumb in enumerate(thumbs):
+            x = (i % grid_cols) * thumb_w + (thumb_w - thumb.width)//2
+            y = (i // grid_cols) * thumb_h + (thumb_h - thumb.height)//2
+            grid_img.paste(thumb, (x, y))
+        #logging.debug(f"Grid size: {grid_img.size} for file {file_path}")
+        return grid_img
+    except Exception:
+        return None
+
+def get_video_frames_weighted(file_path, total_frames=24, rotate_frames_if_portrait=True):
+    """
+    Extracts frames from the video file with more frames from the middle 80%.
+    """
+    try:
+        probe = probe_video(file_path)
+        cap = cv2.VideoCapture(str(file_path))
+        frame_count = (probe or {}).get("frame_count") or int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        landscape = is_landscape(probe)
+        if frame_count == 0:
+            cap.release()
+            return []
+
+        # Calculate how many frames for each segment
+        first_pct = 0.05
+        middle_pct = 0.80
+        last_pct = 0.35
+
+        first_n = max(1, int(total_frames * first_pct))
+        middle_n = max(1, int(total_frames * middle_pct))
+        last_n = total_frames - first_n - middle_n
+
+        # Frame ranges
+        first_range = (0, int(frame_count * first_pct))
+        middle_range = (int(frame_count * first_pct), int(frame_count * (first_pct + middle_pct)))
+        last_range = (int(frame_count * (first_pct + middle_pct)), frame_count - 1)
+
+        indices = []
+        # First 10%
+        indices += [int(i) for i in np.linspace(first_range[0], first_range[1], first_n, endpoint=False)]
+        # Middle 80%
+        indices += [int(i) for i in np.linspace(middle_range[0], middle_range[1], middle_n, endpoint=False)]
+        # Last 10%
+        indices += [int(i) for i in np.linspace(last_range[0], last_range[1], last_n, endpoint=True)]
+
+        # Remove duplicates and sort
+        indices = sorted(set(indices))
+
+        frames = []
+        for idx in indices:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            pil_img = Image.fromarray(frame)
+            frame_landscape = landscape if landscape is not None else pil_img.width > pil_img.height
+            if rotate_frames_if_portrait and frame_landscape:
+                pil_img = pil_img.rotate(90, expand=True)
+            frames.append(pil_img)
+        cap.release()
+        return frames
+    except Exception:
+        logging.warning("Error extracting weighted video frames", exc_info=True)
+        return []
+
+
+__all__ = ["read_first_frame", "get_video_preview", "get_video_frames_weighted"]
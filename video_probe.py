@@ -0,0 +1,196 @@
+"""
+Container-level video metadata without decoding any frames.
+
+``probe_video`` asks ffprobe for the first video stream (codec, size, frame
+rate, frame count, duration and rotation) and falls back to OpenCV's
+``VideoCapture`` properties when ffprobe is not installed. Results are stored
+in the file catalog, so the first-frame card, the grid card and frame sampling
+all share one probe per file.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import shutil
+import subprocess
+from fractions import Fraction
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import file_catalog
+
+FFPROBE_TIMEOUT_SECONDS = 30
+
+
+def _parse_rate(value: Optional[str]) -> Optional[float]:
+    if not value or value in ("0/0", "0"):
+        return None
+    try:
+        rate = float(Fraction(value))
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+
+def _as_float(value: Any) -> Optional[float]:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return None
+    return result if result > 0 else None
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        result = int(value)
+    except (TypeError, ValueError):
+        return None
+    return result if result > 0 else None
+
+
+def _probe_with_ffprobe(file_path: Path) -> Optional[Dict[str, Any]]:
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return None
+    cmd = [
+        ffprobe, "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries",
+        "stream=codec_name,width,height,avg_frame_rate,r_frame_rate,nb_frames,duration"
+        ":stream_tags=rotate:stream_side_data=rotation:format=duration",
+        "-of", "json",
+        str(file_path),
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=FFPROBE_TIMEOUT_SECONDS)
+    if result.returncode != 0:
+        logging.debug("ffprobe failed for %s: %s", file_path, result.stderr.strip())
+        return None
+    data = json.loads(result.stdout or "{}")
+    streams = data.get("streams") or []
+    if not streams:
+        return None
+    stream = streams[0]
+
+    rotation = 0
+    tags = stream.get("tags") or {}
+    if "rotate" in tags:
+        rotation = int(float(tags["rotate"]))
+    for side_data in stream.get("side_data_list") or []:
+        if "rotation" in side_data:
+            # Display matrix rotation is counter-clockwise; normalise to the
+            # clockwise convention used by the legacy 'rotate' tag
+            rotation = -int(float(side_data["rotation"]))
+            break
+
+    fps = _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate"))
+    duration = _as_float(stream.get("duration")) or _as_float((data.get("format") or {}).get("duration"))
+    frame_count = _as_int(stream.get("nb_frames"))
+    if frame_count is None and duration and fps:
+        frame_count = int(round(duration * fps))
+
+    return {
+        "codec": stream.get("codec_name"),
+        "width": _as_int(stream.get("width")),
+        "height": _as_int(stream.get("height")),
+        "fps": fps,
+        "frame_count": frame_count,
+        "duration": duration,
+        "rotation": rotation % 360,
+        "source": "ffprobe",
+    }
+
+
+def _probe_with_opencv(file_path: Path) -> Optional[Dict[str, Any]]:
+    import cv2
+
+    cap = cv2.VideoCapture(str(file_path))
+    try:
+        if not cap.isOpened():
+            return None
+        fps = _as_float(cap.get(cv2.CAP_PROP_FPS))
+        frame_count = _as_int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC) or 0)
+        codec = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ") or None
+        rotation = 0
+        if hasattr(cv2, "CAP_PROP_ORIENTATION_META"):
+            rotation = int(cap.get(cv2.CAP_PROP_ORIENTATION_META) or 0)
+        return {
+            "codec": codec,
+            "width": _as_int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": _as_int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": fps,
+            "frame_count": frame_count,
+            "duration": frame_count / fps if frame_count and fps else None,
+            "rotation": rotation % 360,
+            "source": "opencv",
+        }
+    finally:
+        cap.release()
+
+
+def _probe_uncached(file_path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        probe = _probe_with_ffprobe(file_path)
+    except (OSError, subprocess.SubprocessError, ValueError) as exc:
+        logging.debug("ffprobe unavailable for %s: %s", file_path, exc)
+        probe = None
+    if probe is None:
+        probe = _probe_with_opencv(file_path)
+    return probe
+
+
+def probe_video(file_path) -> Optional[Dict[str, Any]]:
+    """Return cached container metadata for file_path (None if it cannot be read)."""
+    return file_catalog.cached(file_path, "video_probe", _probe_uncached)
+
+
+def display_size(probe: Optional[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+    """Frame size as it is displayed, i.e. after applying the rotation metadata."""
+    if not probe or not probe.get("width") or not probe.get("height"):
+        return None
+    w, h = probe["width"], probe["height"]
+    if probe.get("rotation") in (90, 270):
+        return h, w
+    return w, h
+
+
+def is_landscape(probe: Optional[Dict[str, Any]]) -> Optional[bool]:
+    """True/False for landscape/portrait display, None when the probe has no size."""
+    size = display_size(probe)
+    if size is None:
+        return None
+    return size[0] > size[1]
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    hours, rem = divmod(seconds, 3600)
+    minutes, secs = divmod(rem, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def video_card_metadata(probe: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Human-readable metadata lines for a movie card, skipping unknown values."""
+    if not probe:
+        return {}
+    lines: Dict[str, str] = {}
+    if probe.get("duration"):
+        lines["Duration"] = format_duration(probe["duration"])
+    if probe.get("fps"):
+        lines["Frame Rate"] = f"{probe['fps']:.2f} fps"
+    if probe.get("frame_count"):
+        lines["Frames"] = str(probe["frame_count"])
+    size = display_size(probe)
+    if size:
+        lines["Resolution"] = f"{size[0]}x{size[1]}"
+    if probe.get("codec"):
+        lines["Codec"] = str(probe["codec"])
+    if probe.get("rotation"):
+        lines["Rotation"] = f"{probe['rotation']} deg"
+    return lines
+
+
+__all__ = ["probe_video", "display_size", "is_landscape", "format_duration", "video_card_metadata"]